@@ -56,8 +56,8 @@ class Triangle(UnitData):
         self.rate = rate * (0.9**lvlVec[4])
         self.hp += 10*lvlVec[0]
     
-    def upgrade(self):
-        choice = random.choice(['dmg', 'spd', 'acc', 'rate', 'hp'])
+    def upgrade(self, rng=random):
+        choice = rng.choice(['dmg', 'spd', 'acc', 'rate', 'hp'])
         if choice == 'dmg':
             self.damage += 1
             self.lvlVec[1] += 1
@@ -101,8 +101,8 @@ class Square(UnitData):
         self.lifetime = lifetime + 0.5*lvlVec[4]
         self.hp += 10*lvlVec[0]
     
-    def upgrade(self):
-        choice = random.choice(['life', 'spd', 'acc', 'rate', 'hp'])
+    def upgrade(self, rng=random):
+        choice = rng.choice(['life', 'spd', 'acc', 'rate', 'hp'])
         if choice == 'life':
             self.lifetime += 0.5
             self.lvlVec[4] += 1
@@ -146,8 +146,8 @@ class Pentagon(UnitData):
         self.rate = rate * (0.9**lvlVec[3])
         self.hp += 10*lvlVec[0]
 
-    def upgrade(self):
-        choice = random.choice(['heal', 'spd', 'rate', 'hp'])
+    def upgrade(self, rng=random):
+        choice = rng.choice(['heal', 'spd', 'rate', 'hp'])
         if choice == 'heal':
             self.heal += 2
             self.lvlVec[1] += 1
@@ -181,6 +181,7 @@ class Inventory:
         self.units = {}  # {unit_id: unit instance}
         self.capacity = capacity
         self.cap = 600
+        self.version = 0  # bumped by add_unit/remove_unit/upgrade; InventoryView rebuilds on change
     
     def isfull(self):
         return len(self.units) >= self.capacity
@@ -193,10 +194,13 @@ class Inventory:
             return
         unit_id = str(uuid.uuid4())
         self.units[unit_id] = unit
+        self.version += 1
         return unit_id
 
-    def upgrade(self, uid):
-        self.units[uid].upgrade()
+    def upgrade(self, uid, rng=random):
+        # rng: a seeded random.Random to make the stat roll reproducible
+        self.units[uid].upgrade(rng)
+        self.version += 1
     
     def expandcapacity(self, amount = 5, gold = 10, economy = None):
         if economy is None:
@@ -229,6 +233,7 @@ class Inventory:
         return cls.from_dict(data)
     def remove_unit(self, unit_id):
         if unit_id in self.units:
+            self.version += 1
             return self.units.pop(unit_id)
         return None
 
@@ -236,6 +241,49 @@ class Inventory:
         return {uid: unit.__dict__ for uid, unit in self.units.items()}
 
 
+class InventoryView:
+    # Sorted and filtered uid lists over an Inventory, one per (sort key,
+    # ascending, type filter), kept until the inventory's version changes.
+    # Scenes ask for them every frame; with hundreds of units rebuilding
+    # each time is the expensive part of drawing the grid.
+    def __init__(self, inventory):
+        self.inventory = inventory
+        self.version = inventory.version
+        self.lists = {}
+
+    def uids(self, sort_key=None, ascending=False, type_filter=None):
+        inv = self.inventory
+        if inv.version != self.version:
+            self.lists.clear()
+            self.version = inv.version
+        key = (sort_key, ascending, type_filter)
+        uids = self.lists.get(key)
+        if uids is None:
+            units = inv.units
+            if type_filter:
+                name = type_filter.lower()
+                uids = [uid for uid, u in units.items() if name in u.__class__.__name__.lower()]
+            else:
+                uids = list(units)
+            if sort_key:
+                uids.sort(key=lambda uid: _sort_value(units[uid], sort_key), reverse=not ascending)
+            self.lists[key] = uids
+        return uids
+
+    def items(self, sort_key=None, ascending=False, type_filter=None):
+        units = self.inventory.units
+        return [(uid, units[uid]) for uid in self.uids(sort_key, ascending, type_filter)]
+
+
+def _sort_value(unit, key):
+    # Missing or non-numeric stats sort as 0 (pentagons have no damage, say)
+    v = getattr(unit, key, 0)
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0
+
+
 import pygame, json
 
 class Formation:
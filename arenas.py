@@ -0,0 +1,302 @@
+import argparse, random, time
+import numpy as np
+from game3 import (WIDTH, HEIGHT, MAX_BATTLE_TIME, STALL_WINDOW, STALL_EPSILON, UNIT_CELL, ROTATION_STEPS,
+                   SpatialHash, ShooterBehavior, HealerBehavior, instantiate, instantiate_spec)
+from fastworld import ArrayWorld, TRI, PENT, SQR
+from headless import BattleResult, HEADLESS_DT, run_spec_battle
+
+# Many small battles advanced in lockstep by one ArrayWorld. Every arena's
+# units and projectiles live in the same flat arrays, tagged with an arena
+# number; spatial queries lay the arenas side by side so they never interact.
+# Units are built by the usual instantiate()/instantiate_spec() and then
+# packed into arrays, so one update() costs a handful of numpy calls no
+# matter how many arenas are running. Finished arenas are retired straight
+# away and their BattleResult kept.
+#
+#   batch = ArenaBatch()
+#   for p, e in matchups: batch.add_arena(p, e)
+#   results = batch.run()
+
+MAX_SIDES = 5
+
+# Battle.end() outcomes by code; 0 means still running
+ENDINGS = [None, ("tie", "both teams wiped out"), ("win", "enemy wiped out"), ("lose", "player wiped out"),
+           ("tie", "time limit"), ("tie", "no damage on either side"), ("tie", "stalemate")]
+
+
+class ArenaBatch(ArrayWorld):
+    multi = True
+    UNIT_FIELDS = {
+        'pos': (2, np.float64), 'team': (0, np.int8), 'arena': (0, np.int32),
+        'alive': (0, np.bool_), 'hp': (0, np.float64), 'max_hp': (0, np.float64),
+        'rotation': (0, np.float64), 'rotation_speed': (0, np.float64),
+        'shape': ((MAX_SIDES, 2), np.float64), 'sides': (0, np.int8), 'corner': (0, np.int8),
+        'cooldown': (0, np.float64), 'rate': (0, np.float64), 'shot': (0, np.int8),
+        'power': (0, np.float64), 'speed': (0, np.float64), 'accel': (0, np.float64),
+        'lifetime': (0, np.float64),
+    }
+
+    def __init__(self, width=WIDTH, height=HEIGHT, max_time=MAX_BATTLE_TIME, stall_window=STALL_WINDOW,
+                 capacity=1024):
+        super().__init__(capacity, width, height)
+        self.max_time = max_time
+        self.stall_window = stall_window
+        self.u = None         # unit arrays, built from the staged units on the first update
+        self.staged = []      # (arena, Unit) added since
+        self.n_arenas = 0
+        self.active = np.zeros(0, dtype=np.bool_)
+        self.results = []     # BattleResult per arena once it has finished
+        self.time = 0.0
+        self.ticks = 0
+        self.next_check = 1.0
+        self.window_end = stall_window
+        self.window_hp = None
+
+    def add_unit(self, u):
+        # instantiate()/instantiate_spec() land here; the unit joins the arena being added
+        if self.u is not None: raise RuntimeError("arenas must be added before the first update")
+        self.staged.append((self.n_arenas, u))
+
+    def add_arena(self, player_spec, enemy_spec):
+        # One battle between two game3.formation_spec() tuples; returns its arena number
+        instantiate_spec(player_spec, 0, self)
+        instantiate_spec(enemy_spec, 1, self)
+        return self._close_arena()
+
+    def add_formation_arena(self, formation, inventory, campaign):
+        instantiate(formation, 0, inventory, self)
+        instantiate(campaign.enemy_formation, 1, campaign.enemy_inventory, self)
+        return self._close_arena()
+
+    def _close_arena(self):
+        self.n_arenas += 1
+        self.results.append(None)
+        return self.n_arenas-1
+
+    def _pack(self):
+        n = len(self.staged)
+        u = {}
+        for name, (width, dtype) in self.UNIT_FIELDS.items():
+            shape = (n,) + (width if isinstance(width, tuple) else (width,) if width else ())
+            u[name] = np.zeros(shape, dtype=dtype)
+        for i, (arena, unit) in enumerate(self.staged):
+            b = unit.behavior
+            if isinstance(b, ShooterBehavior):
+                shot, power, speed, lifetime = (SQR if b.defensive else TRI), b.atk, b.proj_speed, b.lifetime
+            elif isinstance(b, HealerBehavior):
+                shot, power, speed, lifetime = PENT, b.heal, b.speed, 0.0
+            else:
+                raise ValueError("only shooter and healer units can fight in an ArenaBatch")
+            u['pos'][i] = (unit.pos.x, unit.pos.y)
+            u['team'][i] = unit.team
+            u['arena'][i] = arena
+            u['alive'][i] = unit.alive
+            u['hp'][i] = unit.hp
+            u['max_hp'][i] = unit.max_hp
+            u['rotation'][i] = unit.rotation
+            u['rotation_speed'][i] = unit.rotation_speed
+            u['shape'][i, :unit.sides] = unit.shape
+            u['sides'][i] = unit.sides
+            u['corner'][i] = unit.next_corner_idx
+            u['cooldown'][i] = b.cooldown
+            u['rate'][i] = b.rate
+            u['shot'][i] = shot
+            u['power'][i] = power
+            u['speed'][i] = speed
+            u['accel'][i] = b.acceleration
+            u['lifetime'][i] = lifetime
+        self.u = u
+        self.staged = []
+        self.active = np.ones(self.n_arenas, dtype=np.bool_)
+        self.window_hp = self.team_hp()
+
+    def team_hp(self):
+        # Surviving hp per (arena, team), summed in unit order like Battle.surviving_hp
+        u = self.u
+        standing = u['alive'] & (u['hp'] > 0)
+        key = u['arena'][standing].astype(np.intp)*2 + u['team'][standing]
+        return np.bincount(key, weights=u['hp'][standing], minlength=2*self.n_arenas).reshape(-1, 2)
+
+    def update(self, dt):
+        if self.u is None: self._pack()
+        prof = self.prof
+        if prof: t = prof.start()
+        self.prev_pos[:] = self.pos
+        self._update_units(dt)
+        if prof: t = prof.lap('units', t)
+        u = self.u
+        if self.n and len(u['alive']):
+            self._advance(dt, prof, t if prof else None, u['pos'], u['team'], u['alive'],
+                          u['hp'], u['max_hp'], u['arena'])
+        if prof: prof.end_tick()
+
+    def _update_units(self, dt):
+        # Unit.update plus Shooter/HealerBehavior.update for every live unit.
+        # Battle units never move, so only rotation and the gun matter.
+        u = self.u
+        live = np.nonzero(u['alive'])[0]
+        u['rotation'][live] = (u['rotation'][live] + u['rotation_speed'][live]*dt) % 360
+        u['cooldown'][live] -= dt
+        fire = live[u['cooldown'][live] <= 0]
+        if fire.size == 0: return
+        # rounded like game3.rotation_step; rint also rounds halves to even
+        step = np.rint(u['rotation'][fire]*ROTATION_STEPS) % (360*ROTATION_STEPS)
+        rad = np.radians(step/ROTATION_STEPS)
+        cos_r, sin_r = np.cos(rad), np.sin(rad)
+        corner = u['shape'][fire, u['corner'][fire]]
+        pos = u['pos'][fire]
+        spawn = np.stack([pos[:, 0] + corner[:, 0]*cos_r - corner[:, 1]*sin_r,
+                          pos[:, 1] + corner[:, 0]*sin_r + corner[:, 1]*cos_r], axis=1)
+        u['corner'][fire] = (u['corner'][fire]+1) % u['sides'][fire]
+        u['cooldown'][fire] = u['rate'][fire]
+        self._spawn_many(fire, spawn)
+
+    def _spawn_many(self, shooters, spawn):
+        # spawn_projectile() for a whole volley, in unit order
+        k = len(shooters)
+        capacity = self.capacity
+        while self.n + k > capacity: capacity *= 2
+        if capacity != self.capacity: self._grow(capacity)
+        u, a = self.u, self.arrays
+        s = slice(self.n, self.n+k)
+        shot = u['shot'][shooters]
+        a['pos'][s] = spawn
+        a['prev_pos'][s] = spawn
+        a['vel'][s] = 0.0
+        a['team'][s] = u['team'][shooters]
+        a['kind'][s] = shot
+        a['damage'][s] = u['power'][shooters]
+        a['max_speed'][s] = u['speed'][shooters]
+        a['accel'][s] = u['accel'][shooters]
+        a['init_vel'][s] = u['speed'][shooters]
+        a['lifetime'][s] = np.where(shot == SQR, u['lifetime'][shooters], 0.0)
+        a['iframes'][s] = 0.5
+        a['angle'][s] = 0.0
+        a['initialized'][s] = False
+        a['arena'][s] = u['arena'][shooters]
+        self.n += k
+        if self.prof: self.prof.count('spawned', k)
+
+    def step(self, dt):
+        # Battle.step for every running arena at once; returns the arenas that just finished
+        self.update(dt)
+        self.time += dt
+        self.ticks += 1
+        return self._check()
+
+    def _check(self):
+        # Battle.check_result, vectorized over arenas
+        u = self.u
+        code = np.zeros(self.n_arenas, dtype=np.int8)
+
+        def end(mask, c):
+            code[(code == 0) & self.active & mask] = c
+
+        key = u['arena'][u['alive']].astype(np.intp)*2 + u['team'][u['alive']]
+        alive = np.bincount(key, minlength=2*self.n_arenas).reshape(-1, 2) > 0
+        player, enemy = alive[:, 0], alive[:, 1]
+        end(~player & ~enemy, 1)
+        end(~enemy, 2)
+        end(~player, 3)
+        if self.max_time is not None and self.time >= self.max_time: end(True, 4)
+        if self.time >= self.next_check:
+            self.next_check += 1.0
+            shooters = u['alive'] & (u['shot'] == TRI) & (u['power'] > 0)
+            sources = (np.bincount(u['arena'][shooters], minlength=self.n_arenas)
+                       + np.bincount(self.arena[self.kind == TRI], minlength=self.n_arenas))
+            end(sources == 0, 5)
+        hp = None
+        if self.stall_window is not None and self.time >= self.window_end:
+            hp = self.team_hp()
+            end((np.abs(hp-self.window_hp) < STALL_EPSILON).all(axis=1), 6)
+            self.window_hp = hp
+            self.window_end += self.stall_window
+
+        done = np.nonzero(code)[0]
+        if done.size == 0: return []
+        if hp is None: hp = self.team_hp()
+        for a in done:
+            outcome, reason = ENDINGS[code[a]]
+            self.results[a] = BattleResult(outcome, self.time, self.ticks,
+                                           _number(hp[a, 0]), _number(hp[a, 1]), reason)
+        self.retire(code > 0)
+        return done.tolist()
+
+    def retire(self, finished):
+        # Drop the units and projectiles of every arena flagged in finished.
+        # Arena numbers stay as they are; the rest of the arrays just shrink.
+        self.active &= ~finished
+        u = self.u
+        keep = ~finished[u['arena']]
+        if not keep.all():
+            for name in u: u[name] = u[name][keep]
+        self._compact(~finished[self.arena])
+
+    def running(self):
+        return int(self.active.sum()) if self.u is not None else self.n_arenas
+
+    def run(self, dt=HEADLESS_DT):
+        # Steps until every arena has a result; BattleResults in arena order
+        if self.u is None: self._pack()
+        while self.active.any():
+            self.step(dt)
+        return self.results
+
+
+def _number(hp):
+    # Battle.surviving_hp sums the units' own (usually int) hp
+    hp = float(hp)
+    return int(hp) if hp == int(hp) else hp
+
+
+def run_arenas(matchups, dt=HEADLESS_DT, max_time=MAX_BATTLE_TIME, stall_window=STALL_WINDOW):
+    # (player_spec, enemy_spec) pairs in, BattleResults out, same order
+    batch = ArenaBatch(max_time=max_time, stall_window=stall_window)
+    for player_spec, enemy_spec in matchups:
+        batch.add_arena(player_spec, enemy_spec)
+    return batch.run(dt)
+
+
+def random_matchups(n, size=8, mix='tsp', seed=0):
+    # n random size-vs-size fights with default-stat units, for benchmarks
+    from stress import army_spec
+    rng = random.Random(seed)
+    matchups = []
+    for _ in range(n):
+        grid = SpatialHash(UNIT_CELL)
+        player = army_spec(0, size, ''.join(rng.sample(mix, len(mix))), WIDTH, HEIGHT, grid, rng)
+        enemy = army_spec(1, size, ''.join(rng.sample(mix, len(mix))), WIDTH, HEIGHT, grid, rng)
+        matchups.append((player, enemy))
+    return matchups
+
+
+if __name__ == "__main__":
+    # python arenas.py --arenas 200 --compare numpy
+    parser = argparse.ArgumentParser(description="Run many small battles in lockstep")
+    parser.add_argument("--arenas", type=int, default=100)
+    parser.add_argument("--size", type=int, default=8, help="units per team")
+    parser.add_argument("--mix", default="tsp", help="unit kinds: t=triangle, s=square, p=pentagon")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-time", type=float, default=MAX_BATTLE_TIME)
+    parser.add_argument("--compare", choices=['classic', 'numpy'],
+                        help="also run the battles one by one on this backend and compare")
+    args = parser.parse_args()
+    matchups = random_matchups(args.arenas, args.size, args.mix, args.seed)
+
+    t0 = time.perf_counter()
+    results = run_arenas(matchups, max_time=args.max_time)
+    elapsed = time.perf_counter() - t0
+    ticks = sum(r.ticks for r in results)
+    outcomes = [r.outcome for r in results]
+    print(f"lockstep: {len(results)} battles in {elapsed:.2f}s, {ticks/elapsed:.0f} battle-ticks/s "
+          f"(W/L/T {outcomes.count('win')}/{outcomes.count('lose')}/{outcomes.count('tie')})")
+
+    if args.compare:
+        t0 = time.perf_counter()
+        single = [run_spec_battle(p, e, max_time=args.max_time, backend=args.compare) for p, e in matchups]
+        elapsed_single = time.perf_counter() - t0
+        same = sum(1 for a, b in zip(results, single)
+                   if (a.outcome, a.ticks, a.player_hp, a.enemy_hp) == (b.outcome, b.ticks, b.player_hp, b.enemy_hp))
+        print(f"{args.compare:>8}: {len(single)} battles in {elapsed_single:.2f}s, "
+              f"{sum(r.ticks for r in single)/elapsed_single:.0f} battle-ticks/s, "
+              f"{elapsed_single/elapsed:.1f}x slower; identical results in {same}/{len(single)}")
@@ -0,0 +1,93 @@
+import sys, json
+from concurrent.futures import ProcessPoolExecutor
+from game3 import formation_spec
+from headless import run_spec_battle, HEADLESS_DT, MAX_BATTLE_TIME
+
+# Batches of headless campaign battles spread over a process pool. Battles
+# are deterministic (see game3.Battle), so a batch is a set of different
+# matchups, each played once. Workers receive dt, max_time and the backend
+# once (pool initializer) and then one pair of formation specs per battle,
+# so nothing heavier than a few tuples is pickled.
+
+_job = None  # (dt, max_time, backend) inside each worker
+
+
+def _init_worker(job):
+    global _job
+    _job = job
+
+
+def _simulate(matchup):
+    player_spec, enemy_spec = matchup
+    dt, max_time, backend = _job
+    r = run_spec_battle(player_spec, enemy_spec, dt, max_time, backend)
+    return (r.outcome, r.duration, r.ticks, r.player_hp, r.enemy_hp)
+
+
+class BatchResult:
+    def __init__(self, runs):
+        self.runs = runs   # (outcome, duration, ticks, player_hp, enemy_hp) per matchup
+        self.n = len(runs)
+        self.wins = sum(1 for r in runs if r[0] == "win")
+        self.losses = sum(1 for r in runs if r[0] == "lose")
+        self.ties = self.n - self.wins - self.losses
+        self.win_rate = self.wins / self.n if self.n else 0.0
+        # time-to-kill: how long the won battles took
+        ttk = [r[1] for r in runs if r[0] == "win"]
+        self.mean_ttk = sum(ttk) / len(ttk) if ttk else None
+
+    def to_dict(self):
+        return {
+            "n": self.n, "wins": self.wins, "losses": self.losses, "ties": self.ties,
+            "win_rate": self.win_rate, "mean_ttk": self.mean_ttk,
+        }
+
+    def __repr__(self):
+        ttk = "n/a" if self.mean_ttk is None else f"{self.mean_ttk:.1f}s"
+        return (f"BatchResult(n={self.n}, win {self.win_rate:.1%}, "
+                f"W/L/T {self.wins}/{self.losses}/{self.ties}, ttk {ttk})")
+
+
+def evaluate_specs(matchups, workers=None, dt=HEADLESS_DT, max_time=MAX_BATTLE_TIME, backend='classic'):
+    # (player_spec, enemy_spec) pairs in; runs come back in the same order
+    job = (dt, max_time, backend)
+    matchups = list(matchups)
+    if workers == 0:
+        # in-process, handy for debugging and small batches
+        _init_worker(job)
+        runs = [_simulate(m) for m in matchups]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(job,)) as pool:
+            runs = list(pool.map(_simulate, matchups, chunksize=max(1, len(matchups)//32)))
+    return BatchResult(runs)
+
+
+def evaluate(saves, workers=None, dt=HEADLESS_DT, max_time=MAX_BATTLE_TIME, backend='classic'):
+    # saves: (formation, inventory, campaign) per battle, e.g. from several save files
+    return evaluate_specs([(formation_spec(formation, inventory),
+                            formation_spec(campaign.enemy_formation, campaign.enemy_inventory))
+                           for formation, inventory, campaign in saves],
+                          workers, dt, max_time, backend)
+
+
+if __name__ == "__main__":
+    # python batch.py saves/save1.json [saves/save2.json ...] [--backend numpy]
+    from main import CampaignState
+    from GameExTwoClass import Inventory, Formation
+    args = sys.argv[1:]
+    backend = 'classic'
+    if "--backend" in args:
+        i = args.index("--backend")
+        backend = args[i+1]
+        del args[i:i+2]
+    saves = []
+    for path in args:
+        with open(path, "r") as f:
+            data = json.load(f)
+        saves.append((Formation.from_dict(data["formation"]),
+                      Inventory.from_dict(data["inventory"], data["capacity"]),
+                      CampaignState.from_dict(data["campaign"])))
+    result = evaluate(saves, backend=backend)
+    for path, run in zip(args, result.runs):
+        print(path, *run)
+    print(result)
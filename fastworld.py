@@ -0,0 +1,888 @@
+import bisect, math, random
+import numpy as np
+from game3 import WIDTH, HEIGHT, TEAM_COLORS, draw_projectile
+
+# Structure-of-arrays battle backend. Units stay ordinary game3.Unit objects
+# (instantiate() and the behaviours fill world.units as usual), but every
+# projectile lives in flat numpy arrays.
+#
+# The rules are game3.World's, down to the last bit: the arrays keep
+# World.projectiles' list order (swap-remove compaction included) and every
+# projectile takes its turn in that order, so later ones see what earlier ones
+# did this tick. Only turns that depend on each other are taken one at a time:
+# seekers touching a unit and projectile pairs that touch more than one other.
+# The free-flying rest steer and move in vectorized passes, and interceptors
+# in passes repeated until their turns agree with each other.
+
+TRI, PENT, SQR = 0, 1, 2
+KIND_OF = {'triangle': TRI, 'pentagon': PENT, 'square': SQR}
+KIND_NAMES = ['triangle', 'pentagon', 'square']
+SQR_PRIORITY = [TRI, PENT, SQR]
+SQR_RANK = np.array([SQR_PRIORITY.index(k) for k in (TRI, PENT, SQR)])
+
+UNIT_RADIUS = 20
+AVOID_RADIUS = 30
+ANNIHILATE_RADIUS = 12
+PROJ_RADIUS = 8
+MAX_TURN_RATE = math.radians(1800)
+NEAREST_CHUNK = 1024  # rows per block when building distance matrices
+
+
+def pairs_within(a, b, r, prof=None, a_group=None, b_group=None):
+    # Index pairs (i, j) with |a[i]-b[j]| < r, found by bucketing b into an
+    # r-sized grid and probing the 3x3 neighbourhood of every a.
+    # prof, a WorldProfiler, counts the candidate pairs distance-tested.
+    # With a_group and b_group (arena numbers) only pairs in the same group count.
+    if len(a) == 0 or len(b) == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+    cb = np.floor(b/r).astype(np.int64)
+    ca = np.floor(a/r).astype(np.int64)
+    if a_group is not None:
+        # give every group its own band of cell columns, two apart from the next
+        lo = min(ca[:, 0].min(), cb[:, 0].min())
+        band = max(ca[:, 0].max(), cb[:, 0].max()) - lo + 3
+        ca[:, 0] += a_group*band
+        cb[:, 0] += b_group*band
+    lo = min(ca[:, 1].min(), cb[:, 1].min()) - 1
+    span = max(ca[:, 1].max(), cb[:, 1].max()) - lo + 2
+    kb = cb[:, 0]*span + (cb[:, 1]-lo)
+    order = np.argsort(kb, kind='stable')
+    kb = kb[order]
+    # the 3x3 neighbourhood of every a is three runs of consecutive keys
+    ka = ((ca[:, 0]*span + (ca[:, 1]-lo))[:, None] + np.array([-span, 0, span])).ravel()
+    start = np.searchsorted(kb, ka-1, 'left')
+    count = np.searchsorted(kb, ka+1, 'right') - start
+    total = int(count.sum())
+    if total == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+    ia = np.repeat(np.arange(ka.size) // 3, count)
+    jb = order[np.arange(total) - np.repeat(np.cumsum(count)-count, count) + np.repeat(start, count)]
+    if prof: prof.count('pair_tests', len(ia))
+    dx, dy = a[ia, 0]-b[jb, 0], a[ia, 1]-b[jb, 1]
+    close = dx*dx + dy*dy < r*r
+    return ia[close], jb[close]
+
+
+def nearest(a, b, accept, a_group, b_group):
+    # For every a, index of the closest b of the same group that
+    # accept(rows, cols) allows (-1 if none); rows index a, cols index b and
+    # the two broadcast against each other. Distances are compared after the
+    # square root, as min() over Vector2.distance_to() does, and ties go to
+    # the lowest index, so near-ties go the same way. The distance matrix is
+    # rows x largest group, built NEAREST_CHUNK rows at a time.
+    out = np.full(len(a), -1, dtype=np.intp)
+    if len(a) == 0 or len(b) == 0:
+        return out
+    # stable sort keeps b order inside a group, so ties still go to the lowest index
+    order = np.argsort(b_group, kind='stable')
+    groups = b_group[order]
+    start = np.searchsorted(groups, a_group, 'left')
+    end = np.searchsorted(groups, a_group, 'right')
+    rows = np.nonzero(end > start)[0]
+    if rows.size == 0: return out
+    width = int((end-start)[rows].max())
+    slots = np.arange(width)[None, :]
+    for s in range(0, rows.size, NEAREST_CHUNK):
+        r = rows[s:s+NEAREST_CHUNK]
+        slot = start[r, None] + slots
+        valid = slot < end[r, None]
+        cols = order[np.minimum(slot, len(b)-1)]
+        dx, dy = a[r, None, 0] - b[cols, 0], a[r, None, 1] - b[cols, 1]
+        d2 = np.where(valid & accept(r[:, None], cols), dx*dx + dy*dy, np.inf)
+        k = np.argmin(d2, axis=1)
+        low = d2[np.arange(r.size), k]
+        # squares that round to the same distance tie; only those rows pay for the roots
+        tied = np.nonzero((d2 <= low[:, None]*(1+1e-14)).sum(axis=1) > 1)[0]
+        if tied.size:
+            k[tied] = np.argmin(np.sqrt(d2[tied]), axis=1)
+        found = np.isfinite(low)
+        out[r[found]] = cols[np.arange(r.size), k][found]
+    return out
+
+
+def group_argmin(values, groups, n_groups):
+    # Per group, the index of its smallest value (first one on ties), -1 for empty groups
+    out = np.full(n_groups, -1, dtype=np.intp)
+    if len(values) == 0: return out
+    order = np.lexsort((values, groups))
+    first = np.ones(order.size, dtype=np.bool_)
+    first[1:] = groups[order][1:] != groups[order][:-1]
+    out[groups[order[first]]] = order[first]
+    return out
+
+
+def swap_remove_order(alive, groups=None):
+    # Survivor indices in the order World.compact_projectiles leaves them:
+    # walking up the list, every dead slot takes whatever is last. That puts
+    # the survivors beyond the new length, last one first, into the dead
+    # slots below it. With groups (arena numbers) each group is its own list.
+    if groups is None:
+        m = int(alive.sum())
+        order = np.arange(len(alive))
+        order[np.nonzero(~alive[:m])[0]] = np.nonzero(alive[m:])[0][::-1] + m
+        return order[:m]
+    seq = np.argsort(groups, kind='stable')
+    g = groups[seq]
+    a = alive[seq]
+    local = np.arange(len(g)) - np.searchsorted(g, g, 'left')
+    m = np.bincount(g[a], minlength=int(g.max())+1)[g]
+    holes = np.nonzero(~a & (local < m))[0]
+    movers = np.nonzero(a & (local >= m))[0][::-1]
+    movers = movers[np.argsort(g[movers], kind='stable')]
+    order = seq.copy()
+    order[holes] = seq[movers]
+    return order[local < m]
+
+
+def libm(fn, x):
+    # fn, a math function, over an array. numpy's own SIMD arccos and
+    # arctan2 can round differently from the C library game3 reaches through
+    # math, and one ulp is enough for the two backends to part ways.
+    return np.fromiter(map(fn, x.tolist()), dtype=np.float64, count=len(x))
+
+
+def normalize(v):
+    n = np.sqrt((v*v).sum(axis=1))
+    safe = np.where(n > 0, n, 1.0)
+    return v/safe[:, None], n
+
+
+def clamp_speed(vel, max_speed):
+    speed = np.sqrt((vel*vel).sum(axis=1))
+    over = speed > max_speed
+    if over.any():
+        vel[over] *= (max_speed[over]/speed[over])[:, None]
+
+
+def bounce_walls(pos, vel, width, height):
+    for axis, limit in ((0, width), (1, height)):
+        out = (pos[:, axis] < 0) | (pos[:, axis] > limit)
+        vel[out, axis] *= -1
+        np.clip(pos[:, axis], 0, limit, out=pos[:, axis])
+
+
+def wall(x, v, limit):
+    # Projectile.bounce_walls along one axis, for one projectile
+    if x < 0 or x > limit: return max(0, min(limit, x)), v*-1
+    return x, v
+
+
+class SeekerTurns:
+    # ArrayWorld._update_seekers' half of a tick: where every seeker ends its
+    # turn, and the unit state before each seeker's turn. idx are the seekers
+    # in list order; the other per-seeker arrays line up with it. Unit state
+    # k is the state after the first k marks; rather than a copy of every
+    # unit per mark, only the changes are kept.
+    def __init__(self, idx, pos, vel, angle, ualive, uhp):
+        self.idx = idx
+        self.pos, self.vel, self.angle = pos, vel, angle
+        self.moved = np.zeros(len(idx), dtype=np.bool_)    # steered and moved (so launched)
+        self.dead = np.zeros(len(idx), dtype=np.bool_)     # hit, healed or had nothing to chase
+        self.touched = np.zeros(len(idx), dtype=np.bool_)  # changed some unit's hp
+        self.marks = []          # list index of every seeker that changed unit state
+        self.ualive, self.uhp = ualive.copy(), uhp.copy()   # unit state 0
+        self.fell = np.full(len(ualive), np.iinfo(np.intp).max)   # first state each unit is dead in
+        self.changes = []        # (state, unit, hp) for every hp change, in order
+        self.fallen = []         # units killed, in order
+        self.hits = self.heals = 0
+
+    def alive(self, state, units):
+        # Whether units were alive in the given unit states (broadcasting)
+        return self.ualive[units] & (self.fell[units] > state)
+
+    def hp(self, states):
+        # Every unit's hp in each of the given ascending unit states, one row each
+        out = np.repeat(self.uhp[None], len(states), axis=0)
+        if not self.changes: return out
+        at, unit, hp = (np.array(c) for c in zip(*self.changes))
+        for k, state in enumerate(states.tolist()):
+            m = int(np.searchsorted(at, state, 'right'))
+            # the last change of each unit up to that state
+            last, first = np.unique(unit[:m][::-1], return_index=True)
+            out[k, last] = hp[:m][::-1][first]
+        return out
+
+
+class ArrayWorld:
+    FIELDS = {
+        'pos': (2, np.float64), 'vel': (2, np.float64), 'prev_pos': (2, np.float64),
+        'team': (0, np.int8), 'kind': (0, np.int8),
+        'damage': (0, np.float64), 'max_speed': (0, np.float64),
+        'accel': (0, np.float64), 'init_vel': (0, np.float64),
+        'lifetime': (0, np.float64), 'iframes': (0, np.float64),
+        'angle': (0, np.float64), 'initialized': (0, np.bool_),
+        'arena': (0, np.int32),
+    }
+    multi = False   # several arenas in one set of arrays (see arenas.ArenaBatch)
+
+    def __init__(self, capacity=256, width=WIDTH, height=HEIGHT, rng=None):
+        self.units = []
+        self.width, self.height = width, height
+        self.rng = rng if rng is not None else random.Random()
+        self.prof = None   # game3.WorldProfiler while profiling
+        self.alive_count = [0, 0]   # live units per team, as in game3.World
+        self.deaths = []            # units that died during the last update
+        self.fallen = []            # their indexes in the unit arrays, from _advance
+        self.n = 0
+        self.capacity = 0
+        self.arrays = {}
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        for name, (width, dtype) in self.FIELDS.items():
+            shape = (capacity, width) if width else (capacity,)
+            arr = np.zeros(shape, dtype=dtype)
+            if name in self.arrays:
+                arr[:self.n] = self.arrays[name][:self.n]
+            self.arrays[name] = arr
+        self.capacity = capacity
+
+    def __getattr__(self, name):
+        # Live views of the used part of each array: world.pos, world.team, ...
+        arrays = self.__dict__.get('arrays')
+        if arrays is not None and name in arrays:
+            return arrays[name][:self.n]
+        raise AttributeError(name)
+
+    def add_unit(self, u):
+        self.units.append(u)
+        if u.alive: self.alive_count[u.team] += 1
+
+    def remove_unit(self, u):
+        self.units.remove(u)
+        if u.alive: self.alive_count[u.team] -= 1
+
+    @property
+    def projectiles(self):
+        return range(self.n)
+
+    def spawn_projectile(self, team, pos, damage=10, speed=100, acceleration=200,
+                         healing=False, defensive=False, lifetime=3.0, source_type='triangle'):
+        # Same signature as game3.Projectile, but writes straight into the arrays
+        if self.n == self.capacity:
+            self._grow(self.capacity*2)
+        i = self.n
+        a = self.arrays
+        a['pos'][i] = (pos[0], pos[1])
+        a['prev_pos'][i] = a['pos'][i]
+        a['vel'][i] = 0.0
+        a['team'][i] = team
+        a['kind'][i] = KIND_OF[source_type]
+        a['damage'][i] = damage
+        a['max_speed'][i] = speed
+        a['accel'][i] = acceleration
+        a['init_vel'][i] = speed
+        a['lifetime'][i] = lifetime if defensive else 0.0
+        a['iframes'][i] = 0.5
+        a['angle'][i] = 0.0
+        a['initialized'][i] = False
+        a['arena'][i] = 0
+        self.n += 1
+        if self.prof: self.prof.count('spawned')
+
+    def _compact(self, keep):
+        k = int(keep.sum())
+        if self.prof: self.prof.count('killed', self.n-k)
+        if k == self.n: return
+        for arr in self.arrays.values():
+            arr[:k] = arr[:self.n][keep]
+        self.n = k
+
+    def _swap_remove(self, alive):
+        # Drop the dead the way World.compact_projectiles does, so the list
+        # order, and with it every later tick, stays the same as World's
+        order = swap_remove_order(alive, self.arena if self.multi else None)
+        k = len(order)
+        if self.prof: self.prof.count('killed', self.n-k)
+        if k == self.n and (order == np.arange(k)).all(): return
+        for arr in self.arrays.values():
+            arr[:k] = arr[order]
+        self.n = k
+
+    def update(self, dt):
+        prof = self.prof
+        if prof: t = prof.start()
+        self.deaths.clear()
+        self.prev_pos[:] = self.pos
+        for u in self.units: u.update(dt, self)
+        if prof: t = prof.lap('units', t)
+        if self.n and self.units:
+            self._step_projectiles(dt, prof, t if prof else None)
+        if prof: prof.end_tick()
+
+    def _step_projectiles(self, dt, prof, t):
+        units = self.units
+        upos = np.array([(u.pos.x, u.pos.y) for u in units], dtype=np.float64)
+        uteam = np.array([u.team for u in units], dtype=np.int8)
+        ualive = np.array([u.alive for u in units], dtype=np.bool_)
+        uhp = np.array([u.hp for u in units], dtype=np.float64)
+        umax = np.array([u.max_hp for u in units], dtype=np.float64)
+        hp_before = uhp.copy()
+        t = self._advance(dt, prof, t, upos, uteam, ualive, uhp, umax, np.zeros(len(units), dtype=np.int32))
+
+        # Write hp changes back onto the Unit objects, deaths in the order they happened
+        for i in np.nonzero(uhp != hp_before)[0]:
+            u = units[i]
+            hp = uhp[i].item()
+            u.hp = int(hp) if hp == int(hp) else hp
+        for i in self.fallen:
+            u = units[i]
+            u.alive = False
+            self.alive_count[u.team] -= 1
+            self.deaths.append(u)
+        if prof: prof.lap('units', t)
+
+    def _advance(self, dt, prof, t, upos, uteam, ualive, uhp, umax, uarena):
+        # One projectile step against the given unit arrays, as World.update
+        # runs it once the units have fired; uhp and ualive are updated in
+        # place. Returns the profiler clock.
+        n = self.n
+        it = self.iframes
+        it[it >= 0] -= dt
+        self.lifetime[self.kind == SQR] -= dt
+        if prof: t = prof.lap('broadphase', t)
+        # An interceptor can kill a seeker before that seeker's turn. If the
+        # seeker had hit or healed someone on it, take the turns again
+        # without it; each retry settles at least one more turn in list order.
+        seeker = self.kind != SQR
+        turn = np.arange(n)
+        skip = np.zeros(n, dtype=np.bool_)
+        while True:
+            s = self._update_seekers(dt, skip, upos, uteam, ualive, uhp, umax, uarena)
+            pos, vel, alive, killer, launched = self._update_squares(dt, s, upos, uarena)
+            touched = np.zeros(n, dtype=np.bool_)
+            touched[s.idx] = s.touched
+            retry = seeker & (killer < turn) & (skip | touched)
+            if (retry == skip).all(): break
+            skip = retry
+        ualive[:] = s.alive(len(s.marks), np.arange(len(ualive)))
+        uhp[:] = s.hp(np.array([len(s.marks)]))[0]
+        self.fallen = s.fallen
+        self.pos[:], self.vel[:] = pos, vel
+        self.angle[s.idx] = s.angle
+        launched[s.idx[s.moved]] = True
+        self.initialized[:] = launched
+        if prof:
+            prof.count('hits', s.hits)
+            prof.count('heals', s.heals)
+            t = prof.lap('projectiles', t)
+        self._projectile_contacts(alive)
+        if prof: t = prof.lap('collisions', t)
+        self._swap_remove(alive)
+        if prof: t = prof.lap('compaction', t)
+        return t
+
+    def _pairs(self, a, a_arena, b, b_arena, r, prof=None):
+        if not self.multi: return pairs_within(a, b, r, prof)
+        return pairs_within(a, b, r, prof, a_arena, b_arena)
+
+    def _update_seekers(self, dt, skip, upos, uteam, ualive, uhp, umax, uarena):
+        # Turns of the triangle and pentagon projectiles not in skip. The few
+        # that start inside a unit go first, one by one in list order, since
+        # their hits and heals change what later seekers chase; then every
+        # seeker steers and moves at once, against the unit state of its turn.
+        kind, team, arena = self.kind, self.team, self.arena
+        idx = np.nonzero((kind != SQR) & ~skip)[0]
+        s = SeekerTurns(idx, self.pos[idx], self.vel[idx], self.angle[idx], ualive, uhp)
+        if idx.size == 0: return s
+        start = self.pos[idx]
+        lost = np.zeros(idx.size, dtype=np.bool_)
+        self._seeker_contacts(s, lost, upos, uteam, umax, uarena)
+        state = np.searchsorted(np.array(s.marks, dtype=np.intp), idx)   # marks before each turn
+
+        # Targets: triangles chase the nearest enemy, pentagons the most wounded ally
+        is_tri = kind[idx] == TRI
+        target = np.full(idx.size, -1, dtype=np.intp)
+        ugroup = uarena.astype(np.intp)*2 + uteam
+        own = arena[idx].astype(np.intp)*2 + team[idx]
+        tri = np.nonzero(is_tri & ~lost)[0]
+        if tri.size:
+            target[tri] = nearest(start[tri], upos, lambda r, c: s.alive(state[tri[r]], c),
+                                  own[tri] ^ 1, ugroup)
+        heal = np.nonzero(~is_tri & ~lost)[0]
+        if heal.size:
+            states, at = np.unique(state[heal], return_inverse=True)
+            hp = s.hp(states)
+            k, u = np.nonzero(s.alive(states[:, None], np.arange(len(umax))) & (hp < umax))
+            if u.size:
+                # most wounded ally per (unit state, arena, team)
+                n_groups = 2*(int(max(uarena.max(initial=0), arena[idx[heal]].max()))+1)
+                best = group_argmin(hp[k, u]/umax[u], k*n_groups + ugroup[u], states.size*n_groups)
+                pick = best[at*n_groups + own[heal]]
+                target[heal] = np.where(pick >= 0, u[pick], -1)
+        lost |= target < 0
+        s.dead |= lost
+        rows = np.nonzero(~lost)[0]
+        if rows.size == 0: return s
+        p = idx[rows]
+        to_target, length = normalize(upos[target[rows]]-start[rows])
+        # both can end up pinned in the same arena corner
+        to_target[length == 0] = (0.0, -1.0)
+        pos, vel = s.pos[rows], s.vel[rows]
+
+        # Triangle projectiles steer around friendly units
+        avoid = np.zeros((rows.size, 2))
+        tri_rows = np.nonzero(is_tri[rows])[0]
+        if tri_rows.size:
+            ia, ju = self._pairs(pos[tri_rows], arena[p[tri_rows]], upos, uarena, AVOID_RADIUS)
+            live = s.alive(state[rows[tri_rows[ia]]], ju)
+            ok = live & (uteam[ju] == team[p[tri_rows[ia]]])
+            ia, ju = ia[ok], ju[ok]
+            normal, dist = normalize(pos[tri_rows[ia]]-upos[ju])
+            near = dist < AVOID_RADIUS
+            ia, ju, normal, dist = ia[near], ju[near], normal[near], dist[near]
+            # summed in unit order, as the classic loop does
+            order = np.lexsort((ju, ia))
+            push = normal*(AVOID_RADIUS-dist)[:, None]*(1/AVOID_RADIUS)   # Vector2 / 30 is * (1/30)
+            np.add.at(avoid, tri_rows[ia[order]], push[order])
+        direction, _ = normalize(to_target+avoid)
+
+        fresh = ~self.initialized[p]
+        vel[fresh] = direction[fresh]*self.init_vel[p[fresh]][:, None]
+
+        # Accelerate along the turn-limited heading; same arithmetic as
+        # game3.Projectile so both backends round alike
+        cur, speed = normalize(vel)
+        moving = speed > 0.01
+        dot = np.clip(cur[:, 0]*direction[:, 0] + cur[:, 1]*direction[:, 1], -1, 1)
+        turn = libm(math.acos, dot)
+        cross = cur[:, 0]*direction[:, 1] - cur[:, 1]*direction[:, 0]
+        turn = np.where(cross < 0, -turn, turn)
+        max_turn = MAX_TURN_RATE*dt
+        turn = np.clip(turn, -max_turn, max_turn)
+        cos_r, sin_r = libm(math.cos, turn), libm(math.sin, turn)
+        new_dir = np.stack([cur[:, 0]*cos_r - cur[:, 1]*sin_r, cur[:, 0]*sin_r + cur[:, 1]*cos_r], axis=1)
+        new_dir = np.where(moving[:, None], new_dir, direction)
+        vel += new_dir*self.accel[p][:, None]*dt
+        clamp_speed(vel, self.max_speed[p])
+        pos += vel*dt
+        heading = np.fromiter(map(math.atan2, new_dir[:, 1].tolist(), new_dir[:, 0].tolist()),
+                              dtype=np.float64, count=rows.size)
+        bounce_walls(pos, vel, self.width, self.height)
+        s.pos[rows], s.vel[rows] = pos, vel
+        s.angle[rows] = np.degrees(heading)+90
+        s.moved[rows] = True
+        return s
+
+    def _seeker_contacts(self, s, lost, upos, uteam, umax, uarena):
+        # The unit-contact part of the turn, for the seekers that start it
+        # inside a live unit: triangles hit enemies and bounce off friends,
+        # pentagons heal friends and bounce off enemies, one unit after
+        # another in unit order like World's scan. Records the unit state
+        # after every seeker that changed it in s; lost gets the seekers
+        # that found nothing to chase and died before touching anything.
+        idx, kind, team, arena = s.idx, self.kind, self.team, self.arena
+        live_units = np.nonzero(s.ualive)[0]
+        ia, _ = self._pairs(s.pos, arena[idx], upos[live_units], uarena[live_units], UNIT_RADIUS)
+        if ia.size == 0: return
+        rows = np.unique(ia)
+        # every unit a bounce or two could push them into
+        ra, rb = self._pairs(s.pos[rows], arena[idx[rows]], upos[live_units], uarena[live_units], 3*UNIT_RADIUS)
+        order = np.lexsort((live_units[rb], ra))
+        near = live_units[rb[order]].tolist()
+        cuts = np.searchsorted(ra[order], np.arange(rows.size+1)).tolist()
+
+        ux, uy = upos[:, 0].tolist(), upos[:, 1].tolist()
+        u_team, u_max, u_arena = uteam.tolist(), umax.tolist(), uarena.tolist()
+        alive, hp = s.ualive.tolist(), s.uhp.tolist()
+        group = uarena.astype(np.intp)*2 + uteam
+        n_groups = 2*(int(uarena.max())+1)
+        alive_n = np.bincount(group[s.ualive], minlength=n_groups).tolist()
+        wounded_n = np.bincount(group[s.ualive & (s.uhp < umax)], minlength=n_groups).tolist()
+        group = group.tolist()
+        p = idx[rows]
+        seekers = zip(rows.tolist(), p.tolist(), (kind[p] == TRI).tolist(), team[p].tolist(), arena[p].tolist(),
+                      s.pos[rows].tolist(), s.vel[rows].tolist(), self.damage[p].tolist(),
+                      (self.iframes[p] <= 0).tolist())
+        for q, (r, i, tri, tm, ar, (px, py), (vx, vy), amount, can_heal) in enumerate(seekers):
+            own = ar*2 + tm
+            if (alive_n[own ^ 1] if tri else wounded_n[own]) == 0:
+                lost[r] = True
+                continue
+            x0, y0 = px, py
+            units = near[cuts[q]:cuts[q+1]]
+            changed = []
+            far = False
+            k = 0
+            while k < len(units):
+                u = units[k]
+                k += 1
+                if not alive[u]: continue
+                ox, oy = px-ux[u], py-uy[u]
+                dist = math.sqrt(ox*ox + oy*oy)
+                if dist >= UNIT_RADIUS: continue
+                if (u_team[u] == tm) == tri:
+                    # a unit this projectile cannot hit: bounce off it
+                    nx, ny = ox/dist, oy/dist
+                    dot = vx*nx + vy*ny
+                    vx, vy = vx - 2*dot*nx, vy - 2*dot*ny
+                    px, py = px + nx*(UNIT_RADIUS-dist), py + ny*(UNIT_RADIUS-dist)
+                    if not far and (px-x0)*(px-x0) + (py-y0)*(py-y0) > (2*UNIT_RADIUS)**2:
+                        far = True
+                        units = units[:k] + [w for w in range(u+1, len(ux)) if u_arena[w] == ar]
+                    continue
+                if not tri and not can_heal: continue
+                was_wounded = hp[u] < u_max[u]
+                if tri:
+                    hp[u] -= amount
+                    s.hits += 1
+                    if hp[u] <= 0:
+                        alive[u] = False
+                        alive_n[group[u]] -= 1
+                        s.fallen.append(u)
+                else:
+                    hp[u] = min(u_max[u], hp[u]+amount)
+                    s.heals += 1
+                wounded_n[group[u]] += (alive[u] and hp[u] < u_max[u]) - was_wounded
+                s.dead[r] = True
+                changed.append(u)
+            s.pos[r] = (px, py)
+            s.vel[r] = (vx, vy)
+            if changed:
+                s.touched[r] = True
+                s.marks.append(i)
+                m = len(s.marks)
+                for u in changed:
+                    s.changes.append((m, u, hp[u]))
+                    if not alive[u]: s.fell[u] = m
+
+    def _update_squares(self, dt, s, upos, uarena):
+        # Interceptor turns. A turn depends only on the turns listed before
+        # it, so every turn is taken at once against the previous pass's
+        # outcome of the earlier ones, and passes repeat until nothing
+        # changes; that fixed point is the one-at-a-time answer. Where a
+        # square ends up does not depend on what it steers at, so the first
+        # guess is already right about every position unless a square dies,
+        # and each later pass only redoes the turns that saw a change.
+        # Returns the position, velocity and liveness of every projectile
+        # after all turns, which have been launched, and for every projectile
+        # the interceptor that killed it (n if none did).
+        n = self.n
+        kind, team, arena = self.kind, self.team, self.arena
+        pos, vel = self.pos.copy(), self.vel.copy()
+        pos[s.idx], vel[s.idx] = s.pos, s.vel
+        dead = np.zeros(n, dtype=np.bool_)   # died in its own turn
+        dead[s.idx] = s.dead
+        killer = np.full(n, n, dtype=np.intp)
+        launched = self.initialized.copy()
+        sq = np.nonzero(kind == SQR)[0]
+        if sq.size == 0: return pos, vel, ~dead, killer, launched
+
+        group = arena.astype(np.intp)*2 + team
+        foe = group[sq] ^ 1
+        rank = SQR_RANK[kind]
+        n_keys = 6*(int(arena.max())+1)   # (arena, team, kind)
+        # What a turn sees of projectile j: entry 2j as it was, 2j+1 after its own turn
+        entry_group = np.repeat(group, 2)
+        entry_key = np.repeat(group*3 + rank, 2)
+        everyone = np.arange(n)
+
+        # Where each square drifts to before steering, and where walls and
+        # units leave it if it lives through its turn
+        expired = self.lifetime[sq] <= 0
+        v0 = self.vel[sq]
+        fresh = ~launched[sq]
+        v0[fresh] = np.array([0.0, -1.0])*self.init_vel[sq[fresh]][:, None]
+        drift = self.pos[sq] + v0*dt
+        speed = self.max_speed[sq]
+        flips = (drift < 0) | (drift > (self.width, self.height))
+        stay_pos = np.clip(drift, 0, (self.width, self.height))
+        state = np.searchsorted(np.array(s.marks, dtype=np.intp), sq)   # unit state of each turn
+        normals = self._square_bounces(stay_pos, sq, s, state, upos, uarena)
+        bounced = np.zeros(sq.size, dtype=np.bool_)
+        bounced[list(normals)] = True
+        pos[sq] = np.where(expired[:, None], self.pos[sq], stay_pos)
+        dead[sq] = expired
+
+        target = np.full(sq.size, -1, dtype=np.intp)
+        best = np.full(sq.size, 3, dtype=np.intp)   # kind priority of the target, 3 for none
+        aim_dist = np.full(sq.size, np.inf)
+        turn = np.zeros(sq.size, dtype=np.bool_)    # alive when its turn came
+        near_r = near_j = kill_r = kill_j = np.zeros(0, dtype=np.intp)   # (row, projectile) pairs
+        tau = np.minimum(killer, np.where(dead, everyone, n))   # last turn each projectile is alive for
+        rows = np.arange(sq.size)
+        blend = 0.2*dt
+        with np.errstate(divide='ignore', invalid='ignore'):
+            while rows.size:
+                i = sq[rows]
+                epos = np.stack([self.pos, pos], axis=1).reshape(-1, 2)
+                evel = np.stack([self.vel, vel], axis=1).reshape(-1, 2)
+
+                def sees(q, e, i=i):
+                    j = e >> 1
+                    return ((e & 1) == (j < i[q])) & (tau[j] >= i[q])
+
+                mine = (killer[i] >= i) & ~expired[rows]
+
+                # Target: closest live enemy of the highest priority kind, from where it starts
+                top = np.full(n_keys, -1, dtype=np.intp)
+                np.maximum.at(top, group*3 + rank, tau)
+                b = np.full(rows.size, 3, dtype=np.intp)
+                for r in (2, 1, 0):
+                    b = np.where(top[foe[rows]*3 + r] >= i, r, b)
+                has = b < 3
+                aim = np.nonzero(has)[0]
+                e = np.zeros(rows.size, dtype=np.intp)
+                e[aim] = nearest(self.pos[i[aim]], epos, lambda q, c: sees(aim[q], c),
+                                 foe[rows[aim]]*3 + b[aim], entry_key)
+                tx, ty = epos[e, 0], epos[e, 1]
+                tvx, tvy = evel[e, 0], evel[e, 1]
+                dx, dy = tx - self.pos[i, 0], ty - self.pos[i, 1]
+                best[rows] = b
+                target[rows] = np.where(has, e >> 1, -1)
+                aim_dist[rows] = np.where(has, np.sqrt(dx*dx + dy*dy), np.inf)
+
+                # Steer toward where the target will be; same arithmetic as game3.Projectile
+                px, py = drift[rows, 0], drift[rows, 1]
+                vx, vy = v0[rows, 0], v0[rows, 1]
+                ms = speed[rows]
+                dx, dy = px-tx, py-ty
+                lead = np.where(ms > 0, np.sqrt(dx*dx + dy*dy)/ms, 0)
+                dx, dy = tx + tvx*lead - px, ty + tvy*lead - py
+                steer = has & (dx*dx + dy*dy > 0)
+                length = np.sqrt(dx*dx + dy*dy)
+                vx = np.where(steer, vx*(1-blend) + dx/length*ms*blend, vx)
+                vy = np.where(steer, vy*(1-blend) + dy/length*ms*blend, vy)
+                length = np.sqrt(vx*vx + vy*vy)
+                over = has & (length > ms)
+                vx, vy = np.where(over, vx*(ms/length), vx), np.where(over, vy*(ms/length), vy)
+
+                # Annihilate enemies on contact in list order, up to and including the first square
+                q, c = pairs_within(drift[rows], epos, ANNIHILATE_RADIUS, None, foe[rows], entry_group)
+                dx, dy = epos[c, 0] - px[q], epos[c, 1] - py[q]
+                ok = sees(q, c) & mine[q] & (np.sqrt(dx*dx + dy*dy) < ANNIHILATE_RADIUS)
+                q, j = q[ok], c[ok] >> 1
+                first = np.full(rows.size, n, dtype=np.intp)
+                foe_sq = kind[j] == SQR
+                np.minimum.at(first, q[foe_sq], j[foe_sq])
+                boom = first < n
+                hit = j <= first[q]
+
+                # Then the walls and the units
+                stay = mine & ~boom
+                mvel = np.stack([vx, vy], axis=1)
+                mvel[flips[rows]] *= -1
+                for k in np.nonzero(stay & bounced[rows])[0].tolist():
+                    bounces = normals[rows[k].item()]
+                    wx, wy = mvel[k].tolist()
+                    for nx, ny in bounces:
+                        dot = wx*nx + wy*ny
+                        wx, wy = wx - 2*dot*nx, wy - 2*dot*ny
+                    mvel[k] = (wx, wy)
+                mvel = np.where(stay[:, None], mvel, np.stack([vx, vy], axis=1))
+
+                # Compare with the last pass; later turns that saw a change go again
+                new_pos = np.where(stay[:, None], stay_pos[rows],
+                                   np.where(mine[:, None], drift[rows], self.pos[i]))
+                new_vel = np.where(mine[:, None], mvel, self.vel[i])
+                new_dead = expired[rows] | (mine & boom)
+                moved = np.zeros(n, dtype=np.bool_)
+                moved[i] = (new_pos != pos[i]).any(axis=1)
+                turned = np.zeros(n, dtype=np.bool_)
+                turned[i] = moved[i] | (new_vel != vel[i]).any(axis=1)
+                pos[i], vel[i], dead[i] = new_pos, new_vel, new_dead
+                turn[rows] = mine
+                redo = np.zeros(sq.size, dtype=np.bool_)
+                redo[rows] = True
+                keep = ~redo[near_r]
+                near_r, near_j = np.concatenate([near_r[keep], rows[q]]), np.concatenate([near_j[keep], j])
+                keep = ~redo[kill_r]
+                kill_r, kill_j = np.concatenate([kill_r[keep], rows[q[hit]]]), np.concatenate([kill_j[keep], j[hit]])
+                old_killer, old_tau = killer, tau
+                killer = np.full(n, n, dtype=np.intp)
+                np.minimum.at(killer, kill_j, sq[kill_r])
+                tau = np.minimum(killer, np.where(dead, everyone, n))
+                rows = self._square_redo(sq, foe, group, rank, drift, best, target, aim_dist, near_r, near_j,
+                                         pos, moved, turned, old_killer, killer, old_tau, tau)
+        launched[sq[turn]] = True
+        return pos, vel, ~dead & (killer == n), killer, launched
+
+    def _square_redo(self, sq, foe, group, rank, drift, best, target, aim_dist, near_r, near_j,
+                     pos, moved, turned, old_killer, killer, old_tau, tau):
+        # Which square turns have to go again after a pass: those that
+        # started or stopped being alive, aimed at something that changed,
+        # or could have aimed at or reached an enemy that moved, died or
+        # came back. turned marks the projectiles whose turn came out
+        # differently, moved the ones among them that ended elsewhere.
+        n = self.n
+        dirty = (killer[sq] >= sq) != (old_killer[sq] >= sq)
+        t = np.maximum(target, 0)
+        dirty |= (target >= 0) & ((tau[t] != old_tau[t]) | (turned[t] & (t < sq)))
+        changed = np.nonzero((tau != old_tau) | moved)[0]
+        if changed.size == 0: return np.nonzero(dirty)[0]
+        seen = np.sort(near_r.astype(np.int64)*n + near_j)
+        for s in range(0, sq.size, NEAREST_CHUNK):
+            r = np.arange(s, min(s+NEAREST_CHUNK, sq.size))
+            i, j = sq[r, None], changed[None, :]
+            lo, hi = np.minimum(tau[j], old_tau[j]), np.maximum(tau[j], old_tau[j])
+            live = tau[j] >= i
+            after = j < i
+            m = (foe[r, None] == group[j]) & (((lo < i) & (i <= hi)) | (moved[j] & after & live))
+            if not m.any(): continue
+            x = np.where(after, pos[j, 0], self.pos[j, 0])
+            y = np.where(after, pos[j, 1], self.pos[j, 1])
+            dx, dy = x - drift[r, 0, None], y - drift[r, 1, None]
+            reach = live & (np.sqrt(dx*dx + dy*dy) < ANNIHILATE_RADIUS)
+            dx, dy = x - self.pos[i, 0], y - self.pos[i, 1]
+            rival = live & ((rank[j] < best[r, None]) | (
+                (rank[j] == best[r, None]) & (np.sqrt(dx*dx + dy*dy) <= aim_dist[r, None])))
+            key = r[:, None].astype(np.int64)*n + j
+            at = np.minimum(np.searchsorted(seen, key), max(seen.size-1, 0))
+            was = (seen[at] == key) if seen.size else np.zeros(key.shape, dtype=np.bool_)
+            dirty[r] |= (m & (reach | rival | was)).any(axis=1)
+        return np.nonzero(dirty)[0]
+
+    def _square_bounces(self, pos, idx, s, state, upos, uarena):
+        # Interceptors idx bounce off every live unit they touch, in unit
+        # order, each bounce from where the last one left them. pos is
+        # updated in place; returns the unit normals each row bounced off,
+        # in order, for the rows that touched any. state is the unit state
+        # (see SeekerTurns) of each turn.
+        normals = {}
+        ia, ju = self._pairs(pos, self.arena[idx], upos, uarena, 3*UNIT_RADIUS)
+        if ia.size == 0: return normals
+        d = pos[ia]-upos[ju]
+        live = s.alive(state[ia], ju)
+        touch = live & (np.sqrt(d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1]) < UNIT_RADIUS)
+        if not touch.any(): return normals
+        order = np.lexsort((ju, ia))
+        ia, ju, live = ia[order], ju[order], live[order]
+        cuts = np.searchsorted(ia, np.arange(len(pos)+1))
+        ux, uy, u_arena = upos[:, 0].tolist(), upos[:, 1].tolist(), uarena.tolist()
+        for k in np.unique(ia[touch[order]]).tolist():
+            units = ju[cuts[k]:cuts[k+1]].tolist()
+            up = dict(zip(units, live[cuts[k]:cuts[k+1]].tolist()))
+            px, py = x0, y0 = pos[k].tolist()
+            bounces = normals[k] = []
+            far = False
+            j = 0
+            while j < len(units):
+                u = units[j]
+                j += 1
+                if not up[u]: continue
+                ox, oy = px-ux[u], py-uy[u]
+                dist = math.sqrt(ox*ox + oy*oy)
+                if dist >= UNIT_RADIUS: continue
+                nx, ny = ox/dist, oy/dist
+                bounces.append((nx, ny))
+                px, py = px + nx*(UNIT_RADIUS-dist), py + ny*(UNIT_RADIUS-dist)
+                if not far and (px-x0)*(px-x0) + (py-y0)*(py-y0) > (2*UNIT_RADIUS)**2:
+                    # pushed out of the neighbourhood looked up: every later unit of the arena
+                    far = True
+                    units = units[:j] + [w for w in range(u+1, len(ux)) if u_arena[w] == u_arena[u]]
+                    rest = np.array(units[j:], dtype=np.intp)
+                    up.update(zip(units[j:], s.alive(state[k], rest).tolist()))
+            pos[k] = (px, py)
+        return normals
+
+    def _projectile_contacts(self, alive):
+        # World.resolve_projectile_contacts: the pairs of a sort-and-sweep on x
+        # (ties in list order), resolved one after another so each sees the
+        # pushes before it. Squares destroy enemy projectiles, everything else
+        # reflects off each other.
+        kind, team = self.kind, self.team
+        pos, vel = self.pos, self.vel
+        live = np.nonzero(alive)[0]
+        if live.size < 2: return
+        rank = np.zeros(self.n, dtype=np.intp)
+        rank[live[np.argsort(pos[live, 0], kind='stable')]] = np.arange(live.size)
+        ia, jb = self._pairs(pos[live], self.arena[live], pos[live], self.arena[live], 2*PROJ_RADIUS, self.prof)
+        a, b = live[ia], live[jb]
+        swept = ((rank[a] < rank[b]) & (pos[b, 0]-pos[a, 0] < PROJ_RADIUS)
+                 & (np.abs(pos[b, 1]-pos[a, 1]) < PROJ_RADIUS))
+        a, b = a[swept], b[swept]
+        if a.size == 0: return
+        order = np.lexsort((rank[b], rank[a]))
+        a, b = a[order], b[order]
+        # A pair sharing nobody with another pair can go in any order: all of those at once
+        seen = np.bincount(np.concatenate([a, b]), minlength=self.n)
+        alone = (seen[a] == 1) & (seen[b] == 1)
+        self._resolve_pairs(a[alone], b[alone], alive)
+        w, h = self.width, self.height
+        for i, j in zip(a[~alone].tolist(), b[~alone].tolist()):
+            if not (alive[i] and alive[j]): continue
+            i_sq, j_sq = kind[i] == SQR, kind[j] == SQR
+            if i_sq and j_sq and team[i] == team[j]: continue
+            ax, ay = pos[i].tolist()
+            bx, by = pos[j].tolist()
+            ox, oy = ax-bx, ay-by
+            dist = math.sqrt(ox*ox + oy*oy)
+            if dist >= PROJ_RADIUS or dist == 0: continue
+            if team[i] != team[j] and (i_sq or j_sq):
+                if i_sq: alive[j] = False
+                if j_sq: alive[i] = False
+                continue
+            # Vector2 / scalar multiplies by the reciprocal
+            nx, ny = ox*(1/dist), oy*(1/dist)
+            avx, avy = vel[i].tolist()
+            dot = avx*nx + avy*ny
+            avx, avy = avx - 2*dot*nx, avy - 2*dot*ny
+            bvx, bvy = vel[j].tolist()
+            dot = bvx*-nx + bvy*-ny
+            bvx, bvy = bvx - 2*dot*-nx, bvy - 2*dot*-ny
+            half = (PROJ_RADIUS-dist)/2
+            ax, ay, bx, by = ax + nx*half, ay + ny*half, bx - nx*half, by - ny*half
+            ax, avx = wall(ax, avx, w)
+            ay, avy = wall(ay, avy, h)
+            bx, bvx = wall(bx, bvx, w)
+            by, bvy = wall(by, bvy, h)
+            pos[i], vel[i] = (ax, ay), (avx, avy)
+            pos[j], vel[j] = (bx, by), (bvx, bvy)
+
+    def _resolve_pairs(self, i, j, alive):
+        # _projectile_contacts for pairs that share no projectile, vectorized
+        kind, team = self.kind, self.team
+        pos, vel = self.pos, self.vel
+        i_sq, j_sq = kind[i] == SQR, kind[j] == SQR
+        d = pos[i]-pos[j]
+        dist = np.sqrt(d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1])
+        touch = ~(i_sq & j_sq & (team[i] == team[j])) & (dist < PROJ_RADIUS) & (dist != 0)
+        clash = touch & (team[i] != team[j]) & (i_sq | j_sq)
+        alive[j[clash & i_sq]] = False
+        alive[i[clash & j_sq]] = False
+        keep = touch & ~clash
+        i, j, d, dist = i[keep], j[keep], d[keep], dist[keep]
+        if i.size == 0: return
+        normal = d*(1/dist)[:, None]   # Vector2 / scalar multiplies by the reciprocal
+        av, bv = vel[i], vel[j]
+        dot = av[:, 0]*normal[:, 0] + av[:, 1]*normal[:, 1]
+        av = av - (2*dot)[:, None]*normal
+        dot = bv[:, 0]*-normal[:, 0] + bv[:, 1]*-normal[:, 1]
+        bv = bv - (2*dot)[:, None]*-normal
+        half = ((PROJ_RADIUS-dist)/2)[:, None]
+        ap, bp = pos[i] + normal*half, pos[j] - normal*half
+        bounce_walls(ap, av, self.width, self.height)
+        bounce_walls(bp, bv, self.width, self.height)
+        pos[i], vel[i] = ap, av
+        pos[j], vel[j] = bp, bv
+
+    def projectile_states(self):
+        # Same parallel lists as World.projectile_states; kind already indexes KIND_NAMES
+        pos = self.pos
+        return (pos[:, 0].tolist(), pos[:, 1].tolist(), self.angle.tolist(),
+                self.team.tolist(), self.kind.tolist())
+
+    def draw(self, surf, alpha=1.0):
+        for u in self.units: u.draw(surf, alpha)
+        pos, angle = self.pos, self.angle
+        if alpha < 1:
+            pos = self.prev_pos + (pos-self.prev_pos)*alpha
+        team, kind = self.team, self.kind
+        for i in range(self.n):
+            k = kind[i]
+            draw_projectile(surf, TEAM_COLORS[team[i]], pos[i, 0], pos[i, 1], angle[i],
+                            k == PENT, k == SQR)
+
+    def team_alive(self, team):
+        return self.alive_count[team] > 0
+
+    def has_projectiles(self, source_type):
+        return bool((self.kind == KIND_OF[source_type]).any())
+
+    def draw_inactive(self, surf):
+        for u in self.units: u.draw(surf)
+
+    def update_inactive(self, surf, dt):
+        for u in self.units: u.update(dt, self)
@@ -1,9 +1,10 @@
 import random
 
 class GachaBanner:
-    def __init__(self, unit_cls, lvlVec_len):
+    def __init__(self, unit_cls, lvlVec_len, rng=None):
         self.unit_cls = unit_cls
         self.lvlVec_len = lvlVec_len
+        self.rng = rng if rng is not None else random.Random()  # pass a seeded Random for reproducible pulls
 
     def base_unit(self):
         return self.unit_cls()
@@ -17,14 +18,14 @@ class GachaBanner:
 
     def _draw_level(self):
         level = 0
-        while random.random() < 0.9:
+        while self.rng.random() < 0.9:
             level += 1
         return level
 
     def _random_partition(self, total, length):
         parts = [0] * length
         for _ in range(total):
-            idx = random.randrange(length)
+            idx = self.rng.randrange(length)
             parts[idx] += 1
         return parts
 
@@ -1,51 +1,97 @@
-import pygame, random, math, GameExTwoClass
+import pygame, random, math, functools, heapq, time, json, collections, GameExTwoClass
 pygame.init()
 WIDTH, HEIGHT = 800, 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-clock = pygame.time.Clock()
 
 TEAM_COLORS = [(200,50,50),(50,50,200)]
 HEAL_BORDER = (255,255,255)
 DMG_BORDER = (0,0,0)
 UNIT_PADDING = 50
 MIN_UNIT_DIST = 60
-
+UNIT_CELL = 64   # broadphase cell sizes (pixels)
+PROJ_CELL = 16
+PROJ_RADIUS = 8  # projectiles closer than this collide
+NEAREST_SCAN = 48  # buckets up to this size are scanned; bigger ones get a grid to ring-search
+BUCKET_CELL = 48
+NEAREST_RINGS = 2  # rings tried before falling back to a scan; misses must stay cheap
+SQUARE_PRIORITY = ['triangle','pentagon','square']  # what interceptors chase first
+PROJ_KINDS = ('triangle','pentagon','square')  # projectile source types, in replay/array index order
+SIM_HZ = 60      # fixed simulation rate for scenes that own a World
+MAX_STEPS_PER_FRAME = 8  # after a long hitch, drop time instead of spiralling
+MAX_BATTLE_TIME = 300.0  # simulated seconds before a fight is called a tie
+STALL_WINDOW = 20.0      # simulated seconds without net hp change before a fight is called a tie
+STALL_EPSILON = 1.0      # hp change per team under this counts as no change
+
+@functools.lru_cache(maxsize=None)
 def regular_polygon(radius, sides):
-    return [(math.cos(2*math.pi*i/sides)*radius, math.sin(2*math.pi*i/sides)*radius)
-            for i in range(sides)]
-
-def random_position(team, existing_units):
+    # Shared by every unit with the same shape; treat the result as read-only
+    return tuple((math.cos(2*math.pi*i/sides)*radius, math.sin(2*math.pi*i/sides)*radius)
+                 for i in range(sides))
+
+ROTATION_STEPS = 8  # corners are placed at rotations rounded to 1/8 degree
+
+def rotation_step(rotation):
+    # Cache key for rotated_terms: rotation in whole 1/ROTATION_STEPS degrees
+    return round(rotation*ROTATION_STEPS) % (360*ROTATION_STEPS)
+
+@functools.lru_cache(maxsize=None)
+def rotated_terms(radius, sides, step):
+    # (x*cos, y*sin, x*sin, y*cos) per vertex of regular_polygon(radius, sides)
+    # turned by step/ROTATION_STEPS degrees. Rounding keeps the cache to at
+    # most 2880 entries per shape whatever the turn rate and tick length, and
+    # the trig is shared by every unit of that shape.
+    rad = math.radians(step/ROTATION_STEPS)
+    cos_r, sin_r = math.cos(rad), math.sin(rad)
+    return tuple((x*cos_r, y*sin_r, x*sin_r, y*cos_r) for x, y in regular_polygon(radius, sides))
+
+def random_position(team, existing_units, width=WIDTH, height=HEIGHT, grid=None, rng=random):
+    # Random spot in the team's half, away from existing_units. For big
+    # crowds pass a SpatialHash of already placed (x, y) tuples as grid
+    # instead; only its neighbours are checked. rng is usually a World's.
     max_attempts = 100
     for _ in range(max_attempts):
-        if team==0: x = random.randint(UNIT_PADDING, WIDTH//2-UNIT_PADDING)
-        else: x = random.randint(WIDTH//2+UNIT_PADDING, WIDTH-UNIT_PADDING)
-        y = random.randint(UNIT_PADDING, HEIGHT-UNIT_PADDING)
+        if team==0: x = rng.randint(UNIT_PADDING, width//2-UNIT_PADDING)
+        else: x = rng.randint(width//2+UNIT_PADDING, width-UNIT_PADDING)
+        y = rng.randint(UNIT_PADDING, height-UNIT_PADDING)
         pos = pygame.Vector2(x,y)
-        if all(pos.distance_to(u.pos)>MIN_UNIT_DIST for u in existing_units):
+        if grid is None: near = (u.pos for u in existing_units)
+        else: near = (p for _, p in grid.query(pos, MIN_UNIT_DIST))
+        if all(pos.distance_to(p)>MIN_UNIT_DIST for p in near):
             return pos
     return pos
 
-def instantiate(formation, team, inventory, wrld):
-        # Turns UnitData objects into objects ready for battle
+def unit_spec(unit_data, pos):
+        # Plain tuple describing a battle unit: (kind, x, y, hp, power, rate, extra, speed, acceleration)
+        # power is damage/heal, extra is the square lifetime. Cheap to pickle and store.
+        x, y = pos[0], pos[1]
+        if isinstance(unit_data, GameExTwoClass.Triangle):
+            return ('triangle', x, y, unit_data.hp, unit_data.damage, unit_data.rate, 0.0, unit_data.speed, unit_data.acceleration)
+        elif isinstance(unit_data, GameExTwoClass.Square):
+            return ('square', x, y, unit_data.hp, 0, unit_data.rate, unit_data.lifetime, unit_data.speed, unit_data.acceleration)
+        elif isinstance(unit_data, GameExTwoClass.Pentagon):
+            return ('pentagon', x, y, unit_data.hp, unit_data.heal, unit_data.rate, 0.0, unit_data.speed, unit_data.acceleration)
+        raise ValueError(f"Unknown unit type {unit_data.__class__.__name__}")
+
+def formation_spec(formation, inventory):
         formation.validate(inventory)
-        world=wrld
-        units = []
-        for uid, pos in formation.slots.items():
-            unit_data = inventory.units[uid]
-
-            if isinstance(unit_data, GameExTwoClass.Triangle):
-                u = Unit(team, pygame.Vector2(*pos),sides=3, behavior=ShooterBehavior(unit_data.damage, unit_data.rate, False, 0.0, unit_data.speed, unit_data.acceleration), hp=unit_data.hp, rotation_speed=30)
-                world.units.append(u)
-            elif isinstance(unit_data, GameExTwoClass.Square):
-                u = Unit(team, pygame.Vector2(*pos),sides=4, behavior=ShooterBehavior(0, unit_data.rate, True, unit_data.lifetime, unit_data.speed, unit_data.acceleration), hp=unit_data.hp, rotation_speed=30)
-                world.units.append(u)
-            elif isinstance(unit_data, GameExTwoClass.Pentagon):
-                u = Unit(team, pygame.Vector2(*pos),sides=5, behavior=HealerBehavior(unit_data.heal, unit_data.rate, unit_data.speed, unit_data.acceleration), hp=unit_data.hp, rotation_speed=30)
-                world.units.append(u)
-            units.append(u)
-
+        return tuple(unit_spec(inventory.units[uid], pos) for uid, pos in formation.slots.items())
+
+def unit_from_spec(spec, team):
+        kind, x, y, hp, power, rate, extra, speed, acceleration = spec
+        if kind == 'triangle':
+            return Unit(team, pygame.Vector2(x, y), sides=3, behavior=ShooterBehavior(power, rate, False, 0.0, speed, acceleration), hp=hp, rotation_speed=30)
+        elif kind == 'square':
+            return Unit(team, pygame.Vector2(x, y), sides=4, behavior=ShooterBehavior(0, rate, True, extra, speed, acceleration), hp=hp, rotation_speed=30)
+        return Unit(team, pygame.Vector2(x, y), sides=5, behavior=HealerBehavior(power, rate, speed, acceleration), hp=hp, rotation_speed=30)
+
+def instantiate_spec(spec, team, wrld):
+        units = [unit_from_spec(s, team) for s in spec]
+        for u in units: wrld.add_unit(u)
         return units
 
+def instantiate(formation, team, inventory, wrld):
+        # Turns UnitData objects into objects ready for battle
+        return instantiate_spec(formation_spec(formation, inventory), team, wrld)
+
 def instantiatedummy(formation, team, inventory, wrld):
         # Turns UnitData objects into dummies that do not shoot
         formation.validate(inventory)
@@ -56,23 +102,120 @@ def instantiatedummy(formation, team, inventory, wrld):
 
             if isinstance(unit_data, GameExTwoClass.Triangle):
                 u = Unit(team, pygame.Vector2(*pos),sides=3, behavior=None, hp=unit_data.hp, rotation_speed=30)
-                world.units.append(u)
+                world.add_unit(u)
             elif isinstance(unit_data, GameExTwoClass.Square):
                 u = Unit(team, pygame.Vector2(*pos),sides=4, behavior=None, hp=unit_data.hp, rotation_speed=30)
-                world.units.append(u)
+                world.add_unit(u)
             elif isinstance(unit_data, GameExTwoClass.Pentagon):
                 u = Unit(team, pygame.Vector2(*pos),sides=5, behavior=None, hp=unit_data.hp, rotation_speed=30)
-                world.units.append(u)
+                world.add_unit(u)
             units.append(u)
 
         return units
 
 
+@functools.lru_cache(maxsize=None)
+def ring_offsets(r):
+    # Cell offsets at Chebyshev distance r, for ring searches
+    if r == 0: return ((0, 0),)
+    return (tuple((x, y) for x in range(-r, r+1) for y in (-r, r))
+            + tuple((x, y) for x in (-r, r) for y in range(-r+1, r)))
+
+
+# Uniform grid broadphase. Cells hold (seq, obj) entries so queries come back
+# in insertion order, which keeps results identical to scanning the full list.
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.where = {}  # obj -> (cell, entry)
+        self.count = 0
+
+    def cell_of(self, pos):
+        return (int(pos.x//self.cell_size), int(pos.y//self.cell_size))
+
+    def clear(self):
+        self.cells.clear()
+        self.where.clear()
+        self.count = 0
+
+    def insert(self, obj, pos):
+        cell = self.cell_of(pos)
+        entry = (self.count, obj)
+        self.count += 1
+        self.cells.setdefault(cell, []).append(entry)
+        self.where[obj] = (cell, entry)
+
+    def move(self, obj, pos):
+        cell, entry = self.where[obj]
+        new_cell = self.cell_of(pos)
+        if new_cell == cell: return
+        self.cells[cell].remove(entry)
+        self.cells.setdefault(new_cell, []).append(entry)
+        self.where[obj] = (new_cell, entry)
+
+    def query(self, pos, reach):
+        cs = self.cell_size
+        x0, x1 = int((pos.x-reach)//cs), int((pos.x+reach)//cs)
+        y0, y1 = int((pos.y-reach)//cs), int((pos.y+reach)//cs)
+        found = []
+        for cx in range(x0, x1+1):
+            for cy in range(y0, y1+1):
+                bucket = self.cells.get((cx, cy))
+                if bucket: found.extend(bucket)
+        found.sort(key=lambda e: e[0])
+        return found
+
+    def nearest(self, pos, accept, max_rings):
+        # Closest object accepted by accept(obj), searching rings of cells
+        # outward from pos; objects need a .pos. Ties go to the one inserted
+        # first, same as a min() over the insertion-ordered list would.
+        # Returns (obj, True), or (None, False) if max_rings were searched
+        # without settling it.
+        cs = self.cell_size
+        cells = self.cells
+        cx, cy = self.cell_of(pos)
+        best, best_d, best_seq = None, 0.0, 0
+        for r in range(max_rings+1):
+            # everything in ring r is at least (r-1) cells away
+            if best is not None and (r-1)*cs > best_d: break
+            for dx, dy in ring_offsets(r):
+                bucket = cells.get((cx+dx, cy+dy))
+                if not bucket: continue
+                for seq, obj in bucket:
+                    if not accept(obj): continue
+                    d = pos.distance_to(obj.pos)
+                    if best is None or d < best_d or (d == best_d and seq < best_seq):
+                        best, best_d, best_seq = obj, d, seq
+        else:
+            # the next ring would start max_rings cells away
+            if best is None or best_d >= max_rings*cs: return None, False
+        return best, True
+
+    def scan(self, pos, reach):
+        # Yields everything that may be within reach of pos, in insertion order.
+        # pos can be a live Vector2 the caller moves while iterating (bounces);
+        # once it drifts past the slack the neighbourhood is queried again.
+        origin = pygame.Vector2(pos)
+        slack = self.cell_size/2
+        entries = self.query(origin, reach+slack)
+        i = 0
+        while i < len(entries):
+            seq, obj = entries[i]
+            i += 1
+            yield obj
+            if pos.distance_squared_to(origin) > slack*slack:
+                origin = pygame.Vector2(pos)
+                entries = [e for e in self.query(origin, reach+slack) if e[0] > seq]
+                i = 0
+
+
 class Unit:
     def __init__(self, team, pos, sides, behavior, hp=100, rotation_speed=30):
         self.team = team
         self.color = TEAM_COLORS[team]
         self.pos = pygame.Vector2(pos)
+        self.prev_pos = pygame.Vector2(pos)  # position at the previous sim step, for interpolation
         self.sides = sides
         self.shape = regular_polygon(20, sides)
         self.behavior = behavior
@@ -89,31 +232,31 @@ class Unit:
 
     def update(self, dt, world):
         if not self.alive: return
+        self.prev_pos.update(self.pos)
         self.rotation = (self.rotation+self.rotation_speed*dt)%360
         if self.behavior != None:
             self.behavior.update(self, dt, world)
         self.pos += self.vel*dt
         # Bounce off walls
         if self.pos.x<0: self.pos.x=0; self.vel.x*=-1
-        if self.pos.x>WIDTH: self.pos.x=WIDTH; self.vel.x*=-1
+        if self.pos.x>world.width: self.pos.x=world.width; self.vel.x*=-1
         if self.pos.y<0: self.pos.y=0; self.vel.y*=-1
-        if self.pos.y>HEIGHT: self.pos.y=HEIGHT; self.vel.y*=-1
+        if self.pos.y>world.height: self.pos.y=world.height; self.vel.y*=-1
     
-    def respawn(self, existing_units):
-        position = random_position(self.team, existing_units)
+    def respawn(self, existing_units, world):
+        position = random_position(self.team, existing_units, world.width, world.height, rng=world.rng)
         u = Unit(self.team, position, self.sides, self.behavior, self.max_hp, self.rotation_speed)
         return u
 
-    def get_corners(self):
-        rad = math.radians(self.rotation)
-        cos_r, sin_r = math.cos(rad), math.sin(rad)
-        return [(self.pos.x + x*cos_r - y*sin_r, self.pos.y + x*sin_r + y*cos_r) for x,y in self.shape]
+    def get_corners(self, pos=None):
+        if pos is None: pos = self.pos
+        return [(pos.x + xc - ys, pos.y + xs + yc) for xc, ys, xs, yc in rotated_terms(20, self.sides, rotation_step(self.rotation))]
 
     def get_next_corner(self):
-        corners = self.get_corners()
-        corner = pygame.Vector2(corners[self.next_corner_idx])
-        self.next_corner_idx = (self.next_corner_idx+1)%len(corners)
-        return corner
+        # Only the corner that fires is built
+        xc, ys, xs, yc = rotated_terms(20, self.sides, rotation_step(self.rotation))[self.next_corner_idx]
+        self.next_corner_idx = (self.next_corner_idx+1)%self.sides
+        return pygame.Vector2(self.pos.x + xc - ys, self.pos.y + xs + yc)
     
     def draw_hp_bar(screen, pos, hp, max_hp):
         base_length = 50
@@ -127,61 +270,74 @@ class Unit:
         pygame.draw.rect(screen, (0, 200, 0), (x, y, length, height))
 
 
-    def draw(self, surf):
+    def draw(self, surf, alpha=1.0):
         if not self.alive:
             return
+        # alpha blends between the last two sim steps (fixed-step rendering)
+        pos = self.pos if alpha >= 1 else self.prev_pos.lerp(self.pos, alpha)
 
         # draw the unit shape
-        pygame.draw.polygon(surf, self.color, self.get_corners())
+        SPRITES.blit(surf, SPRITES.unit(self.sides, self.color, self.rotation), pos.x, pos.y)
 
         # draw HP bar
-        self.draw_hp_bar(surf)
+        self.draw_hp_bar(surf, pos)
 
-    def draw_hp_bar(self, surf):
+    def draw_hp_bar(self, surf, pos=None):
         max_length_per_100 = 30  # default bar length, height
         bar_h = 4
     
         base_length = int(max_length_per_100 * (self.max_hp / 100))
         filled_length = int(base_length * (self.hp / self.max_hp))
     
-        cx, cy = self.pos
+        cx, cy = self.pos if pos is None else pos
         # place bar under the unit center
         x = cx - base_length // 2
         y = cy + 5
-    
-        pygame.draw.rect(surf, (100, 0, 0), (x, y, base_length, bar_h))
-        pygame.draw.rect(surf, (0, 200, 0), (x, y, filled_length, bar_h))
-        pygame.draw.rect(surf, (0, 0, 0), (x, y, base_length, bar_h), 1)
+        surf.blit(SPRITES.hp_bar(base_length, filled_length, bar_h), (x, y))
 
 
 
 class Projectile:
+    # Slotted and recycled through ProjectilePool, so reset() must set every field
+    __slots__ = ('team','color','pos','prev_pos','damage','max_speed','acceleration','healing',
+                 'defensive','lifetime','source_type','alive','shape','vel','angle','init_vel',
+                 'initialized','iframes','target')
+
     def __init__(self, team, pos, damage=10, speed=100, acceleration = 200,
                  healing=False, defensive=False, lifetime=3.0, source_type='triangle'):
+        self.pos = pygame.Vector2(pos)
+        self.prev_pos = pygame.Vector2(pos)
+        self.vel = pygame.Vector2(0,0)
+        self.reset(team, pos, damage, speed, acceleration, healing, defensive, lifetime, source_type)
+
+    def reset(self, team, pos, damage=10, speed=100, acceleration = 200,
+              healing=False, defensive=False, lifetime=3.0, source_type='triangle'):
         self.team = team
         self.color = TEAM_COLORS[team]
-        self.pos = pygame.Vector2(pos)
+        self.pos.update(pos)
+        self.prev_pos.update(pos)
         self.damage = damage
         self.max_speed = speed
         self.acceleration = acceleration
         self.healing = healing
         self.defensive = defensive
-        if self.defensive:
-            self.lifetime=lifetime
+        self.lifetime = lifetime  # only counts down for defensive projectiles
         self.source_type = source_type
         self.alive = True
-        self.shape = [(0,-8),(-4,8),(4,8)]
-        self.vel = pygame.Vector2(0,0)
+        self.shape = PROJ_SHAPE
+        self.vel.update(0,0)
         self.angle=0
         self.init_vel=speed
         self.initialized=False
         self.iframes=0.5
+        self.target=None
 
     def reflect_ip(self, normal):
         self.vel = self.vel - 2*self.vel.dot(normal)*normal
 
     def update(self, dt, world):
         if not self.alive: return
+        self.prev_pos.update(self.pos)
         if self.iframes >= 0:
             self.iframes -= dt
 
@@ -191,12 +347,7 @@ class Projectile:
             if self.lifetime <= 0:
                 self.alive = False
                 return
-            enemy_projs=[p for p in world.projectiles if p.team!=self.team and p.alive]
-            priority=['triangle','pentagon','square']
-            target=None
-            for kind in priority:
-                kind_projs=[p for p in enemy_projs if p.source_type==kind]
-                if kind_projs: target=min(kind_projs,key=lambda e:e.pos.distance_to(self.pos)); break
+            target=world.nearest_projectile(self.pos, self.team, SQUARE_PRIORITY)
             if not self.initialized:
                 self.vel=pygame.Vector2(0,-1)*self.init_vel
                 self.initialized=True
@@ -224,18 +375,17 @@ class Projectile:
                     self.vel.scale_to_length(self.max_speed)
 
             # Annihilate enemy projectiles on contact
-            for p in enemy_projs:
+            for p in world.proj_grid.scan(self.pos, 12):
+                if p.team==self.team or not p.alive: continue
                 if self.pos.distance_to(p.pos)<12:
                     if p.defensive:
                         self.alive = False
                         p.alive = False
                         return
                     p.alive=False
-            # Bounce off walls
-            if self.pos.x<0 or self.pos.x>WIDTH: self.vel.x*=-1; self.pos.x=max(0,min(WIDTH,self.pos.x))
-            if self.pos.y<0 or self.pos.y>HEIGHT: self.vel.y*=-1; self.pos.y=max(0,min(HEIGHT,self.pos.y))
+            self.bounce_walls(world)
             # Bounce off all units
-            for u in world.units:
+            for u in world.unit_grid.scan(self.pos, 20):
                 if not u.alive: continue
                 offset=self.pos-u.pos
                 dist=offset.length()
@@ -250,17 +400,18 @@ class Projectile:
             enemies=[u for u in world.units if u.team!=self.team and u.alive]
             if enemies: self.target=min(enemies,key=lambda e:e.pos.distance_to(self.pos))
         elif self.source_type=='pentagon':
-            allies=[u for u in world.units if u.team==self.team and u.alive and u.hp<u.max_hp]
-            self.target=min(allies,key=lambda a:(a.hp/a.max_hp)) if allies else None
+            self.target=world.most_wounded(self.team)
             if not self.target: self.alive=False; return
 
-        if not hasattr(self,'target') or not self.target or not self.target.alive:
+        if not self.target or not self.target.alive:
             self.alive=False; return
 
-        to_target=(self.target.pos-self.pos).normalize()
+        to_target=self.target.pos-self.pos
+        # both can end up pinned in the same arena corner
+        to_target=to_target.normalize() if to_target.length_squared()>0 else pygame.Vector2(0,-1)
 
         # Bounce off units they cannot hit
-        for u in world.units:
+        for u in world.unit_grid.scan(self.pos, 20):
             if not u.alive: continue
             offset=self.pos-u.pos
             dist=offset.length()
@@ -271,8 +422,7 @@ class Projectile:
             elif self.defensive: can_hit=False
             # Triangle projectiles
             if self.source_type=='triangle' and u.team!=self.team and dist<radius:
-                u.hp-=self.damage
-                if u.hp<=0: u.alive=False
+                world.damage_unit(u, self.damage)
                 self.alive=False
             # Pentagon projectiles
             elif not can_hit and dist<radius:
@@ -281,13 +431,13 @@ class Projectile:
             # Pentagon projectile heals and dies on friendly units
             elif self.healing and u.team==self.team and dist<radius:
                 if self.iframes <= 0:
-                    u.hp=min(u.max_hp,u.hp+self.damage)
+                    world.heal_unit(u, self.damage)
                     self.alive=False
 
         # Avoid friendly units for triangle projectiles
         avoid=pygame.Vector2(0,0)
         if self.source_type=='triangle':
-            for u in world.units:
+            for u in world.unit_grid.scan(self.pos, 30):
                 if u.team==self.team and u.alive:
                     offset=self.pos-u.pos
                     dist=offset.length()
@@ -330,43 +480,105 @@ class Projectile:
         self.angle = math.degrees(math.atan2(new_dir.y, new_dir.x)) + 90
 
 
-        # Projectile-projectile collisions
-        for other in world.projectiles:
-            if other is self or not other.alive: continue
-            offset=self.pos-other.pos
-            dist=offset.length()
-            min_dist=8
-            if dist<min_dist:
-                # Square destroys enemy projectiles
-                if self.defensive and other.team!=self.team: other.alive=False; continue
-                if other.defensive and self.team!=other.team: self.alive=False; continue
-                normal=offset.normalize()
-                self.reflect_ip(normal)
-                other.reflect_ip(-normal)
-                overlap=min_dist-dist
-                self.pos+=normal*(overlap/2)
-                other.pos-=normal*(overlap/2)
+        # Projectile-projectile collisions are resolved by World after every projectile has moved
+        self.bounce_walls(world)
 
-        # Bounce off walls
-        if self.pos.x<0 or self.pos.x>WIDTH: self.vel.x*=-1; self.pos.x=max(0,min(WIDTH,self.pos.x))
-        if self.pos.y<0 or self.pos.y>HEIGHT: self.vel.y*=-1; self.pos.y=max(0,min(HEIGHT,self.pos.y))
+    def bounce_walls(self, world):
+        w,h=world.width,world.height
+        if self.pos.x<0 or self.pos.x>w: self.vel.x*=-1; self.pos.x=max(0,min(w,self.pos.x))
+        if self.pos.y<0 or self.pos.y>h: self.vel.y*=-1; self.pos.y=max(0,min(h,self.pos.y))
 
-    def draw(self,surf):
+    def draw(self,surf,alpha=1.0):
         if not self.alive: return
-        if self.defensive:
-            pygame.draw.circle(surf,self.color,(int(self.pos.x),int(self.pos.y)),5)
-            pygame.draw.circle(surf,DMG_BORDER,(int(self.pos.x),int(self.pos.y)),5,1)
-        else:
-            rotated=[]
-            rad=math.radians(self.angle)
-            cos_r,sin_r=math.cos(rad),math.sin(rad)
-            for x,y in self.shape:
-                rx=x*cos_r - y*sin_r
-                ry=x*sin_r + y*cos_r
-                rotated.append((self.pos.x+rx,self.pos.y+ry))
-            border_color=HEAL_BORDER if self.healing else DMG_BORDER
-            pygame.draw.polygon(surf,self.color,rotated)
-            pygame.draw.polygon(surf,border_color,rotated,2)
+        pos = self.pos if alpha >= 1 else self.prev_pos.lerp(self.pos, alpha)
+        draw_projectile(surf,self.color,pos.x,pos.y,self.angle,self.healing,self.defensive)
+
+PROJ_SHAPE = [(0,-8),(-4,8),(4,8)]
+
+# Pre-rendered unit and projectile images keyed by (shape, colour, border,
+# angle bucket). Built the first time a combination is drawn and shared by
+# every World, so drawing anything in a battle is one blit. hp bars come in
+# one length per max hp and fill level, so they are kept in a bounded LRU.
+class SpriteCache:
+    ANGLE_STEP = 5  # degrees per rotation bucket; under a pixel of error at unit size
+    KEY = (255, 0, 255)  # transparent colour; RLE colour-keyed blits beat per-pixel alpha here
+    BAR_CACHE_SIZE = 256  # hp bars kept around; a battle shows one per unit
+
+    def __init__(self):
+        self.sprites = {}
+        self.bars = collections.OrderedDict()
+
+    def bucket(self, angle):
+        return int(round(angle/self.ANGLE_STEP)) % (360//self.ANGLE_STEP)
+
+    def unit(self, sides, color, rotation):
+        key = (sides, color, None, self.bucket(rotation))
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = self._polygon(regular_polygon(20, sides), color, None, key[3]*self.ANGLE_STEP)
+        return sprite
+
+    def projectile(self, color, angle, healing, defensive):
+        if defensive: key = ('square', color, DMG_BORDER, 0)   # round, so one sprite will do
+        else: key = ('pentagon' if healing else 'triangle', color, HEAL_BORDER if healing else DMG_BORDER, self.bucket(angle))
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            if defensive:
+                sprite = self._image(6)
+                pygame.draw.circle(sprite, color, (6, 6), 5)
+                pygame.draw.circle(sprite, DMG_BORDER, (6, 6), 5, 1)
+                sprite = self._ready(sprite)
+            else:
+                sprite = self._polygon(PROJ_SHAPE, color, key[2], key[3]*self.ANGLE_STEP)
+            self.sprites[key] = sprite
+        return sprite
+
+    def hp_bar(self, base_length, filled_length, bar_h):
+        key = (base_length, filled_length, bar_h)
+        sprite = self.bars.get(key)
+        if sprite is not None:
+            self.bars.move_to_end(key)
+            return sprite
+        sprite = pygame.Surface((max(1, base_length), bar_h))
+        sprite.fill((100, 0, 0))
+        pygame.draw.rect(sprite, (0, 200, 0), (0, 0, filled_length, bar_h))
+        pygame.draw.rect(sprite, (0, 0, 0), (0, 0, base_length, bar_h), 1)
+        if pygame.display.get_surface(): sprite = sprite.convert()
+        self.bars[key] = sprite
+        if len(self.bars) > self.BAR_CACHE_SIZE:
+            self.bars.popitem(last=False)
+        return sprite
+
+    def _polygon(self, shape, color, border, angle):
+        rad = math.radians(angle)
+        cos_r, sin_r = math.cos(rad), math.sin(rad)
+        r = math.ceil(max(math.hypot(x, y) for x, y in shape)) + 2
+        points = [(r + x*cos_r - y*sin_r, r + x*sin_r + y*cos_r) for x, y in shape]
+        image = self._image(r)
+        pygame.draw.polygon(image, color, points)
+        if border: pygame.draw.polygon(image, border, points, 2)
+        return self._ready(image)
+
+    def _image(self, r):
+        image = pygame.Surface((2*r+1, 2*r+1))
+        image.fill(self.KEY)
+        return image
+
+    def _ready(self, image):
+        # Match the display format once there is one; blits get a lot cheaper
+        if pygame.display.get_surface(): image = image.convert()
+        image.set_colorkey(self.KEY, pygame.RLEACCEL)
+        return image
+
+    def blit(self, surf, sprite, x, y):
+        # sprite centred on (x, y)
+        surf.blit(sprite, (int(x) - sprite.get_width()//2, int(y) - sprite.get_height()//2))
+
+SPRITES = SpriteCache()
+
+# Shared by every World backend so projectiles look the same everywhere
+def draw_projectile(surf, color, x, y, angle, healing, defensive):
+    SPRITES.blit(surf, SPRITES.projectile(color, angle, healing, defensive), x, y)
 
 # For determining unit behaviors
 class ShooterBehavior:
@@ -382,14 +594,13 @@ class ShooterBehavior:
         self.cooldown-=dt
         if self.cooldown>0: return
         spawn_pos=unit.get_next_corner()
-        proj=Projectile(unit.team,spawn_pos,
-                        damage=self.atk,
-                        speed=self.proj_speed,
-                        acceleration=self.acceleration,
-                        defensive=self.defensive,
-                        lifetime=self.lifetime,
-                        source_type='square' if self.defensive else 'triangle')
-        world.projectiles.append(proj)
+        world.spawn_projectile(unit.team,spawn_pos,
+                               damage=self.atk,
+                               speed=self.proj_speed,
+                               acceleration=self.acceleration,
+                               defensive=self.defensive,
+                               lifetime=self.lifetime,
+                               source_type='square' if self.defensive else 'triangle')
         self.cooldown=self.rate
 
 class HealerBehavior:
@@ -403,27 +614,387 @@ class HealerBehavior:
         self.cooldown-=dt
         if self.cooldown>0: return
         spawn_pos=unit.get_next_corner()
-        proj=Projectile(unit.team,spawn_pos,damage=self.heal,
-                        healing=True,speed=self.speed,acceleration=self.acceleration,source_type='pentagon')
-        world.projectiles.append(proj)
+        world.spawn_projectile(unit.team,spawn_pos,damage=self.heal,
+                               healing=True,speed=self.speed,acceleration=self.acceleration,source_type='pentagon')
         self.cooldown=self.rate
 
+# Per-team min-heap of wounded units keyed by (hp/max_hp, add order), so healers
+# find the most wounded ally in O(log n). Every hp change pushes a fresh entry;
+# outdated ones are skipped when they reach the top.
+class WoundedIndex:
+    def __init__(self):
+        self.heaps={}
+        self.stamps={}  # unit -> [add order, version]
+        self.count=0
+    def track(self, u):
+        self.stamps[u]=[self.count,0]
+        self.count+=1
+        self.push(u)
+    def untrack(self, u):
+        self.stamps.pop(u, None)
+    def changed(self, u):
+        stamp=self.stamps.get(u)
+        if stamp is None: return
+        stamp[1]+=1
+        self.push(u)
+    def push(self, u):
+        if not u.alive or u.hp>=u.max_hp: return
+        seq,version=self.stamps[u]
+        heap=self.heaps.setdefault(u.team,[])
+        heapq.heappush(heap,(u.hp/u.max_hp,seq,version,u))
+        if len(heap)>4*len(self.stamps)+64:
+            heap[:]=[e for e in heap if self.is_current(e)]
+            heapq.heapify(heap)
+    def is_current(self, entry):
+        ratio,seq,version,u=entry
+        stamp=self.stamps.get(u)
+        return stamp is not None and stamp[1]==version and u.alive and u.hp<u.max_hp
+    def most_wounded(self, team):
+        heap=self.heaps.get(team)
+        while heap:
+            if self.is_current(heap[0]): return heap[0][3]
+            heapq.heappop(heap)
+        return None
+
+# Per-phase wall time and event counters for World.update. Attach one as
+# world.prof; every hook sits behind an `if prof:` test, so a world without
+# a profiler pays only for that test.
+class WorldProfiler:
+    PHASES = ('units', 'broadphase', 'projectiles', 'collisions', 'compaction')
+    COUNTERS = ('pair_tests', 'spawned', 'killed', 'hits', 'heals')
+
+    def __init__(self, window=60):
+        self.ticks = 0
+        self.totals = dict.fromkeys(self.PHASES, 0.0)
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.recent = collections.deque(maxlen=window)  # phase times of the last ticks, for the overlay
+
+    def start(self):
+        return time.perf_counter()
+
+    def lap(self, phase, t0):
+        # Charge the time since t0 to phase; returns the new t0
+        now = time.perf_counter()
+        self.current[phase] += now-t0
+        return now
+
+    def count(self, name, n=1):
+        self.counts[name] += n
+
+    def end_tick(self):
+        for k, v in self.current.items():
+            self.totals[k] += v
+        self.recent.append(self.current)
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.ticks += 1
+
+    def recent_ms(self):
+        n = len(self.recent) or 1
+        return {k: sum(t[k] for t in self.recent)*1000/n for k in self.PHASES}
+
+    def summary(self):
+        n = self.ticks or 1
+        return {
+            "ticks": self.ticks,
+            "total_ms": {k: v*1000 for k, v in self.totals.items()},
+            "mean_ms": {k: v*1000/n for k, v in self.totals.items()},
+            "counts": dict(self.counts),
+        }
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+# Dead projectiles are kept here and handed out again instead of allocating new ones
+class ProjectilePool:
+    def __init__(self):
+        self.free=[]
+    def acquire(self, team, pos, **kwargs):
+        if self.free:
+            p=self.free.pop()
+            p.reset(team, pos, **kwargs)
+            return p
+        return Projectile(team, pos, **kwargs)
+    def release(self, p):
+        p.target=None
+        self.free.append(p)
+
 # Battle arena
 class World:
-    def __init__(self):
+    def __init__(self, width=WIDTH, height=HEIGHT, rng=None):
+        self.width=width    # arena size; walls bounce units and projectiles
+        self.height=height
+        self.rng=rng if rng is not None else random.Random()  # all randomness inside this world
         self.units=[]
         self.projectiles=[]
+        self.unit_grid=SpatialHash(UNIT_CELL)
+        self.proj_grid=SpatialHash(PROJ_CELL)
+        self.proj_buckets={}
+        self.bucket_grids={}
+        self.pool=ProjectilePool()
+        self.wounded=WoundedIndex()
+        self.prof=None      # WorldProfiler while profiling
+        self.alive_count=[0,0]  # live units per team
+        self.proj_count=dict.fromkeys(PROJ_KINDS,0)  # projectiles per source_type, counted until compacted away
+        self.deaths=[]      # units that died during the last update
+    # Units join and leave through these so the per-team indexes stay in sync
+    def add_unit(self, u):
+        self.units.append(u)
+        self.wounded.track(u)
+        if u.alive: self.alive_count[u.team]+=1
+    def remove_unit(self, u):
+        self.units.remove(u)
+        self.wounded.untrack(u)
+        if u.alive: self.alive_count[u.team]-=1
+    # All hp changes during a battle go through here
+    def damage_unit(self, u, amount):
+        u.hp-=amount
+        if u.hp<=0 and u.alive:
+            u.alive=False
+            self.alive_count[u.team]-=1
+            self.deaths.append(u)
+        self.wounded.changed(u)
+        if self.prof: self.prof.count('hits')
+    def heal_unit(self, u, amount):
+        u.hp=min(u.max_hp,u.hp+amount)
+        self.wounded.changed(u)
+        if self.prof: self.prof.count('heals')
+    def most_wounded(self, team):
+        return self.wounded.most_wounded(team)
+    def rebuild_grids(self):
+        # Once per tick, after units have moved and fired
+        self.unit_grid.clear()
+        for u in self.units:
+            if u.alive: self.unit_grid.insert(u, u.pos)
+        self.proj_grid.clear()
+        for p in self.projectiles:
+            if p.alive: self.proj_grid.insert(p, p.pos)
+    def rebuild_buckets(self):
+        # Projectiles grouped by (team, source_type), in list order; liveness is checked on lookup
+        self.proj_buckets={}
+        for p in self.projectiles:
+            if p.alive: self.proj_buckets.setdefault((p.team,p.source_type),[]).append(p)
+        # big buckets also get their own grid for nearest_projectile
+        self.bucket_grids={}
+        for key,bucket in self.proj_buckets.items():
+            if len(bucket)<=NEAREST_SCAN: continue
+            grid=self.bucket_grids[key]=SpatialHash(BUCKET_CELL)
+            for p in bucket: grid.insert(p, p.pos)
+    def nearest_projectile(self, pos, team, kinds):
+        # Closest live enemy projectile of the first kind in `kinds` that has
+        # any. Big buckets are ring-searched on their grid (kept current while
+        # projectiles move) for NEAREST_RINGS rings around pos; small buckets,
+        # and targets further away than that, are scanned.
+        enemy=1-team
+        for kind in kinds:
+            bucket=self.proj_buckets.get((enemy,kind))
+            if not bucket: continue
+            found=False
+            grid=self.bucket_grids.get((enemy,kind))
+            if grid:
+                best,found=grid.nearest(pos, lambda p: p.alive, NEAREST_RINGS)
+            if not found:
+                best=None
+                for p in bucket:
+                    if not p.alive: continue
+                    d=pos.distance_to(p.pos)
+                    if best is None or d<best_d: best,best_d=p,d
+            if best is not None: return best
+        return None
     def update(self, dt):
+        prof=self.prof
+        if prof: t=prof.start()
+        self.deaths.clear()
         for u in self.units: u.update(dt,self)
-        for p in list(self.projectiles): p.update(dt,self)
-        self.projectiles=[p for p in self.projectiles if p.alive]
-    def draw(self,surf):
-        for u in self.units: u.draw(surf)
-        for p in self.projectiles: p.draw(surf)
+        if prof: t=prof.lap('units',t)
+        self.rebuild_grids()
+        self.rebuild_buckets()
+        if prof: t=prof.lap('broadphase',t)
+        for p in list(self.projectiles):
+            p.update(dt,self)
+            # keep the grids in step with moved projectiles for later queries this tick
+            if p.alive:
+                self.proj_grid.move(p, p.pos)
+                grid=self.bucket_grids.get((p.team,p.source_type))
+                if grid: grid.move(p, p.pos)
+        if prof: t=prof.lap('projectiles',t)
+        self.resolve_projectile_contacts()
+        if prof: t=prof.lap('collisions',t)
+        self.compact_projectiles()
+        if prof: prof.lap('compaction',t); prof.end_tick()
+    def projectile_pairs(self):
+        # Sort-and-sweep on x: every pair whose x spans overlap, listed once
+        live=sorted((p for p in self.projectiles if p.alive), key=lambda p: p.pos.x)
+        pairs=[]
+        tests=0
+        n=len(live)
+        for i,a in enumerate(live):
+            ax=a.pos.x
+            j=i+1
+            while j<n and live[j].pos.x-ax<PROJ_RADIUS:
+                b=live[j]
+                if abs(b.pos.y-a.pos.y)<PROJ_RADIUS: pairs.append((a,b))
+                j+=1
+            tests+=j-i-1
+        if self.prof: self.prof.count('pair_tests',tests)
+        return pairs
+    def resolve_projectile_contacts(self):
+        # Each touching pair is resolved exactly once: squares annihilate enemy
+        # projectiles, everything else reflects off each other
+        for a,b in self.projectile_pairs():
+            if not a.alive or not b.alive: continue
+            if a.defensive and b.defensive and a.team==b.team: continue
+            offset=a.pos-b.pos
+            dist=offset.length()
+            if dist>=PROJ_RADIUS or dist==0: continue
+            if a.team!=b.team and (a.defensive or b.defensive):
+                if a.defensive: b.alive=False
+                if b.defensive: a.alive=False
+                continue
+            normal=offset/dist
+            a.reflect_ip(normal)
+            b.reflect_ip(-normal)
+            overlap=PROJ_RADIUS-dist
+            a.pos+=normal*(overlap/2)
+            b.pos-=normal*(overlap/2)
+            a.bounce_walls(self)
+            b.bounce_walls(self)
+    def compact_projectiles(self):
+        # Swap-remove dead projectiles in place and return them to the pool
+        projs=self.projectiles
+        before=len(projs)
+        i=0
+        while i<len(projs):
+            p=projs[i]
+            if p.alive: i+=1; continue
+            last=projs.pop()
+            if i<len(projs): projs[i]=last
+            self.proj_count[p.source_type]-=1
+            self.pool.release(p)
+        if self.prof: self.prof.count('killed',before-len(projs))
+    def spawn_projectile(self, team, pos, **kwargs):
+        p=self.pool.acquire(team, pos, **kwargs)
+        self.projectiles.append(p)
+        self.proj_count[p.source_type]+=1
+        if self.prof: self.prof.count('spawned')
+        return p
+    def projectile_states(self):
+        # Parallel lists (x, y, angle, team, kind index) for replays; kinds index PROJ_KINDS
+        projs=self.projectiles
+        return ([p.pos.x for p in projs], [p.pos.y for p in projs], [p.angle for p in projs],
+                [p.team for p in projs], [PROJ_KINDS.index(p.source_type) for p in projs])
+    def draw(self,surf,alpha=1.0):
+        for u in self.units: u.draw(surf,alpha)
+        for p in self.projectiles: p.draw(surf,alpha)
     def team_alive(self, team):
-        return any(u.alive and u.team==team for u in self.units)
+        return self.alive_count[team]>0
+    def has_projectiles(self, source_type):
+        # Between updates every projectile still listed is alive
+        return self.proj_count[source_type]>0
     def draw_inactive(self,surf):
         for u in self.units: u.draw(surf)
     def update_inactive(self,surf,dt):
         for u in self.units: u.update(dt,self)
 
+# Fixed-timestep accumulator: the sim always advances in step_dt slices no
+# matter how long a frame took, and advance() returns how far the leftover
+# time reaches into the next step so rendering can interpolate.
+class FixedStep:
+    def __init__(self, hz=SIM_HZ, max_steps=MAX_STEPS_PER_FRAME):
+        self.step_dt = 1/hz
+        self.max_steps = max_steps
+        self.acc = 0.0
+
+    def advance(self, frame_dt, step):
+        self.acc += frame_dt
+        steps = 0
+        while self.acc >= self.step_dt and steps < self.max_steps:
+            step(self.step_dt)
+            self.acc -= self.step_dt
+            steps += 1
+        if self.acc >= self.step_dt:
+            self.acc = self.acc % self.step_dt
+        return self.acc/self.step_dt
+
+# One fight between two instantiated teams, independent of any display.
+# BattleScene and the headless runner both drive it with step().
+class Battle:
+    # Ends in a tie when neither side can deal damage any more, when neither
+    # team's total hp moved over stall_window, or at max_time. Either limit
+    # can be switched off with None.
+    #
+    # Battles are deterministic: spawn corners cycle in order, cooldowns start
+    # at zero and nothing in a battle draws from world.rng. The same two teams
+    # always play out the same way, on every backend, so there is no seed to
+    # pass and a matchup only ever needs playing once.
+    def __init__(self, world, player_units, enemy_units, max_time=MAX_BATTLE_TIME,
+                 stall_window=STALL_WINDOW, recorder=None):
+        self.world = world
+        self.player_units = player_units
+        self.enemy_units = enemy_units
+        self.max_time = max_time
+        self.stall_window = stall_window
+        self.time = 0.0
+        self.ticks = 0
+        self.result = None
+        self.end_reason = None
+        self.next_check = 1.0   # the damage-source check runs once per sim second
+        self.window_end = stall_window
+        self.window_hp = (self.surviving_hp(player_units), self.surviving_hp(enemy_units))
+        self.recorder = recorder  # replay.ReplayRecorder, or None
+        if recorder: recorder.capture(self)
+
+    def step(self, dt):
+        self.world.update(dt)
+        self.time += dt
+        self.ticks += 1
+        self.result = self.check_result()
+        if self.recorder: self.recorder.capture(self, force=self.result is not None)
+        return self.result
+
+    def check_result(self):
+        # player is team 0 and enemy team 1; the world keeps the live counts
+        alive_player = self.world.team_alive(0)
+        alive_enemy = self.world.team_alive(1)
+        if not alive_player and not alive_enemy: return self.end("tie", "both teams wiped out")
+        if not alive_enemy: return self.end("win", "enemy wiped out")
+        if not alive_player: return self.end("lose", "player wiped out")
+        if self.max_time is not None and self.time >= self.max_time: return self.end("tie", "time limit")
+        if self.time >= self.next_check:
+            self.next_check += 1.0
+            if not self.has_damage_source(): return self.end("tie", "no damage on either side")
+        if self.stall_window is not None and self.time >= self.window_end:
+            hp = (self.surviving_hp(self.player_units), self.surviving_hp(self.enemy_units))
+            if all(abs(a-b) < STALL_EPSILON for a, b in zip(hp, self.window_hp)):
+                return self.end("tie", "stalemate")
+            self.window_hp = hp
+            self.window_end += self.stall_window
+        return None
+
+    def end(self, result, reason):
+        self.end_reason = reason
+        return result
+
+    def has_damage_source(self):
+        # Any live damaging shooter, or a damaging shot still in flight
+        for u in self.player_units + self.enemy_units:
+            b = u.behavior
+            if u.alive and isinstance(b, ShooterBehavior) and b.atk > 0 and not b.defensive:
+                return True
+        return self.world.has_projectiles('triangle')
+
+    def surviving_hp(self, units):
+        return sum(u.hp for u in units if u.alive and u.hp > 0)
+
+WORLD_BACKENDS = ['classic', 'numpy']
+
+def make_world(backend='classic', width=WIDTH, height=HEIGHT, seed=None):
+    # The numpy backend is imported lazily so the classic game runs without numpy.
+    # seed only matters where units are placed or respawned at random
+    # (random_position, Unit.respawn); a Battle never draws from it.
+    rng = random.Random(seed)
+    if backend == 'numpy':
+        from fastworld import ArrayWorld
+        return ArrayWorld(width=width, height=height, rng=rng)
+    return World(width, height, rng)
@@ -0,0 +1,82 @@
+import json, argparse
+from game3 import formation_spec, instantiate_spec, make_world, Battle, MAX_BATTLE_TIME, WorldProfiler
+from replay import ReplayRecorder
+
+# Display-free battle runner: steps a World with a fixed dt as fast as the CPU
+# allows. Nothing here touches pygame.display, so it is safe in scripts and
+# worker processes.
+
+HEADLESS_DT = 1/60
+
+
+class BattleResult:
+    def __init__(self, outcome, duration, ticks, player_hp, enemy_hp, reason=None, profile=None):
+        self.outcome = outcome      # "win" / "lose" / "tie", from the player's side
+        self.reason = reason        # Battle.end_reason, e.g. "stalemate" or "time limit"
+        self.profile = profile      # WorldProfiler.summary() when run with profile=True
+        self.duration = duration    # simulated seconds
+        self.ticks = ticks
+        self.player_hp = player_hp  # surviving hp per team
+        self.enemy_hp = enemy_hp
+
+    def to_dict(self):
+        return {
+            "outcome": self.outcome,
+            "reason": self.reason,
+            "duration": self.duration,
+            "ticks": self.ticks,
+            "player_hp": self.player_hp,
+            "enemy_hp": self.enemy_hp,
+            "profile": self.profile,
+        }
+
+    def __repr__(self):
+        return (f"BattleResult({self.outcome} ({self.reason}), {self.duration:.2f}s, {self.ticks} ticks, "
+                f"hp {self.player_hp} vs {self.enemy_hp})")
+
+
+def run_battle(formation, inventory, campaign, dt=HEADLESS_DT, max_time=MAX_BATTLE_TIME, backend='classic',
+               replay_path=None, profile=False):
+    return run_spec_battle(formation_spec(formation, inventory),
+                           formation_spec(campaign.enemy_formation, campaign.enemy_inventory),
+                           dt, max_time, backend, replay_path, profile)
+
+
+def run_spec_battle(player_spec, enemy_spec, dt=HEADLESS_DT, max_time=MAX_BATTLE_TIME, backend='classic',
+                    replay_path=None, profile=False):
+    # Same as run_battle, from game3.formation_spec() tuples instead of live objects
+    world = make_world(backend, seed=0)
+    if profile: world.prof = WorldProfiler()
+    player_units = instantiate_spec(player_spec, 0, world)
+    enemy_units = instantiate_spec(enemy_spec, 1, world)
+    recorder = ReplayRecorder(player_spec, enemy_spec, dt) if replay_path else None
+    battle = Battle(world, player_units, enemy_units, max_time=max_time, recorder=recorder)
+    while battle.result is None:
+        battle.step(dt)
+    if recorder: recorder.save(replay_path)
+    return BattleResult(battle.result, battle.time, battle.ticks,
+                        battle.surviving_hp(player_units), battle.surviving_hp(enemy_units), battle.end_reason,
+                        world.prof.summary() if profile else None)
+
+
+if __name__ == "__main__":
+    # python headless.py saves/save1.json [backend] [replay.gwr] [--profile out.json]
+    from main import CampaignState
+    from GameExTwoClass import Inventory, Formation
+    parser = argparse.ArgumentParser()
+    parser.add_argument("save")
+    parser.add_argument("backend", nargs="?", default='classic')
+    parser.add_argument("replay", nargs="?", help="write a replay of the battle here")
+    parser.add_argument("--profile", metavar="JSON", help="dump per-phase World.update timings and counters here")
+    args = parser.parse_args()
+    with open(args.save, "r") as f:
+        data = json.load(f)
+    inventory = Inventory.from_dict(data["inventory"], data["capacity"])
+    formation = Formation.from_dict(data["formation"])
+    campaign = CampaignState.from_dict(data["campaign"])
+    result = run_battle(formation, inventory, campaign, backend=args.backend, replay_path=args.replay,
+                        profile=bool(args.profile))
+    print(result)
+    if args.profile:
+        with open(args.profile, "w") as f:
+            json.dump(result.to_dict(), f, indent=2)
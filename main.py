@@ -1,18 +1,65 @@
-import pygame, math, time, random, json, os
+import pygame, math, time, random, json, os, argparse
+from collections import OrderedDict
 from pygame import gfxdraw
 from gamble import GachaBanner
-from GameExTwoClass import Inventory, Formation, Triangle, Pentagon, Square
-from game3 import instantiate, instantiatedummy, World, ShooterBehavior, HealerBehavior, Unit, random_position
+from GameExTwoClass import Inventory, InventoryView, Formation, Triangle, Pentagon, Square
+from game3 import instantiatedummy, World, ShooterBehavior, HealerBehavior, Unit, random_position, make_world, Battle, FixedStep, SIM_HZ, MAX_STEPS_PER_FRAME, MAX_BATTLE_TIME, WorldProfiler, formation_spec, instantiate_spec, unit_from_spec, draw_projectile, TEAM_COLORS
+from replay import ReplayRecorder, ReplayReader
 SAVE_DIR = "saves"
 os.makedirs(SAVE_DIR, exist_ok=True)
+REPLAY_DIR = "replays"   # created on the first recorded battle
+MAX_REPLAYS = 50         # older replays are deleted when a new one is saved
 
 SAVE_SLOTS = [os.path.join(SAVE_DIR, f"save{i}.json") for i in range(1, 4)]
 
+def list_replays():
+    """Replay files in REPLAY_DIR, newest first."""
+    if not os.path.isdir(REPLAY_DIR): return []
+    paths = [os.path.join(REPLAY_DIR, f) for f in os.listdir(REPLAY_DIR) if f.endswith(".gwr")]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+def prune_replays(keep=MAX_REPLAYS):
+    """Delete all but the newest `keep` replays."""
+    for path in list_replays()[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+IDLE_WAIT_MS = 250      # static scenes with nothing to redraw sleep this long waiting for input
+RESOLVE_BUDGET = 0.03   # s per frame "Resolve now" spends simulating, so the window keeps responding
+TEXT_CACHE_SIZE = 512   # rendered labels kept around; a busy screen shows ~100
+CARD_CACHE_SIZE = 64    # pre-rendered inventory boxes kept per grid; a screen shows ~20
+LOCKED_SHADE = (20, 20, 20, 140)
+
+_fonts = {}
+_text_cache = OrderedDict()
+
+def get_font(size, name=None):
+    """Shared pygame font per (name, size); building one from SysFont is slow."""
+    font = _fonts.get((name, size))
+    if font is None:
+        font = _fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return font
+
+def render_text(font, text, color):
+    """Antialiased font.render() through an LRU cache keyed by (font, text, color).
+    The surface is shared, so blit it but do not draw on it."""
+    key = (font, text, color)
+    surf = _text_cache.get(key)
+    if surf is not None:
+        _text_cache.move_to_end(key)
+        return surf
+    surf = _text_cache[key] = font.render(text, True, color)
+    if len(_text_cache) > TEXT_CACHE_SIZE:
+        _text_cache.popitem(last=False)
+    return surf
+
 def render_multiline(text, x, y, font, color, surface, line_height=4):
     """Render text that may contain '\\n' by splitting lines and blitting them stacked."""
     lines = text.split("\n")
     for i, line in enumerate(lines):
-        surf = font.render(line, True, color)
+        surf = render_text(font, line, color)
         surface.blit(surf, (x, y + i * (surf.get_height() + line_height)))
 
 
@@ -56,7 +103,7 @@ def draw_unit_icon(surface, rect, unit, font):
     rank_text = getattr(unit, "letterrank", None) or getattr(unit, "rank", None) or getattr(unit, "grade", None) or ""
     if rank_text is not None:
         # draw small text centered on polygon
-        txt = font.render(str(rank_text), True, (0,0,0))
+        txt = render_text(font, str(rank_text), (0,0,0))
         r = txt.get_rect(center=(cx, cy))
         surface.blit(txt, r)
 
@@ -75,9 +122,9 @@ class RespawnBattleSim:
                 behavior = ShooterBehavior(defensive=True,lifetime=5,proj_speed=150,acceleration=350)
             else:
                 behavior = HealerBehavior(rate=7,acceleration=100)
-            u = Unit(0, random_position(0,self.team0),shape,behavior=behavior, rotation_speed=30)
+            u = Unit(0, random_position(0,self.team0,rng=self.world.rng),shape,behavior=behavior, rotation_speed=30)
             self.team0.append(u)
-            self.world.units.append(u)
+            self.world.add_unit(u)
 
         for shape in [3,3,4,5]:
             if shape == 3:
@@ -86,37 +133,33 @@ class RespawnBattleSim:
                 behavior = ShooterBehavior(defensive=True,lifetime=5,proj_speed=150,acceleration=350)
             else:
                 behavior = HealerBehavior(rate=7,acceleration=100)
-            u = Unit(1, random_position(1,self.team1),shape,behavior=behavior,rotation_speed=30)
+            u = Unit(1, random_position(1,self.team1,rng=self.world.rng),shape,behavior=behavior,rotation_speed=30)
             self.team1.append(u)
-            self.world.units.append(u)
+            self.world.add_unit(u)
 
     def update(self, dt):
         self.world.update(dt)
 
-        # respawn instead of removing
-        for u in self.world.units:
-            if not u.alive:
-                if u.team == 0:
-                    r = u.respawn(self.team0)
-                    self.team0.remove(u)
-                    self.team0.append(r)
-                    self.world.units.remove(u)
-                    self.world.units.append(r)
-                else:
-                    r = u.respawn(self.team1)
-                    self.team1.remove(u)
-                    self.team1.append(r)
-                    self.world.units.remove(u)
-                    self.world.units.append(r)
+        # respawn instead of removing; the world lists this tick's deaths
+        for u in list(self.world.deaths):
+            team = self.team0 if u.team == 0 else self.team1
+            r = u.respawn(team, self.world)
+            team[team.index(u)] = r
+            self.world.remove_unit(u)
+            self.world.add_unit(r)
 
-    def draw(self, screen):
-        self.world.draw(screen)
+    def draw(self, screen, alpha=1.0):
+        self.world.draw(screen, alpha)
 
 
 
 class CampaignState:
-    def __init__(self):
+    # Enemy generation draws from a stream seeded by (seed, level), so a
+    # campaign replays the same way from any saved level
+    def __init__(self, seed=None):
+        self.seed = random.randrange(1 << 32) if seed is None else seed
         self.level = 1
+        self.rng = self.level_rng()
         self.enemyuid = []
         self.enemypos = []
         self.enemy_inventory = Inventory()
@@ -126,12 +169,16 @@ class CampaignState:
         self.enemyuid.append(self.enemy_inventory.add_unit(Triangle()))
         self.enemy_formation.place_unit(self.enemyuid[0], pos)
 
+    def level_rng(self):
+        return random.Random(f"{self.seed}/{self.level}")
+
     def advance_level(self):
         self.level += 1
+        self.rng = self.level_rng()
         # Choose: add new enemy OR upgrade one
-        if len(self.enemyuid) < 8 and random.random() < 0.2:
+        if len(self.enemyuid) < 8 and self.rng.random() < 0.2:
             # Add another base unit
-            unit_type = random.choice(["triangle", "square", "pentagon"])
+            unit_type = self.rng.choice(["triangle", "square", "pentagon"])
             pos = self._random_enemy_position(existing=self.enemypos)
             unit = self._make_enemy(unit_type, 0)
             self.enemy_formation.place_unit(unit, pos)
@@ -139,14 +186,14 @@ class CampaignState:
             self.enemyuid.append(unit)
         else:
             # Upgrade random enemy’s stat
-            choice = random.choice(self.enemyuid)
-            self.enemy_inventory.upgrade(choice)
+            choice = self.rng.choice(self.enemyuid)
+            self.enemy_inventory.upgrade(choice, self.rng)
         
     def _random_enemy_position(self, existing=None):
         """Pick a random valid spot in enemy territory, avoiding overlaps."""
         if existing is None: existing = []
         while True:
-            pos = pygame.Vector2(random.randint(500, 750), random.randint(100, 500))
+            pos = pygame.Vector2(self.rng.randint(500, 750), self.rng.randint(100, 500))
             if all(pos.distance_to(e) > 40 for e in existing):  # No overlapping
                 return pos
 
@@ -175,6 +222,7 @@ class CampaignState:
     def to_dict(self):
         return {
             "level": self.level,
+            "seed": self.seed,
             "enemy_inventory": self.enemy_inventory.to_dict(),
             "enemy_formation": self.enemy_formation.to_dict(),
             "enemyuid": self.enemyuid,
@@ -186,6 +234,8 @@ class CampaignState:
     def from_dict(cls, data):
         obj = cls.__new__(cls)
         obj.level = data.get("level", 1)
+        obj.seed = data.get("seed", random.randrange(1 << 32))
+        obj.rng = obj.level_rng()
         obj.enemy_inventory = Inventory.from_dict(data["enemy_inventory"], 200)
         obj.enemy_formation = Formation.from_dict(data["enemy_formation"])
         obj.enemypos = [pygame.Vector2(*pos) for pos in data["enemypos"]]
@@ -196,41 +246,209 @@ class CampaignState:
     
         return obj
     
+# Retained-mode widgets: each keeps a pre-rendered image of itself and only
+# paints it again when key() (what it shows) or its size changes, so a frame
+# is one blit per widget. Moving a widget is just changing rect's position.
+class Widget:
+    alpha = False   # paint onto a per-pixel alpha image
+
+    def __init__(self, rect):
+        self.rect = pygame.Rect(rect)
+        self.image = None
+        self._key = None
+
+    def key(self):
+        return None
+
+    def paint(self, image):
+        pass
+
+    def draw(self, surf):
+        key = (self.rect.size, self.key())
+        if self.image is None or key != self._key:
+            image = pygame.Surface(self.rect.size, pygame.SRCALPHA if self.alpha else 0)
+            if pygame.display.get_surface() is not None:
+                image = image.convert_alpha() if self.alpha else image.convert()
+            self.paint(image)
+            self.image, self._key = image, key
+        surf.blit(self.image, self.rect.topleft)
+
+    def hit(self, pos):
+        return self.rect.collidepoint(pos)
+
+
 # Button helper function
-class Button:
+class Button(Widget):
     def __init__(self, rect, text, callback, transparent = False):
-        self.rect = pygame.Rect(rect)
+        super().__init__(rect)
         self.text = text
         self.callback = callback
         self.active = True
         self.transparent = transparent
+        self.font = None
 
-    def draw(self, surf, font):
+    @property
+    def alpha(self):
+        return self.transparent
+
+    def key(self):
+        if self.transparent:
+            return (self.active, True)
+        return (self.text, self.active, False, self.font)
+
+    def paint(self, image):
         base_color = (200, 200, 200) if self.active else (110, 110, 110)
-    
+        rect = image.get_rect()
+        image.fill((*base_color, 150) if self.transparent else base_color)
+        pygame.draw.rect(image, (0, 0, 0), rect, 2)
+
+        # text; blended onto the translucent image it would come out lighter,
+        # so transparent buttons blit it straight onto the screen in draw()
+        if not self.transparent:
+            txt = render_text(self.font, self.text, (0, 0, 0))
+            image.blit(txt, txt.get_rect(center=rect.center))
+
+    def draw(self, surf, font):
+        self.font = font
+        super().draw(surf)
         if self.transparent:
-            temp = pygame.Surface(self.rect.size, pygame.SRCALPHA)
-            temp.fill((*base_color, 150)) 
-            surf.blit(temp, self.rect.topleft)
-        else:
-            pygame.draw.rect(surf, base_color, self.rect)
-        pygame.draw.rect(surf, (0, 0, 0), self.rect, 2)
-    
-        # text
-        txt = font.render(self.text, True, (0, 0, 0))
-        surf.blit(txt, txt.get_rect(center=self.rect.center))
+            txt = render_text(font, self.text, (0, 0, 0))
+            surf.blit(txt, txt.get_rect(center=self.rect.center))
 
     def handle_event(self, event):
         if not self.active: return
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            if self.rect.collidepoint(event.pos):
+            if self.hit(event.pos):
                 if callable(self.callback):
                     self.callback()
 
+
+class Overlay(Widget):
+    # Flat translucent fill, e.g. the grey-out over locked inventory boxes
+    alpha = True
+
+    def __init__(self, rect, color):
+        super().__init__(rect)
+        self.color = color
+
+    def key(self):
+        return self.color
+
+    def paint(self, image):
+        image.fill(self.color)
+
+
+class Popup(Widget):
+    # Bordered box with a few lines of text; set lines to (text, color) pairs
+    def __init__(self, rect, font, line_step=32):
+        super().__init__(rect)
+        self.font = font
+        self.line_step = line_step
+        self.lines = ()
+
+    def key(self):
+        return tuple(self.lines)
+
+    def paint(self, image):
+        image.fill((30,30,30))
+        pygame.draw.rect(image, (200,200,200), image.get_rect(), 2)
+        for i, (text, color) in enumerate(self.lines):
+            image.blit(render_text(self.font, text, color), (8, 8 + i*self.line_step))
+
+
+class UnitIcon(Widget):
+    # draw_unit_icon() onto its own image, drawn at the given opacity
+    alpha = True
+
+    def __init__(self, rect, unit, font, opacity=255):
+        super().__init__(rect)
+        self.unit = unit
+        self.font = font
+        self.opacity = opacity
+
+    def key(self):
+        return (self.unit.level, self.opacity, self.font)
+
+    def paint(self, image):
+        draw_unit_icon(image, image.get_rect(), self.unit, self.font)
+        image.set_alpha(self.opacity)
+
+
+class InventoryCard(Widget):
+    # One inventory box. The owning scene paints it with paint_fn(image, unit,
+    # state), where state holds everything shown besides the unit itself
+    # (border colour, stat line, locked...), so it only re-renders when that
+    # or the unit's level changes.
+    def __init__(self, unit, size, paint_fn):
+        super().__init__(((0, 0), size))
+        self.unit = unit
+        self.paint_fn = paint_fn
+        self.state = None
+
+    def key(self):
+        return (self.unit.level, self.state)
+
+    def paint(self, image):
+        self.paint_fn(image, self.unit, self.state)
+
+
+class CardGrid:
+    # Scrolling grid of InventoryCards. layout() takes the uids in display
+    # order, the scroll row and the range of rows on screen; boxes are placed
+    # from the grid geometry alone, so at() maps a click back to its uid
+    # arithmetically. Cards are kept per uid (LRU) and only move when scrolling.
+    def __init__(self, left, top, box_w, box_h, pad, columns, paint_fn, cache_size=CARD_CACHE_SIZE):
+        self.left, self.top = left, top
+        self.box_w, self.box_h = box_w, box_h
+        self.pad = pad
+        self.columns = columns
+        self.paint_fn = paint_fn
+        self.cache_size = cache_size
+        self.cards = OrderedDict()
+        self.uids = []
+        self.scroll = 0
+        self.rows = range(0)
+
+    def layout(self, uids, scroll, rows):
+        self.uids, self.scroll, self.rows = uids, scroll, rows
+
+    def box(self, idx):
+        row, col = divmod(idx, self.columns)
+        return pygame.Rect(self.left + col*(self.box_w + self.pad), self.top + (row - self.scroll)*(self.box_h + self.pad),
+                           self.box_w, self.box_h)
+
+    def visible(self):
+        """(uid, rect) of every box laid out on screen."""
+        stop = min(len(self.uids), self.rows.stop*self.columns)
+        for idx in range(self.rows.start*self.columns, stop):
+            yield self.uids[idx], self.box(idx)
+
+    def card(self, uid, unit):
+        card = self.cards.get(uid)
+        if card is None or card.unit is not unit:
+            card = self.cards[uid] = InventoryCard(unit, (self.box_w, self.box_h), self.paint_fn)
+        self.cards.move_to_end(uid)
+        if len(self.cards) > self.cache_size:
+            self.cards.popitem(last=False)
+        return card
+
+    def at(self, pos):
+        """uid of the laid out box under pos, or None."""
+        col, dx = divmod(pos[0] - self.left, self.box_w + self.pad)
+        row, dy = divmod(pos[1] - self.top, self.box_h + self.pad)
+        row += self.scroll
+        if not (0 <= col < self.columns and dx < self.box_w and dy < self.box_h and row in self.rows):
+            return None
+        idx = row*self.columns + col
+        return self.uids[idx] if idx < len(self.uids) else None
+
 class SaveMenu:
+    static = True   # see Scene
+    dirty = True
+
     def __init__(self, manager):
         self.manager = manager
-        self.font = pygame.font.SysFont(None, 30)
+        self.font = get_font(30)
         self.slot_buttons = []
         self.delete_buttons = []
 
@@ -323,6 +541,11 @@ class SaveMenu:
 
 
 class Scene:
+    # Static scenes only change in response to input. main() redraws them
+    # after events, after a scene switch or when they set dirty themselves
+    # (timers, say), and otherwise waits for input instead of spinning at 60 FPS.
+    static = False
+    dirty = True
     def handle_event(self, event): pass
     def update(self, dt): pass
     def draw(self, screen): pass
@@ -336,6 +559,12 @@ class SceneManager:
         self.campaign = CampaignState()
         self.economy = economy
         self.save_path = None
+        # which World implementation battles run on; the numpy one only pays
+        # off with hundreds of projectiles, far more than a campaign fight has
+        self.battle_backend = 'classic'
+        self.sim_hz = SIM_HZ              # fixed simulation rate for scenes with a World
+        self.record_replays = True        # BattleScene writes a replay file per fight
+        self.max_battle_time = MAX_BATTLE_TIME  # sim seconds before a fight is called a tie
 
     def save_state(self):
         return {
@@ -369,8 +598,10 @@ class MainMenu(Scene):
         self.inventory = inventory
         self.formation = self.manager.formation
         self.campaign = self.manager.campaign
-        self.font = pygame.font.SysFont(None, 36)
+        self.font = get_font(36)
         self.world = World()
+        self.stepper = FixedStep(self.manager.sim_hz)
+        self.alpha = 1.0
 
         # buttons
         self.buttons = [
@@ -384,6 +615,8 @@ class MainMenu(Scene):
                    lambda: self.manager.switch(CampaignPreviewScene(self.manager, self.formation, self.campaign)), transparent=True),
             Button((250, 480, 300, 50), "Exit to Save Menu",
                    lambda: self.manager.switch(SaveMenu(self.manager)), transparent=True),
+            Button((250, 550, 300, 40), "Replays",
+                   lambda: self.manager.switch(ReplayListScene(self.manager)), transparent=True),
         ]
 
         # background battle
@@ -399,24 +632,26 @@ class MainMenu(Scene):
                 b.handle_event(event)
 
     def update(self, dt):
-        self.battle.update(dt)
+        self.alpha = self.stepper.advance(dt, self.battle.update)
 
     def draw(self, screen):
         screen.fill((0,0,0))
-        self.battle.draw(screen)
+        self.battle.draw(screen, self.alpha)
         for b in self.buttons:
             b.draw(screen, self.font)
 
         # gold display
-        gold_txt = self.font.render(f"Gold: {self.manager.economy.gold}", True, (255,215,0))
+        gold_txt = render_text(self.font, f"Gold: {self.manager.economy.gold}", (255,215,0))
         screen.blit(gold_txt, (645, 26))
 
 class BannerScene(Scene):
+    static = True
+
     def __init__(self, manager, gacha_systems, inventory):
         self.manager = manager
         self.gacha_systems = gacha_systems
         self.inventory = inventory
-        self.font = pygame.font.SysFont(None, 50)
+        self.font = get_font(50)
         self.buttons = []
         self._build_buttons()
 
@@ -439,7 +674,7 @@ class BannerScene(Scene):
 
     def draw(self, screen):
         screen.fill((30,30,50))
-        screen.blit(self.font.render("Select a Banner", True, (255,255,255)), (100, 80))
+        screen.blit(render_text(self.font, "Select a Banner", (255,255,255)), (100, 80))
         for b in self.buttons + [self.back_btn]:
             b.draw(screen, self.font)
 
@@ -448,12 +683,14 @@ class BannerScene(Scene):
             b.handle_event(event)
 
 class BannerDetailScene(Scene):
+    static = True
+
     def __init__(self, manager, name, banner, inventory):
         self.manager = manager
         self.banner_name = name
         self.banner = banner
         self.inventory = inventory
-        self.font = pygame.font.SysFont(None, 36)
+        self.font = get_font(36)
         self.buttons = []
         self._build_buttons()
 
@@ -507,10 +744,10 @@ class BannerDetailScene(Scene):
         screen.fill((10,10,30))
         base_unit = self.banner.base_unit()
         stats_text = f"Base Stats for the {self.banner_name.capitalize()}"
-        screen.blit(self.font.render(stats_text, True, (255,255,255)), (100, 100))
+        screen.blit(render_text(self.font, stats_text, (255,255,255)), (100, 100))
         y = 160
         for stat_name, stat_value in base_unit.stats().items():
-            txt = self.font.render(f"{stat_name}: {stat_value}", True, (255,255,100))
+            txt = render_text(self.font, f"{stat_name}: {stat_value}", (255,255,100))
             screen.blit(txt, (100, y))
             y += 40
 
@@ -531,7 +768,7 @@ class SummonResultScene(Scene):
         self.inventory = inventory
         self.mode = mode
         self.phase = "summon"
-        self.font = pygame.font.SysFont(None, 40)
+        self.font = get_font(40)
         self.result_units = []
         self.result_uids = []
         self.buttons = []
@@ -820,12 +1057,12 @@ class SummonResultScene(Scene):
         except:
             self.uid = self.result_uids[0]
         rank_text = f"{type(u).__name__}  ({u.letterrank})"
-        txt = self.font.render(rank_text, True, (255, 255, 100))
+        txt = render_text(self.font, rank_text, (255, 255, 100))
         screen.blit(txt, (280, 140))
         y = 200
         for k, v in u.stats().items():
             val = f"{v:.2f}" if isinstance(v, float) else str(v)
-            screen.blit(self.font.render(f"{k}: {val}", True, (200, 200, 255)), (280, y))
+            screen.blit(render_text(self.font, f"{k}: {val}", (200, 200, 255)), (280, y))
             y += 30
         for b in self.buttons:
             b.draw(screen, self.font)
@@ -848,12 +1085,14 @@ class SummonResultScene(Scene):
 
 
 class InventoryFullScene(Scene):
+    static = True
+
     def __init__(self, manager, inventory, banner_name, banner):
         self.manager = manager
         self.inventory = inventory
         self.name = banner_name
         self.banner = banner
-        self.font = pygame.font.SysFont(None, 28)
+        self.font = get_font(28)
 
         self.ok_btn = Button((200, 300, 120, 40), "OK", self.back)
         self.expand_btn = Button((340, 300, 200, 40), "Expand +5 (10g)", self.expand)
@@ -883,12 +1122,13 @@ class InventoryFullScene(Scene):
 
     def draw(self, screen):
         screen.fill((40, 40, 60))
-        txt = self.font.render("Purchase Failed: Inventory Full", True, (255, 100, 100))
+        txt = render_text(self.font, "Purchase Failed: Inventory Full", (255, 100, 100))
         screen.blit(txt, (150, 200))
         self.ok_btn.draw(screen, self.font)
         self.expand_btn.draw(screen, self.font)
 
 class InventoryScene(Scene):
+    static = True
     BOX_W = 220
     BOX_H = 90
     PADDING = 12
@@ -902,14 +1142,17 @@ class InventoryScene(Scene):
     def __init__(self, manager, inventory):
         self.manager = manager
         self.inventory = inventory
-        self.font = pygame.font.SysFont(None, 20)
-        self.bigfont = pygame.font.SysFont(None, 26)
-        self.goldfont = pygame.font.SysFont(None, 36)
+        self.view = InventoryView(inventory)
+        self.font = get_font(20)
+        self.bigfont = get_font(26)
+        self.goldfont = get_font(36)
         self.scroll = 0      # number of rows skipped
         self.sort_idx = 0
         self.sort_asc = False
         self.filter_idx = 0
-        self.box_map = []    # list of tuples (uid, pygame.Rect)
+        self.grid = CardGrid(self.LEFT, self.TOP, self.BOX_W, self.BOX_H, self.PADDING, self.COLUMNS, self.paint_card)
+        self.shade = Overlay(((0, 0), (self.BOX_W, self.BOX_H)), LOCKED_SHADE)
+        self.popup = Popup((120, 140, 560, 70), self.font)
         self.instructions = "Left-click: inspect. Right-click: mark/unmark for recycle. Wheel/Up/Down to scroll. S/O/F to sort/order/filter. ESC back."
 
         # recycling state
@@ -997,24 +1240,10 @@ class InventoryScene(Scene):
         self.auto_preview_gold = 0
         self.auto_cutoff_level = None
 
-    def get_sorted_filtered_items(self):
-        items = list(self.inventory.units.items())  # (uid, unit) pairs
-
-        # filter
-        fil = InventoryScene.FILTER_OPTIONS[self.filter_idx]
-        if fil:
-            lower = fil.lower()
-            items = [(uid, u) for uid, u in items if lower in u.__class__.__name__.lower()]
-
-        # sort
-        key = InventoryScene.SORT_OPTIONS[self.sort_idx]
-        if key:
-            def keyfn(kv):
-                uid, u = kv
-                return getattr(u, key, 0)
-            items.sort(key=keyfn, reverse=not self.sort_asc)
-
-        return items
+    def get_sorted_filtered_uids(self):
+        # cached by the view until the inventory changes
+        return self.view.uids(InventoryScene.SORT_OPTIONS[self.sort_idx], self.sort_asc,
+                              InventoryScene.FILTER_OPTIONS[self.filter_idx])
 
     def handle_event(self, event):
         # return to main
@@ -1048,38 +1277,35 @@ class InventoryScene(Scene):
             # left click -> inspect / in auto prompt choose cutoff or confirm
             if event.button == 1:
                 # if auto prompt showing: choose unit to set threshold (preview)
-                if self.show_auto_prompt:
-                    for uid, rect in self.box_map:
-                        if rect.collidepoint(mx, my):
-                            # compute preview using chosen unit's level
-                            unit = self.inventory.units.get(uid)
-                            if not unit: continue
-                            cutoff = getattr(unit, "level", 0)
-                            # if same cutoff clicked twice, confirm
-                            if self.auto_cutoff_level is None or cutoff != self.auto_cutoff_level:
-                                self.compute_auto_preview(cutoff)
-                            else:
-                                # confirm recycle
-                                self.confirm_auto_recycle()
-                            return
+                uid = self.grid.at((mx, my))
+                if self.show_auto_prompt and uid is not None:
+                    # compute preview using chosen unit's level
+                    unit = self.inventory.units.get(uid)
+                    if unit:
+                        cutoff = getattr(unit, "level", 0)
+                        # if same cutoff clicked twice, confirm
+                        if self.auto_cutoff_level is None or cutoff != self.auto_cutoff_level:
+                            self.compute_auto_preview(cutoff)
+                        else:
+                            # confirm recycle
+                            self.confirm_auto_recycle()
+                        return
 
                 # normal left-click -> open detail view
-                for uid, rect in self.box_map:
-                    if rect.collidepoint(mx, my):
-                        # open detail view
-                        self.manager.switch(UnitDetailScene(self.manager, self.inventory, uid, self.manager.economy))
-                        return
+                if uid is not None:
+                    self.manager.switch(UnitDetailScene(self.manager, self.inventory, uid, self.manager.economy))
+                    return
 
             # right-click -> toggle selection for recycle
             elif event.button == 3:
-                for uid, rect in self.box_map:
-                    if rect.collidepoint(mx, my):
-                        if uid in self.selected_uids:
-                            self.selected_uids.remove(uid)
-                        else:
-                            self.selected_uids.add(uid)
-                        # when selecting at least one, the recycle button becomes active
-                        return
+                uid = self.grid.at((mx, my))
+                if uid is not None:
+                    if uid in self.selected_uids:
+                        self.selected_uids.remove(uid)
+                    else:
+                        self.selected_uids.add(uid)
+                    # when selecting at least one, the recycle button becomes active
+                    return
 
             elif event.button == 4:  # wheel up
                 self.scroll = max(0, self.scroll - 1)
@@ -1092,15 +1318,15 @@ class InventoryScene(Scene):
 
     def draw(self, screen):
         screen.fill((40, 40, 60))
-        title = self.bigfont.render(f"Inventory ({len(self.inventory.units)}/{self.inventory.capacity})", True, (255,255,255))
+        title = render_text(self.bigfont, f"Inventory ({len(self.inventory.units)}/{self.inventory.capacity})", (255,255,255))
         screen.blit(title, (20, 16))
 
         # show current sort/filter info
         sort_label = InventoryScene.SORT_OPTIONS[self.sort_idx] or "none"
         filt_label = InventoryScene.FILTER_OPTIONS[self.filter_idx] or "all"
         info_txt = f"Sort: {sort_label} ({'asc' if self.sort_asc else 'desc'})  |  Filter: {filt_label}"
-        screen.blit(self.font.render(info_txt, True, (200,200,200)), (20, 46))
-        screen.blit(self.goldfont.render(f"Gold: {self.manager.economy.gold}", True, (255,215,0)), (645,26))
+        screen.blit(render_text(self.font, info_txt, (200,200,200)), (20, 46))
+        screen.blit(render_text(self.goldfont, f"Gold: {self.manager.economy.gold}", (255,215,0)), (645,26))
 
         # top buttons
         # update recycle button text and enabled state
@@ -1123,7 +1349,7 @@ class InventoryScene(Scene):
         self.recycle_btn.draw(screen, self.font)
         self.auto_btn.draw(screen, self.font)
 
-        items = self.get_sorted_filtered_items()
+        uids = self.get_sorted_filtered_uids()
 
         # compute grid layout and which to render
         cols = InventoryScene.COLUMNS
@@ -1132,24 +1358,16 @@ class InventoryScene(Scene):
 
         # how many rows fit on screen
         rows_visible = max(1, (screen.get_height() - top) // (box_h + pad))
-        max_rows = max(0, math.ceil(len(items) / cols) - rows_visible)
+        max_rows = max(0, math.ceil(len(uids) / cols) - rows_visible)
         self.scroll = min(self.scroll, max_rows)
 
-        self.box_map = []
-        # draw boxes
-        for idx, (uid, unit) in enumerate(items):
-            row = idx // cols
-            col = idx % cols
-            y = top + (row - self.scroll) * (box_h + pad)
-            x = left + col * (box_w + pad)
-            rect = pygame.Rect(x, y, box_w, box_h)
-
-            # only draw if visible region
-            if rect.bottom < 70 or rect.top > screen.get_height() - 20:
-                continue
-
-            # background and border
-            pygame.draw.rect(screen, (70, 70, 90), rect)
+        # lay out only the rows whose boxes reach the screen (bottom >= 70, top <= height-20)
+        first_row = max(0, self.scroll + math.ceil((70 - box_h - top) / (box_h + pad)))
+        last_row = self.scroll + (screen.get_height() - 20 - top) // (box_h + pad)
+        self.grid.layout(uids, self.scroll, range(first_row, last_row + 1))
+        sort_label = InventoryScene.SORT_OPTIONS[self.sort_idx] or "none"
+        for uid, rect in self.grid.visible():
+            unit = self.inventory.units[uid]
             border_col = (120, 120, 140)
             # highlighted if selected for recycle
             if uid in self.selected_uids:
@@ -1157,49 +1375,53 @@ class InventoryScene(Scene):
             # highlighted red if included in auto preview
             if self.show_auto_prompt and uid in self.auto_preview_uids:
                 border_col = (200,80,80)
-            pygame.draw.rect(screen, border_col, rect, 2)
-
-            # icon area
-            icon_rect = pygame.Rect(rect.x + 8, rect.y + 8, 84, rect.h - 16)
-            draw_unit_icon(screen, icon_rect, unit, self.font)
-
-            # text area
-            name_text = f"{unit.__class__.__name__}"
-            screen.blit(self.font.render(name_text, True, (255,255,255)), (rect.x + 100, rect.y + 10))
 
-            # small stats lines (HP, rank)
-            rank_display = getattr(unit, "level", None) or getattr(unit, "rank", None) or getattr(unit,"grade", "")
-            stat_display = ""
-            sort_label = InventoryScene.SORT_OPTIONS[self.sort_idx] or "none"
+            # sorted-by stat line
+            stat_line = None
             if sort_label != "level" and sort_label != "none":
                 stat_display = getattr(unit, sort_label, "")
                 try:
-                    screen.blit(self.font.render(f"{float(stat_display):.2f}", True, (200,200,200)), (rect.x + 100, rect.y + 56))
+                    stat_line = f"{float(stat_display):.2f}"
                 except Exception:
-                    screen.blit(self.font.render(str(stat_display), True, (200,200,200)), (rect.x + 100, rect.y + 56))
-            screen.blit(self.font.render(f"Level: {rank_display}", True, (200,200,0)), (rect.x + 100, rect.y + 34))
+                    stat_line = str(stat_display)
 
-            # grey-out overlay if locked (keeps original behaviour)
-            if getattr(self.inventory, "units", {}) and self.inventory.units.get(uid) and getattr(self.inventory.units[uid], "locked", False):
-                s = pygame.Surface((rect.w, rect.h), pygame.SRCALPHA)
-                s.fill((20,20,20,140))
-                screen.blit(s, rect.topleft)
-
-            # remember rect for clicks
-            self.box_map.append((uid, rect))
+            card = self.grid.card(uid, unit)
+            card.state = (border_col, stat_line, getattr(unit, "locked", False))
+            card.rect.topleft = rect.topleft
+            card.draw(screen)
 
         # instructions at bottom
         render_multiline(self.instructions, 20, screen.get_height() - 20, self.font, (180,180,180), screen)
 
         # show auto-recycle preview popup if active
         if self.show_auto_prompt:
-            popup = pygame.Rect(120, 140, 560, 70)
-            pygame.draw.rect(screen, (30,30,30), popup)
-            pygame.draw.rect(screen, (200,200,200), popup, 2)
             tip = "Auto Sell: Click a unit to set cutoff rank. Click same unit again to confirm recycling."
-            screen.blit(self.font.render(tip, True, (255,255,0)), (popup.x + 8, popup.y + 8))
             preview_txt = f"Preview: {len(self.auto_preview_uids)} units --> +{self.auto_preview_gold}g"
-            screen.blit(self.font.render(preview_txt, True, (200,200,200)), (popup.x + 8, popup.y + 40))
+            self.popup.lines = ((tip, (255,255,0)), (preview_txt, (200,200,200)))
+            self.popup.draw(screen)
+
+    def paint_card(self, image, unit, state):
+        border_col, stat_line, locked = state
+        rect = image.get_rect()
+        # background and border
+        image.fill((70, 70, 90))
+        pygame.draw.rect(image, border_col, rect, 2)
+
+        # icon area
+        draw_unit_icon(image, pygame.Rect(8, 8, 84, rect.h - 16), unit, self.font)
+
+        # text area
+        image.blit(render_text(self.font, unit.__class__.__name__, (255,255,255)), (100, 10))
+
+        # small stats lines (HP, rank)
+        rank_display = getattr(unit, "level", None) or getattr(unit, "rank", None) or getattr(unit,"grade", "")
+        if stat_line is not None:
+            image.blit(render_text(self.font, stat_line, (200,200,200)), (100, 56))
+        image.blit(render_text(self.font, f"Level: {rank_display}", (200,200,0)), (100, 34))
+
+        # grey-out overlay if locked (keeps original behaviour)
+        if locked:
+            self.shade.draw(image)
 
 
 class UnitDetailScene(Scene):
@@ -1208,9 +1430,9 @@ class UnitDetailScene(Scene):
         self.manager = manager
         self.inventory = inventory
         self.uid = uid
-        self.font = pygame.font.SysFont(None, 20)
-        self.bigfont = pygame.font.SysFont(None, 28)
-        self.goldfont = pygame.font.SysFont(None, 36)
+        self.font = get_font(20)
+        self.bigfont = get_font(28)
+        self.goldfont = get_font(36)
         self.unit_data = inventory.units[uid]
         self.economy = economy
 
@@ -1223,6 +1445,8 @@ class UnitDetailScene(Scene):
 
         # prepare a small preview world
         self.world = World()
+        self.stepper = FixedStep(self.manager.sim_hz)
+        self.alpha = 1.0
         preview_center = pygame.Vector2(self.PREVIEW_RECT.center)
         cls_name = self.unit_data.__class__.__name__.lower()
         sides = 3 if "triangle" in cls_name else (4 if "square" in cls_name else 5)
@@ -1256,7 +1480,7 @@ class UnitDetailScene(Scene):
                             behavior=behavior,
                             hp=getattr(self.unit_data,"hp",100),
                             rotation_speed=40)
-        self.world.units.append(preview_unit)
+        self.world.add_unit(preview_unit)
 
         class IdleBehavior:  # dummy
             def update(self, u, dt, world): pass
@@ -1264,15 +1488,15 @@ class UnitDetailScene(Scene):
         if "triangle" in cls_name:
             dummy = Unit(1, pygame.Vector2(preview_center.x+140, preview_center.y),
                          sides=3, behavior=IdleBehavior(), hp=100, rotation_speed=30)
-            self.world.units.append(dummy)
+            self.world.add_unit(dummy)
         elif "square" in cls_name:
             dummy = Unit(1, pygame.Vector2(preview_center.x+140, preview_center.y),
                          sides=3, behavior=ShooterBehavior(atk=1), hp=100, rotation_speed=30)
-            self.world.units.append(dummy)
+            self.world.add_unit(dummy)
         else:  # healer
             friendly = Unit(0, pygame.Vector2(preview_center.x+140, preview_center.y),
                             sides=3, behavior=IdleBehavior(), hp=10, rotation_speed=30)
-            self.world.units.append(friendly)
+            self.world.add_unit(friendly)
 
     def recycle_value(self):
         level = getattr(self.unit_data, "level", 0)
@@ -1283,8 +1507,7 @@ class UnitDetailScene(Scene):
         gold = self.recycle_value()
         self.economy.add(gold)
         # Remove the unit from inventory
-        if self.uid in self.inventory.units:
-            del self.inventory.units[self.uid]
+        self.inventory.remove_unit(self.uid)
         # Return to inventory screen
         self.manager.switch(InventoryScene(self.manager, self.inventory))
 
@@ -1296,18 +1519,17 @@ class UnitDetailScene(Scene):
         self.recycle_btn.handle_event(event)
 
     def update(self, dt):
-        self.world.update(dt)
+        self.alpha = self.stepper.advance(dt, self.world.update)
 
     def draw(self, screen):
         screen.fill((30, 30, 40))
         pygame.draw.rect(screen, (50,50,70), self.PREVIEW_RECT)
-        self.world.draw(screen)
+        self.world.draw(screen, self.alpha)
 
         right_x = self.PREVIEW_RECT.right + 30
-        screen.blit(self.goldfont.render(f"Gold: {self.economy.gold}", True, (255,215,0)), (645,26))
-        screen.blit(self.bigfont.render(
-            f"{self.unit_data.__class__.__name__} - Rank {self.unit_data.letterrank}",
-            True, (255,255,255)), (right_x, 100))
+        screen.blit(render_text(self.goldfont, f"Gold: {self.economy.gold}", (255,215,0)), (645,26))
+        screen.blit(render_text(self.bigfont,
+            f"{self.unit_data.__class__.__name__} - Rank {self.unit_data.letterrank}", (255,255,255)), (right_x, 100))
 
         lines = []
         if hasattr(self.unit_data, "lvlVec"):
@@ -1344,16 +1566,17 @@ class UnitDetailScene(Scene):
 
         y = 150
         for ln in lines:
-            screen.blit(self.font.render(ln, True, (230,230,230)), (right_x, y))
+            screen.blit(render_text(self.font, ln, (230,230,230)), (right_x, y))
             y += 28
         # Draw recycle button
         self.recycle_btn.draw(screen, self.font)
 
         # Bottom instruction
-        screen.blit(self.font.render("ESC: back", True, (180,180,180)), (right_x, 360))
+        screen.blit(render_text(self.font, "ESC: back", (180,180,180)), (right_x, 360))
 
 
 class FormationScene(Scene):
+    static = True   # dragging is driven by mouse motion events, so it still counts
     MAP_RECT = pygame.Rect(20, 20, 360, 560)   # left area - player half style
     INV_LEFT = 420
     INV_TOP = 40
@@ -1366,10 +1589,14 @@ class FormationScene(Scene):
     def __init__(self, manager, inventory, formation):
         self.manager = manager
         self.inventory = inventory
+        self.view = InventoryView(inventory)
         self.formation = formation
+        self.grid = CardGrid(self.INV_LEFT + 10, self.INV_TOP + 10, self.INV_BOX_W, self.INV_BOX_H, 8, 1, self.paint_card)
+        self.shade = Overlay(((0, 0), (self.INV_BOX_W, self.INV_BOX_H)), LOCKED_SHADE)
+        self.ghost = None   # UnitIcon of the unit being dragged
 
-        self.font = pygame.font.SysFont(None, 20)
-        self.bigfont = pygame.font.SysFont(None, 26)
+        self.font = get_font(20)
+        self.bigfont = get_font(26)
 
         # placed units: uid >> pygame.Vector2(x,y)
         # Initialize from formation.slots if it already has pixel positions
@@ -1394,28 +1621,16 @@ class FormationScene(Scene):
         self.warning = ""   # shown if cannot exit (overlap)
         self.warning_time = 0
 
-    # ---------- helper utilities ----------
-    def get_sorted_filtered_items(self):
-        items = list(self.inventory.units.items())
-
-        fil = InventoryScene.FILTER_OPTIONS[self.filter_idx]
-        if fil:
-            lower = fil.lower()
-            items = [(uid, u) for uid, u in items if lower in u.__class__.__name__.lower()]
-
-        # sort
-        key = InventoryScene.SORT_OPTIONS[self.sort_idx] or None
-        if key:
-            def keyfn(kv):
-                uid, u = kv
-                v = getattr(u, key, 0)
-                try:
-                    return float(v)
-                except Exception:
-                    return 0
-            items.sort(key=keyfn, reverse=not self.sort_asc)
+    def update(self, dt):
+        # The warning times out on its own, so ask for one more redraw when it does
+        if self.warning and time.time() - self.warning_time >= 2.5:
+            self.warning = ""
+            self.dirty = True
 
-        return items
+    # ---------- helper utilities ----------
+    def get_sorted_filtered_uids(self):
+        return self.view.uids(InventoryScene.SORT_OPTIONS[self.sort_idx], self.sort_asc,
+                              InventoryScene.FILTER_OPTIONS[self.filter_idx])
 
     def world_pos_inside_map(self, pos):
         return self.MAP_RECT.collidepoint(pos.x, pos.y)
@@ -1498,16 +1713,17 @@ class FormationScene(Scene):
 
             if event.button == 1:
                 # check inventory boxes first
-                for idx, (uid, rect) in enumerate(self.get_inventory_box_rects()):
-                    if rect.collidepoint(mx,my):
-                        if self.inventory_locked.get(uid, False):
-                            # box is locked -> not interactable
-                            return
-                        # start dragging from inventory: compute offset from mouse to icon center
-                        self.dragging = (uid, pygame.Vector2(0,0), True)
-                        # lock the inventory box for this uid (grayed out)
-                        self.inventory_locked[uid] = True
+                self.layout_inventory()
+                uid = self.grid.at((mx, my))
+                if uid is not None:
+                    if self.inventory_locked.get(uid, False):
+                        # box is locked -> not interactable
                         return
+                    # start dragging from inventory: compute offset from mouse to icon center
+                    self.dragging = (uid, pygame.Vector2(0,0), True)
+                    # lock the inventory box for this uid (grayed out)
+                    self.inventory_locked[uid] = True
+                    return
 
                 # check if user clicked a placed unit: pick it up
                 if self.MAP_RECT.collidepoint(mx,my):
@@ -1604,22 +1820,12 @@ class FormationScene(Scene):
             elif event.y > 0:
                 self.scroll = max(0, self.scroll - 1)
 
-    def get_inventory_box_rects(self):
-        """Compute visible inventory box rects after sort/filter and scroll. Returns list of (uid, rect)."""
-        items = self.get_sorted_filtered_items()
-        box_rects = []
-        x = self.INV_LEFT + 10
-        y = self.INV_TOP + 10
-        for i, (uid, unit) in enumerate(items):
-            y_i = y + (i - self.scroll) * (self.INV_BOX_H + 8)
-            rect = pygame.Rect(x, y_i, self.INV_BOX_W, self.INV_BOX_H)
-            if rect.bottom > 550: 
-                continue
-            if rect.top < self.INV_TOP + 10: 
-                continue
-            
-            box_rects.append((uid, rect))
-        return box_rects
+    def layout_inventory(self):
+        """Lay out the inventory column after sort/filter and scroll; self.grid then knows the visible boxes."""
+        step = self.INV_BOX_H + 8
+        # boxes from the scroll position down to y=550 fit; lay out just those
+        fits = max(0, (550 - self.grid.top - self.INV_BOX_H) // step + 1)
+        self.grid.layout(self.get_sorted_filtered_uids(), self.scroll, range(self.scroll, self.scroll + fits))
 
     def any_overlaps(self):
         uids = list(self.placed.keys())
@@ -1635,7 +1841,7 @@ class FormationScene(Scene):
         max_reached = self.unit_count() >= 8
         pygame.draw.rect(screen, (40,40,60), self.MAP_RECT)
         pygame.draw.rect(screen, (80,80,100), self.MAP_RECT, 2)
-        screen.blit(self.bigfont.render("Placement Map", True, (220,220,220)), (self.MAP_RECT.left + 6, self.MAP_RECT.top + 6))
+        screen.blit(render_text(self.bigfont, "Placement Map", (220,220,220)), (self.MAP_RECT.left + 6, self.MAP_RECT.top + 6))
 
         # draw placed units
         for uid, pos in self.placed.items():
@@ -1656,54 +1862,32 @@ class FormationScene(Scene):
             unit = self.inventory.units.get(uid)
             if unit:
                 # draw semi-transparent icon
-                ghost_rect = pygame.Rect(ghost_pos.x-18, ghost_pos.y-18, 55, 55)
-                s = pygame.Surface((ghost_rect.w, ghost_rect.h), pygame.SRCALPHA)
-                s.fill((255,255,255,0))
-                draw_unit_icon(s, pygame.Rect(0,0,ghost_rect.w, ghost_rect.h), unit, self.font)
-                s.set_alpha(180)
-                screen.blit(s, ghost_rect.topleft)
+                if self.ghost is None or self.ghost.unit is not unit:
+                    self.ghost = UnitIcon((0, 0, 55, 55), unit, self.font, opacity=180)
+                self.ghost.rect = pygame.Rect(ghost_pos.x-18, ghost_pos.y-18, 55, 55)
+                self.ghost.draw(screen)
                 # show overlap hint
                 valid = self.world_pos_inside_map(ghost_pos) and not self.is_overlap(ghost_pos, ignore_uid=uid)
                 color = (0,200,0) if valid else (200,0,0)
                 pygame.draw.circle(screen, color, (int(ghost_pos.x), int(ghost_pos.y)), 6, 2)
 
         # draw inventory panel header
-        title = self.font.render("Inventory (drag into map)", True, (255,255,255))
+        title = render_text(self.font, "Inventory (drag into map)", (255,255,255))
         screen.blit(title, (self.INV_LEFT, 2))
         
         # Filter + Sort info
         sort_label = InventoryScene.SORT_OPTIONS[self.sort_idx] or "None"
         filter_label = InventoryScene.FILTER_OPTIONS[self.filter_idx] or "None"
-        header = self.font.render(
-            f"Sort: {sort_label}{' Asc' if self.sort_asc else ' Desc'} | Filter: {filter_label}",
-            True, (200,200,200)
+        header = render_text(self.font,
+            f"Sort: {sort_label}{' Asc' if self.sort_asc else ' Desc'} | Filter: {filter_label}", (200,200,200)
         )
         screen.blit(header, (self.INV_LEFT, 20))
 
         # draw inventory boxes
-        self.box_map = []
-        for uid, rect in self.get_inventory_box_rects():
+        self.layout_inventory()
+        for uid, rect in self.grid.visible():
             unit = self.inventory.units.get(uid)
             if not unit: continue
-            # box bg
-            locked = self.inventory_locked.get(uid, False) or (max_reached and uid not in self.placed)
-            bg = (70,70,80) if not locked else (50,50,60)
-            pygame.draw.rect(screen, bg, rect)
-            pygame.draw.rect(screen, (110,110,120), rect, 2)
-
-            # icon rect
-            icon_rect = pygame.Rect(rect.x + 6, rect.y + 6, 64, rect.h - 12)
-            draw_unit_icon(screen, icon_rect, unit, self.font)
-
-            # text
-            if unit.__class__.__name__ == "Triangle":
-                stats_text = f"HP: {unit.hp}     ATK: {unit.damage}     RLD: {unit.rate:.2f}\nSPD: {unit.speed}     ACC: {unit.acceleration}"
-            elif unit.__class__.__name__ == "Square":
-                stats_text = f"HP: {unit.hp}     DUR: {unit.lifetime}     RLD: {unit.rate:.2f}\nSPD: {unit.speed}     ACC: {unit.acceleration}"
-            else:
-                stats_text = f"HP: {unit.hp}     HL: {unit.heal}     RLD: {unit.rate:.2f}\nSPD: {unit.speed}     ACC: {unit.acceleration}"
-            render_multiline(stats_text, rect.x + 80, rect.y + 20, self.font, (230,230,230), screen)
-
             # show filtered stat if filter active
             fil = InventoryScene.FILTER_OPTIONS[self.filter_idx]
             stat_label = ""
@@ -1719,38 +1903,61 @@ class FormationScene(Scene):
                             stat_label = f"{float(stat_val):.2f}"
                         except Exception:
                             stat_label = str(stat_val)
-            if stat_label:
-                screen.blit(self.font.render(stat_label, True, (200,200,160)), (rect.x + 80, rect.y + 34))
+            locked = self.inventory_locked.get(uid, False)
+            dimmed = locked or (max_reached and uid not in self.placed)
 
-            # grey-out overlay if locked
-            if self.inventory_locked.get(uid, False):
-                s = pygame.Surface((rect.w, rect.h), pygame.SRCALPHA)
-                s.fill((20,20,20,140))
-                screen.blit(s, rect.topleft)
-
-            self.box_map.append((uid, rect))
+            card = self.grid.card(uid, unit)
+            card.state = (dimmed, locked, stat_label)
+            card.rect.topleft = rect.topleft
+            card.draw(screen)
 
         # warning text (temporary)
         if self.warning and time.time() - self.warning_time < 2.5:
-            wsurf = self.bigfont.render(self.warning, True, (220,60,60))
+            wsurf = render_text(self.bigfont, self.warning, (220,60,60))
             screen.blit(wsurf, (self.MAP_RECT.left + 6, self.MAP_RECT.bottom))
 
         # bottom instructions
         instr = "Click+drag a unit into the map. Right-click to cancel drag. ESC to return (blocked if overlaps)."
-        screen.blit(self.font.render(instr, True, (180,180,180)), (20, self.MAP_RECT.bottom + 36))
-        count_txt = self.bigfont.render(f"Units: {self.unit_count()}/8", True, (255,255,180))
+        screen.blit(render_text(self.font, instr, (180,180,180)), (20, self.MAP_RECT.bottom + 36))
+        count_txt = render_text(self.bigfont, f"Units: {self.unit_count()}/8", (255,255,180))
         screen.blit(count_txt, (self.INV_LEFT, 560))
 
+    def paint_card(self, image, unit, state):
+        dimmed, locked, stat_label = state
+        # box bg
+        image.fill((50,50,60) if dimmed else (70,70,80))
+        pygame.draw.rect(image, (110,110,120), image.get_rect(), 2)
+
+        # icon rect
+        draw_unit_icon(image, pygame.Rect(6, 6, 64, image.get_height() - 12), unit, self.font)
+
+        # text
+        if unit.__class__.__name__ == "Triangle":
+            stats_text = f"HP: {unit.hp}     ATK: {unit.damage}     RLD: {unit.rate:.2f}\nSPD: {unit.speed}     ACC: {unit.acceleration}"
+        elif unit.__class__.__name__ == "Square":
+            stats_text = f"HP: {unit.hp}     DUR: {unit.lifetime}     RLD: {unit.rate:.2f}\nSPD: {unit.speed}     ACC: {unit.acceleration}"
+        else:
+            stats_text = f"HP: {unit.hp}     HL: {unit.heal}     RLD: {unit.rate:.2f}\nSPD: {unit.speed}     ACC: {unit.acceleration}"
+        render_multiline(stats_text, 80, 20, self.font, (230,230,230), image)
+        if stat_label:
+            image.blit(render_text(self.font, stat_label, (200,200,160)), (80, 34))
+
+        # grey-out overlay if locked
+        if locked:
+            self.shade.draw(image)
+
 class CampaignPreviewScene(Scene):
     def __init__(self, manager, formation, campaign):
         self.manager = manager
         self.inventory = self.manager.inventory
         self.formation = formation
         self.campaign = campaign
-        self.font = pygame.font.SysFont(None, 24)
+        self.font = get_font(24)
 
         # Make preview world
         self.world = World()
+        self.stepper = FixedStep(self.manager.sim_hz)
+        self.alpha = 1.0
         # Add player units (already arranged formation)
         instantiatedummy(self.formation, 0, self.inventory, self.world)
         # Add campaign enemies
@@ -1760,14 +1967,14 @@ class CampaignPreviewScene(Scene):
         self.buttons = [
             Button((50, 500, 200, 40), "Change Formation", self.change_formation),
             Button((300, 500, 200, 40), "Begin Battle", self.begin_battle),
-            Button((550, 500, 200, 40), "Main Menu", self.back_to_menu)
+            Button((550, 500, 200, 40), "Main Menu", self.back_to_menu),
         ]
 
     def change_formation(self):
         self.manager.switch(FormationScene(self.manager, self.inventory, self.formation))
 
     def begin_battle(self):
-        self.manager.switch(BattleScene(self.manager, self.campaign, self.formation))
+        self.manager.switch(BattleScene(self.manager, self.campaign, self.formation, self.manager.battle_backend))
 
     def back_to_menu(self):
         self.manager.switch(MainMenu(self.manager, self.manager.gacha, self.inventory))
@@ -1777,48 +1984,77 @@ class CampaignPreviewScene(Scene):
             btn.handle_event(event)
 
     def update(self, dt):
-        self.world.update(dt)
+        self.alpha = self.stepper.advance(dt, self.world.update)
 
     def draw(self, screen):
         screen.fill((20,20,30))
-        self.world.draw(screen)
+        self.world.draw(screen, self.alpha)
 
         y = 30
-        screen.blit(self.font.render(f"Campaign Level {self.campaign.level}", True, (255,255,0)), (30, y))
+        screen.blit(render_text(self.font, f"Campaign Level {self.campaign.level}", (255,255,0)), (30, y))
         for uid, slot in self.campaign.enemy_formation.slots.items():
             unit = self.campaign.enemy_inventory.units[uid]
             txt = unit.info()
-            render_multiline(txt, slot.x - 85, slot.y-5, pygame.font.SysFont(None, 12), (200,200,200), screen)
+            render_multiline(txt, slot.x - 85, slot.y-5, get_font(12), (200,200,200), screen)
         for btn in self.buttons:
             btn.draw(screen, self.font)
 
 
 class BattleScene(Scene):
-    def __init__(self, manager, campaign, formation):
-        self.world = World()
+    SPEEDS = [1, 2, 4, 8]
+
+    def __init__(self, manager, campaign, formation, backend='classic'):
+        self.world = make_world(backend, seed=0)   # never drawn from, see game3.Battle
+        self.backend = backend
+        self.stepper = FixedStep(manager.sim_hz)
+        self.alpha = 1.0
+        self.speed_idx = 0
         self.manager = manager
         self.campaign = campaign
         self.formation = formation
         self.finished = False
+        self.resolving = False
         self.result = None
         self.txt = None
         self.reward_txt = None
         self.buttons = []
+        self.replay_path = None
 
         # Player team
-        self.player_units = instantiate(
-            self.formation, team=0,
-            inventory=self.manager.inventory,
-            wrld=self.world
-        )
+        player_spec = formation_spec(self.formation, self.manager.inventory)
+        self.player_units = instantiate_spec(player_spec, 0, self.world)
 
         # Enemy team    
-        self.enemy_units = instantiate(
-            self.campaign.enemy_formation, team=1,
-            inventory=self.campaign.enemy_inventory,
-            wrld=self.world
-        )
+        enemy_spec = formation_spec(self.campaign.enemy_formation, self.campaign.enemy_inventory)
+        self.enemy_units = instantiate_spec(enemy_spec, 1, self.world)
         self.units = self.player_units + self.enemy_units
+        self.recorder = None
+        if manager.record_replays:
+            self.recorder = ReplayRecorder(player_spec, enemy_spec, self.stepper.step_dt)
+        self.battle = Battle(self.world, self.player_units, self.enemy_units,
+                             max_time=manager.max_battle_time, recorder=self.recorder)
+
+        # In-battle controls; finish_battle swaps in the result buttons
+        self.speed_btn = Button((680, 10, 110, 30), self.speed_label(), self.cycle_speed, transparent=True)
+        self.resolve_btn = Button((680, 45, 110, 30), "Resolve now", self.resolve_now, transparent=True)
+        self.buttons = [self.speed_btn, self.resolve_btn]
+
+    def speed_label(self):
+        return f"Speed: {self.SPEEDS[self.speed_idx]}x"
+
+    def cycle_speed(self):
+        # More fixed steps per frame at the same step size, so the outcome is
+        # the same as at 1x; only the drawing of the in-between steps is skipped
+        self.speed_idx = (self.speed_idx + 1) % len(self.SPEEDS)
+        self.stepper.max_steps = MAX_STEPS_PER_FRAME * self.SPEEDS[self.speed_idx]
+        self.speed_btn.text = self.speed_label()
+
+    def resolve_now(self):
+        # Run the rest of the fight as fast as possible, RESOLVE_BUDGET of
+        # each frame at a time (see update); Battle's time limit and
+        # stalemate checks guarantee this ends
+        self.resolving = True
+        self.resolve_btn.text = "Resolving..."
 
     def back_to_menu(self):
         self.manager.switch(
@@ -1831,39 +2067,74 @@ class BattleScene(Scene):
         )
 
     def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.toggle_profiler()
         for btn in self.buttons:
             btn.handle_event(event)
 
-    def update(self, dt):
-        if not self.finished:
-            self.world.update(dt)
-
-            # Check end condition
-            alive_player = [u for u in self.player_units if u.hp > 0]
-            alive_enemy = [u for u in self.enemy_units if u.hp > 0]
+    def toggle_profiler(self):
+        self.world.prof = None if self.world.prof else WorldProfiler()
+
+    def draw_profiler(self, screen):
+        prof = self.world.prof
+        font = get_font(20)
+        lines = [f"{self.backend}: {len(self.world.projectiles)} proj, ms/tick over {len(prof.recent)} ticks"]
+        recent = prof.recent_ms()
+        lines += [f"  {phase:<12}{ms:7.3f} ms" for phase, ms in recent.items()]
+        lines.append(f"  {'total':<12}{sum(recent.values()):7.3f} ms")
+        lines += [f"  {name:<12}{n}" for name, n in prof.counts.items()]
+        panel = pygame.Surface((270, 8 + 16*len(lines)), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for i, line in enumerate(lines):
+            # numbers change every frame, so these skip the text cache
+            panel.blit(font.render(line, True, (200, 255, 200)), (6, 4 + 16*i))
+        screen.blit(panel, (10, 10))
 
-            if not alive_player and not alive_enemy:
-                self.finish_battle("tie")
-            elif not alive_enemy:
-                self.finish_battle("win")
-            elif not alive_player:
-                self.finish_battle("lose")
+    def update(self, dt):
+        if self.resolving and not self.finished:
+            deadline = time.perf_counter() + RESOLVE_BUDGET
+            while self.battle.result is None and time.perf_counter() < deadline:
+                self.battle.step(self.stepper.step_dt)
+            self.alpha = 1.0
+            if self.battle.result:
+                self.finish_battle(self.battle.result)
+        elif not self.finished:
+            self.alpha = self.stepper.advance(dt * self.SPEEDS[self.speed_idx], self.sim_step)
+            if self.battle.result:
+                self.finish_battle(self.battle.result)
+
+    def sim_step(self, dt):
+        # a frame can cover several steps; stop stepping once the fight is decided
+        if self.battle.result is None:
+            self.battle.step(dt)
+
+    def save_replay(self):
+        os.makedirs(REPLAY_DIR, exist_ok=True)
+        name = f"level{self.campaign.level}_{time.strftime('%Y%m%d_%H%M%S')}_{self.result}.gwr"
+        self.replay_path = os.path.join(REPLAY_DIR, name)
+        self.recorder.save(self.replay_path)
+        prune_replays()
+
+    def watch_replay(self):
+        self.manager.switch(ReplayScene(self.manager, self.replay_path, back_scene=self))
 
     def finish_battle(self, result):
         self.finished = True
         self.result = result
-        font = pygame.font.SysFont(None, 72)
+        if self.recorder:
+            self.save_replay()
+        font = get_font(72)
 
         if result == "win":
             self.buttons = [
                 Button((425, 500, 200, 40), "Next Level", self.next_level),
                 Button((175, 500, 200, 40), "Main Menu", self.back_to_menu),
             ]
-            self.txt = font.render("You Won!", True, (0, 255, 0))
+            self.txt = render_text(font, "You Won!", (0, 255, 0))
             reward = self.campaign.reward()
             self.manager.economy.add(reward)
-            self.reward_txt = pygame.font.SysFont(None, 44).render(
-                f"+ {reward}g", True, (255, 215, 0)
+            self.reward_txt = render_text(get_font(44),
+                f"+ {reward}g", (255, 215, 0)
             )
             self.campaign.advance_level()
 
@@ -1872,7 +2143,7 @@ class BattleScene(Scene):
                 Button((175, 500, 200, 40), "Main Menu", self.back_to_menu),
                 Button((425, 500, 200, 40), "Try Again", self.next_level),
             ]
-            self.txt = font.render("You Lost...", True, (255, 0, 0))
+            self.txt = render_text(font, "You Lost...", (255, 0, 0))
             self.reward_txt = None
 
         else:  # tie
@@ -1880,12 +2151,19 @@ class BattleScene(Scene):
                 Button((175, 500, 200, 40), "Main Menu", self.back_to_menu),
                 Button((425, 500, 200, 40), "Try Again", self.next_level),
             ]
-            self.txt = font.render("Tie", True, (255, 255, 0))
-            self.reward_txt = None
+            self.txt = render_text(font, "Tie", (255, 255, 0))
+            self.reward_txt = render_text(get_font(32),
+                f"({self.battle.end_reason})", (255, 255, 0)
+            ) if self.battle.end_reason else None
+
+        if self.replay_path:
+            self.buttons.append(Button((300, 550, 200, 40), "Watch Replay", self.watch_replay))
+        # rewards and the next level are decided here, not by input, so save now
+        self.manager.save()
 
     def draw(self, screen):
         screen.fill((0, 0, 0))
-        self.world.draw(screen)
+        self.world.draw(screen, self.alpha)
 
         if self.finished:
             if self.txt:
@@ -1893,9 +2171,160 @@ class BattleScene(Scene):
             if self.reward_txt:
                 screen.blit(self.reward_txt, (350, 300))
 
-            font_small = pygame.font.SysFont(None, 24)
-            for btn in self.buttons:
-                btn.draw(screen, font_small)
+        font_small = get_font(24)
+        for btn in self.buttons:
+            btn.draw(screen, font_small)
+
+        if self.world.prof:   # F3
+            self.draw_profiler(screen)
+
+class ReplayScene(Scene):
+    # Plays a recorded battle straight from the memory-mapped file. Only the
+    # two frames around the playhead are decoded each draw, so seeking
+    # anywhere is as cheap as playing.
+    SPEEDS = [0.25, 0.5, 1, 2, 4, 8]
+    SEEK_STEP = 5.0   # seconds skipped by the arrow keys
+
+    def __init__(self, manager, path, back_scene=None):
+        self.manager = manager
+        self.path = path
+        self.back_scene = back_scene
+        self.reader = ReplayReader.open(path)
+        # Plain Units, only used for drawing; the replay supplies their state
+        self.units = [unit_from_spec(spec, team) for team, spec in self.reader.specs]
+        self.tick = 0.0
+        self.paused = False
+        self.speed_idx = self.SPEEDS.index(1)
+        self.scrubbing = False
+        self.font = get_font(24)
+        self.timeline = pygame.Rect(50, 520, 700, 12)
+
+        self.pause_btn = Button((50, 550, 120, 36), "Pause", self.toggle_pause)
+        self.buttons = [
+            self.pause_btn,
+            Button((190, 550, 80, 36), "Slower", lambda: self.change_speed(-1)),
+            Button((280, 550, 80, 36), "Faster", lambda: self.change_speed(1)),
+            Button((630, 550, 120, 36), "Back", self.go_back),
+        ]
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        self.pause_btn.text = "Play" if self.paused else "Pause"
+
+    def change_speed(self, step):
+        self.speed_idx = max(0, min(len(self.SPEEDS)-1, self.speed_idx+step))
+
+    def seek(self, tick):
+        self.tick = max(0.0, min(float(self.reader.end_tick), tick))
+
+    def scrub_to(self, x):
+        frac = (x - self.timeline.x) / self.timeline.w
+        self.seek(frac * self.reader.end_tick)
+
+    def go_back(self):
+        self.reader.close()
+        if self.back_scene:
+            self.manager.switch(self.back_scene)
+        else:
+            self.manager.switch(ReplayListScene(self.manager))
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.timeline.inflate(0, 16).collidepoint(event.pos):
+            self.scrubbing = True
+            self.scrub_to(event.pos[0])
+            return
+        if event.type == pygame.MOUSEMOTION and self.scrubbing:
+            self.scrub_to(event.pos[0])
+            return
+        if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.scrubbing = False
+        if event.type == pygame.KEYDOWN:
+            step = self.SEEK_STEP / self.reader.dt
+            if event.key == pygame.K_SPACE: self.toggle_pause()
+            elif event.key == pygame.K_LEFT: self.seek(self.tick - step)
+            elif event.key == pygame.K_RIGHT: self.seek(self.tick + step)
+        for btn in self.buttons:
+            btn.handle_event(event)
+
+    def update(self, dt):
+        if not self.paused and not self.scrubbing:
+            self.seek(self.tick + dt/self.reader.dt * self.SPEEDS[self.speed_idx])
+
+    def draw(self, screen):
+        screen.fill((0, 0, 0))
+        r = self.reader
+        i = r.frame_index(int(self.tick))
+        a = r.frame(i)
+        b = r.frame(i+1) if i+1 < r.frame_count else a
+        alpha = (self.tick - a.tick) / (b.tick - a.tick) if b.tick > a.tick else 1.0
+        alpha = max(0.0, min(1.0, alpha))
+        # Units lerp between the two snapshots; projectiles have no identity
+        # across frames, so they snap to the nearer one
+        for u, (ax, ay, _, rot), (bx, by, hp, _) in zip(self.units, a.units, b.units):
+            u.prev_pos.update(ax, ay)
+            u.pos.update(bx, by)
+            u.rotation = rot
+            u.hp = hp
+            u.alive = hp > 0
+            u.draw(screen, alpha)
+        for x, y, angle, team, kind in (a if alpha < 0.5 else b).projectiles:
+            draw_projectile(screen, TEAM_COLORS[team], x, y, angle, kind == 1, kind == 2)
+
+        # timeline
+        pygame.draw.rect(screen, (60, 60, 60), self.timeline)
+        done = int(self.timeline.w * self.tick / max(1, r.end_tick))
+        pygame.draw.rect(screen, (200, 200, 200), (self.timeline.x, self.timeline.y, done, self.timeline.h))
+        pygame.draw.rect(screen, (0, 0, 0), self.timeline, 1)
+        label = f"{self.tick*r.dt:6.1f}s / {r.end_tick*r.dt:.1f}s   x{self.SPEEDS[self.speed_idx]}"
+        screen.blit(render_text(self.font, label, (255, 255, 255)), (380, 560))
+        for btn in self.buttons:
+            btn.draw(screen, self.font)
+
+
+class ReplayListScene(Scene):
+    static = True
+    PER_PAGE = 8
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.font = get_font(28)
+        self.page = 0
+        self.paths = list_replays()
+        self._build_buttons()
+
+    def _build_buttons(self):
+        start = self.page * self.PER_PAGE
+        self.buttons = []
+        for i, path in enumerate(self.paths[start:start+self.PER_PAGE]):
+            self.buttons.append(Button((150, 80 + i*52, 500, 44), os.path.basename(path),
+                                       lambda p=path: self.open(p)))
+        self.buttons.append(Button((150, 520, 150, 44), "Back", self.go_back))
+        if self.page > 0:
+            self.buttons.append(Button((325, 520, 150, 44), "Newer", lambda: self.turn(-1)))
+        if start + self.PER_PAGE < len(self.paths):
+            self.buttons.append(Button((500, 520, 150, 44), "Older", lambda: self.turn(1)))
+
+    def turn(self, step):
+        self.page += step
+        self._build_buttons()
+
+    def open(self, path):
+        self.manager.switch(ReplayScene(self.manager, path))
+
+    def go_back(self):
+        self.manager.switch(MainMenu(self.manager, self.manager.gacha, self.manager.inventory))
+
+    def handle_event(self, event):
+        for btn in self.buttons:
+            btn.handle_event(event)
+
+    def draw(self, screen):
+        screen.fill((30, 30, 50))
+        title = "Replays" if self.paths else "No replays yet"
+        screen.blit(render_text(self.font, title, (255, 255, 255)), (150, 40))
+        for btn in self.buttons:
+            btn.draw(screen, self.font)
+
 
 class Economy:
     def __init__(self, gold=0):
@@ -1918,36 +2347,62 @@ class Economy:
         return cls(gold=data["gold"])
 
 
-def main():
+def main(sim_hz=SIM_HZ, max_battle_time=MAX_BATTLE_TIME, seed=None):
     pygame.init()
     screen = pygame.display.set_mode((800,600))
     clock = pygame.time.Clock()
 
+    # One stream per banner, seeded like CampaignState's, so pulls are reproducible
+    if seed is None: seed = random.randrange(1 << 32)
     gacha_systems = {
-        "triangle": GachaBanner(Triangle,5),
-        "square": GachaBanner(Square,5),
-        "pentagon": GachaBanner(Pentagon,4),
+        "triangle": GachaBanner(Triangle,5,random.Random(f"{seed}/triangle")),
+        "square": GachaBanner(Square,5,random.Random(f"{seed}/square")),
+        "pentagon": GachaBanner(Pentagon,4,random.Random(f"{seed}/pentagon")),
     }
 
     manager = SceneManager(None, gacha_systems, Inventory(), Formation(), Economy(300))
+    manager.sim_hz = sim_hz
+    manager.max_battle_time = max_battle_time
     manager.current = SaveMenu(manager)  # start at save menu
 
     running = True
+    shown = None   # scene drawn last frame
     while running:
-        dt = clock.tick(60)/1000
-        for event in pygame.event.get():
+        scene = manager.current
+        if scene.static and not scene.dirty and scene is shown:
+            # Nothing to animate: block until input, waking now and then for timers
+            event = pygame.event.wait(IDLE_WAIT_MS)
+            events = [] if event.type == pygame.NOEVENT else [event]
+            events += pygame.event.get()
+            dt = clock.tick()/1000
+        else:
+            dt = clock.tick(60)/1000
+            events = pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
             manager.current.handle_event(event)
 
         manager.current.update(dt)
-        manager.current.draw(screen)
-        pygame.display.flip()
+        scene = manager.current
+        if events or scene is not shown or scene.dirty or not scene.static:
+            scene.draw(screen)
+            pygame.display.flip()
+            scene.dirty = False
 
-        # Auto-save after each frame (cheap since JSON small)
-        manager.save()
+        # Auto-save whenever input or a scene switch may have changed something
+        if events or scene is not shown:
+            manager.save()
+        shown = scene
 
     pygame.quit()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sim-hz", type=int, default=SIM_HZ,
+                        help="battle simulation rate; lower it on slow machines (rendering stays at 60 FPS)")
+    parser.add_argument("--max-battle-time", type=float, default=MAX_BATTLE_TIME,
+                        help="simulated seconds before a battle is called a tie")
+    parser.add_argument("--seed", type=int, help="seed for the summon banners (random if omitted)")
+    args = parser.parse_args()
+    main(args.sim_hz, args.max_battle_time, args.seed)
@@ -0,0 +1,291 @@
+import os, json, time, random, argparse
+from concurrent.futures import ProcessPoolExecutor
+import pygame
+from game3 import unit_spec, formation_spec, MAX_BATTLE_TIME
+from headless import run_spec_battle
+
+# Searches unit selection and placement for a formation that beats a given
+# enemy. Evolutionary (mu + lambda): every generation mutates the best few
+# candidates, plays all new ones against the enemy, one chunk per worker
+# process, and keeps the best. A chunk is played either as one lockstep
+# ArenaBatch (needs numpy) or battle by battle on the classic World, whichever
+# timed faster on the first generation. Battles are deterministic (see
+# game3.Battle), so each candidate is played once and its score cached.
+#
+#   python optimizer.py saves/save1.json --generations 30
+
+MAP_RECT = (20, 20, 360, 560)   # FormationScene.MAP_RECT as (x, y, w, h)
+MIN_UNIT_DIST = 55              # FormationScene.MIN_UNIT_DIST
+EDGE_MARGIN = 16                # FormationScene keeps drops this far inside the map
+MAX_UNITS = 8
+EVAL_TIME = 90.0                # simulated seconds per scoring battle; ties are ranked by hp
+MOVE_SIGMA = 40                 # px, typical distance of a "move" mutation
+PROBE_TIME = 5.0                # simulated seconds per battle when timing the two backends
+
+_job = None  # (enemy_spec, max_time, lockstep) inside each worker
+
+
+def _init_worker(job):
+    global _job
+    _job = job
+
+
+def _play(specs):
+    # ArenaBatch plays the very battle the game's classic World would (see
+    # tests/test_backends.py), so either way these scores are the player's
+    # results. Without numpy every battle goes to the classic World.
+    enemy_spec, max_time, lockstep = _job
+    if lockstep:
+        try:
+            from arenas import run_arenas
+        except ImportError:
+            pass
+        else:
+            return run_arenas([(s, enemy_spec) for s in specs], max_time=max_time)
+    return [run_spec_battle(s, enemy_spec, max_time=max_time) for s in specs]
+
+
+def fitness(result, player_max, enemy_max, max_time):
+    # Wins beat ties beat losses; within each, the hp margin decides and
+    # faster wins count a little more. Ranges of the three never overlap.
+    base = {"win": 2.0, "tie": 1.0, "lose": 0.0}[result.outcome]
+    margin = result.player_hp/player_max - result.enemy_hp/enemy_max
+    quick = 0.09*(1 - result.duration/max_time) if result.outcome == "win" else 0.0
+    return base + 0.4*margin + quick
+
+
+class FormationOptimizer:
+    def __init__(self, inventory, enemy_spec, size=MAX_UNITS, population=16, parents=4,
+                 workers=None, max_time=EVAL_TIME, seed=0, lockstep=None):
+        # Candidates are tuples of (uid, x, y) sorted by uid, so equal
+        # formations share a cache entry. lockstep: True plays each worker's
+        # chunk as one ArenaBatch, False battle by battle, None times both.
+        self.inventory = inventory
+        self.enemy_spec = enemy_spec
+        self.enemy_max = sum(s[3] for s in enemy_spec) or 1
+        self.size = min(size, MAX_UNITS, len(inventory.units))
+        self.population = population
+        self.parents = parents
+        self.workers = os.cpu_count() if workers is None else workers
+        self.max_time = max_time
+        self.lockstep = lockstep
+        self.rng = random.Random(seed)
+        self.cache = {}      # candidate -> (score, BattleResult)
+        self.battles = 0
+        # Swaps mostly draw from the highest levelled units of a big inventory
+        ranked = sorted(inventory.units, key=lambda uid: -inventory.units[uid].level)
+        self.uids = ranked
+        self.top = ranked[:max(24, 3*self.size)]
+        x, y, w, h = MAP_RECT
+        self.bounds = (x+EDGE_MARGIN, y+EDGE_MARGIN, x+w-EDGE_MARGIN, y+h-EDGE_MARGIN)
+
+    # ---------- candidates ----------
+    def spec(self, cand):
+        return tuple(unit_spec(self.inventory.units[uid], (x, y)) for uid, x, y in cand)
+
+    def pick_uid(self, exclude):
+        for _ in range(50):
+            pool = self.top if self.rng.random() < 0.7 else self.uids
+            uid = self.rng.choice(pool)
+            if uid not in exclude: return uid
+        return next((u for u in self.uids if u not in exclude), None)
+
+    def free_spot(self, taken, near=None):
+        # Integer spot in the map at least MIN_UNIT_DIST from every taken (x, y)
+        left, top, right, bottom = self.bounds
+        for attempt in range(200):
+            if near is not None and attempt < 20:
+                x = near[0] + self.rng.gauss(0, MOVE_SIGMA)
+                y = near[1] + self.rng.gauss(0, MOVE_SIGMA)
+            else:
+                x, y = self.rng.uniform(left, right), self.rng.uniform(top, bottom)
+            x, y = int(min(right, max(left, x))), int(min(bottom, max(top, y)))
+            if all((x-tx)**2 + (y-ty)**2 >= MIN_UNIT_DIST**2 for tx, ty in taken):
+                return x, y
+        return None
+
+    def build(self, uids, positions=None):
+        placed = []
+        for i, uid in enumerate(uids):
+            pos = positions[i] if positions and i < len(positions) else self.free_spot([(x, y) for _, x, y in placed])
+            if pos is None: break
+            placed.append((uid, int(pos[0]), int(pos[1])))
+        return tuple(sorted(placed))
+
+    def from_formation(self, formation):
+        slots = list(formation.slots.items())[:self.size]
+        return self.build([uid for uid, _ in slots if uid in self.inventory.units],
+                          [tuple(pos) for uid, pos in slots if uid in self.inventory.units])
+
+    def mutate(self, cand):
+        units = list(cand)
+        for _ in range(self.rng.choice((1, 1, 2))):
+            ops = ['move', 'swap', 'trade']
+            if len(units) < self.size: ops += ['add', 'add']
+            if len(units) > 1: ops.append('drop')
+            op = self.rng.choice(ops)
+            i = self.rng.randrange(len(units))
+            uid, x, y = units[i]
+            others = [(ox, oy) for j, (_, ox, oy) in enumerate(units) if j != i]
+            if op == 'move':
+                spot = self.free_spot(others, near=(x, y))
+                if spot: units[i] = (uid, *spot)
+            elif op == 'swap':
+                new = self.pick_uid({u for u, _, _ in units})
+                if new: units[i] = (new, x, y)
+            elif op == 'trade' and len(units) > 1:
+                j = self.rng.randrange(len(units))
+                units[i], units[j] = (uid, units[j][1], units[j][2]), (units[j][0], x, y)
+            elif op == 'add':
+                new = self.pick_uid({u for u, _, _ in units})
+                spot = self.free_spot([(ox, oy) for _, ox, oy in units])
+                if new and spot: units.append((new, *spot))
+            elif op == 'drop':
+                units.pop(i)
+        return tuple(sorted(units))
+
+    def seeds(self, formation=None):
+        # Starting population: the current formation, the highest levelled
+        # units, and random picks
+        population = []
+        if formation is not None and formation.slots:
+            population.append(self.from_formation(formation))
+        population.append(self.build(self.uids[:self.size]))
+        while len(population) < self.population:
+            uids = []
+            while len(uids) < self.size:
+                uids.append(self.pick_uid(set(uids)))
+            population.append(self.build(uids))
+        return [c for c in population if c]
+
+    # ---------- scoring ----------
+    def pick_backend(self, specs):
+        # Plays one worker's share of specs on both backends, cut short at
+        # PROBE_TIME, and returns True if the lockstep ArenaBatch was faster.
+        # It wins with many candidates per worker and loses with a few.
+        try:
+            from arenas import run_arenas
+        except ImportError:
+            return False
+        share = specs[:-(-len(specs) // max(self.workers, 1))]
+        max_time = min(PROBE_TIME, self.max_time)
+        start = time.perf_counter()
+        run_arenas([(s, self.enemy_spec) for s in share], max_time=max_time)
+        lockstep = time.perf_counter() - start
+        start = time.perf_counter()
+        for s in share:
+            run_spec_battle(s, self.enemy_spec, max_time=max_time)
+        return lockstep < time.perf_counter() - start
+
+    def score(self, candidates, pool=None):
+        new = [c for c in dict.fromkeys(candidates) if c not in self.cache]
+        if new:
+            specs = [self.spec(c) for c in new]
+            if self.lockstep is None:
+                self.lockstep = self.pick_backend(specs)
+            if pool is None:
+                _init_worker((self.enemy_spec, self.max_time, self.lockstep))
+                results = _play(specs)
+            else:
+                # one chunk per worker
+                n = -(-len(specs) // self.workers)
+                chunks = [specs[i:i+n] for i in range(0, len(specs), n)]
+                results = [r for part in pool.map(_play, chunks) for r in part]
+            for c, spec, r in zip(new, specs, results):
+                player_max = sum(s[3] for s in spec) or 1
+                self.cache[c] = (fitness(r, player_max, self.enemy_max, self.max_time), r)
+            self.battles += len(new)
+        return [self.cache[c][0] for c in candidates]
+
+    def run(self, formation=None, generations=30, patience=6, time_budget=None, target=None, log=None):
+        # Early stopping: no better candidate for `patience` generations,
+        # time_budget seconds spent, or a best score of at least target.
+        # Returns (best candidate, score, BattleResult).
+        start = time.perf_counter()
+        population = self.seeds(formation)
+        if self.lockstep is None:
+            self.lockstep = self.pick_backend([self.spec(c) for c in population])
+        job = (self.enemy_spec, self.max_time, self.lockstep)
+        pool = None
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(job,))
+        try:
+            scores = self.score(population, pool)
+            ranked = sorted(zip(scores, population), key=lambda sc: -sc[0])
+            best_score, best = ranked[0]
+            stale = 0
+            for gen in range(generations):
+                if target is not None and best_score >= target: break
+                if time_budget is not None and time.perf_counter()-start >= time_budget: break
+                parents = [c for _, c in ranked[:self.parents]]
+                children = []
+                for _ in range(self.population*4):
+                    if len(children) >= self.population: break
+                    child = self.mutate(self.rng.choice(parents))
+                    if child and child not in self.cache and child not in children: children.append(child)
+                pool_scores = self.score(children, pool)
+                ranked = sorted(ranked[:self.parents] + list(zip(pool_scores, children)), key=lambda sc: -sc[0])
+                if ranked[0][0] > best_score:
+                    best_score, best = ranked[0]
+                    stale = 0
+                else:
+                    stale += 1
+                if log: log(gen, best_score, self.cache[best][1], self.battles, time.perf_counter()-start)
+                if stale >= patience: break
+        finally:
+            if pool: pool.shutdown()
+        return best, best_score, self.cache[best][1]
+
+    def apply(self, cand, formation):
+        # Writes the candidate into formation.slots the way Formation.from_dict does
+        formation.slots = {uid: pygame.Vector2(x, y) for uid, x, y in cand}
+        return formation
+
+
+def optimize(formation, inventory, campaign, **kwargs):
+    # Finds a formation against the campaign's current enemy and writes it to formation.slots
+    run_kwargs = {k: kwargs.pop(k) for k in ('generations', 'patience', 'time_budget', 'target', 'log') if k in kwargs}
+    opt = FormationOptimizer(inventory, formation_spec(campaign.enemy_formation, campaign.enemy_inventory), **kwargs)
+    best, score, result = opt.run(formation, **run_kwargs)
+    opt.apply(best, formation)
+    return score, result
+
+
+if __name__ == "__main__":
+    from main import CampaignState
+    from GameExTwoClass import Inventory, Formation
+    parser = argparse.ArgumentParser(description="Optimize a save's formation against its campaign enemy")
+    parser.add_argument("save")
+    parser.add_argument("--generations", type=int, default=30)
+    parser.add_argument("--population", type=int, default=16, help="new candidates per generation")
+    parser.add_argument("--patience", type=int, default=6, help="stop after this many generations without improvement")
+    parser.add_argument("--time-budget", type=float, help="stop after this many wall-clock seconds")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU, 0 = in-process)")
+    parser.add_argument("--max-time", type=float, default=EVAL_TIME, help="simulated seconds per scoring battle")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=['auto', 'lockstep', 'classic'], default='auto',
+                        help="play each worker's candidates as one ArenaBatch or one by one (auto: time both)")
+    parser.add_argument("--dry-run", action="store_true", help="do not write the formation back to the save")
+    args = parser.parse_args()
+    with open(args.save, "r") as f:
+        data = json.load(f)
+    inventory = Inventory.from_dict(data["inventory"], data["capacity"])
+    formation = Formation.from_dict(data["formation"])
+    campaign = CampaignState.from_dict(data["campaign"])
+
+    def log(gen, score, result, battles, elapsed):
+        print(f"gen {gen+1:3d}  best {score:.3f}  {result}  ({battles} battles, {elapsed:.1f}s)", flush=True)
+
+    score, result = optimize(formation, inventory, campaign, generations=args.generations,
+                             population=args.population, patience=args.patience, time_budget=args.time_budget,
+                             workers=args.workers, max_time=args.max_time, seed=args.seed,
+                             lockstep={'auto': None, 'lockstep': True, 'classic': False}[args.backend], log=log)
+    final = run_spec_battle(formation_spec(formation, inventory),
+                            formation_spec(campaign.enemy_formation, campaign.enemy_inventory),
+                            max_time=MAX_BATTLE_TIME)
+    print(f"best {score:.3f}; full-length battle: {final}")
+    if not args.dry_run:
+        data["formation"] = formation.to_dict()
+        with open(args.save, "w") as f:
+            json.dump(data, f, indent=2)
+        print(f"wrote {len(formation.slots)} units to {args.save}")
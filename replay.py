@@ -0,0 +1,260 @@
+import sys, struct, math, zlib, mmap, bisect
+from array import array
+
+# Compact binary battle recordings. A replay is the unit specs a battle
+# started from, followed by quantized snapshots of every unit and projectile
+# taken every `stride` sim ticks. Everything is little-endian.
+#
+#   header  : magic, version, reserved (always 0), stride, dt, unit count
+#   units   : team, kind, x, y, hp, power, rate, extra, speed, acceleration  (one per unit)
+#   blocks  : KEYFRAME_INTERVAL frames each, zlib-compressed independently
+#   index   : first tick, file offset, compressed size, frame count  (one per block)
+#   trailer : index offset, block count, last tick, magic
+#
+#   frame   : tick, projectile count
+#             unit x, y, hp as uint16 (positions in 1/8 px, hp rounded up), rotation as uint8
+#             projectile x, y as uint16 (1/8 px), angle as uint8, flags (team | kind<<1)
+#
+# Every frame is a full snapshot, so each block starts on a keyframe and the
+# index lets a reader seek by inflating only the block it needs. A two minute
+# fight with a full board of projectiles lands around 250 KB.
+
+MAGIC = b'GWRP'
+INDEX_MAGIC = b'GWRI'
+VERSION = 2
+REPLAY_STRIDE = 3          # record every 3rd tick, 20 snapshots a second at 60 Hz
+KEYFRAME_INTERVAL = 64     # frames per compressed block, ~3 s of battle
+POS_SCALE = 8              # 1/8 px is plenty for drawing, and keeps x, y under 8192 px
+ANGLE_SCALE = 256/360
+
+KINDS = ('triangle', 'pentagon', 'square')   # same order as game3.PROJ_KINDS
+KIND_INDEX = {k: i for i, k in enumerate(KINDS)}
+
+HEADER = struct.Struct('<4sHIHfH')
+UNIT = struct.Struct('<BBffffffff')
+FRAME = struct.Struct('<IH')
+INDEX = struct.Struct('<IIII')
+TRAILER = struct.Struct('<III4s')
+
+_SWAP = sys.byteorder != 'little'
+
+
+def _pack(typecode, values):
+    a = array(typecode, values)
+    if _SWAP: a.byteswap()
+    return a.tobytes()
+
+
+def _unpack(typecode, buf, offset, count):
+    a = array(typecode)
+    end = offset + count*a.itemsize
+    a.frombytes(buf[offset:end])
+    if _SWAP: a.byteswap()
+    return a, end
+
+
+def _coord(v):
+    return min(65535, max(0, int(v*POS_SCALE + 0.5)))
+
+
+def _angle(deg):
+    return int((deg % 360)*ANGLE_SCALE) & 0xFF
+
+
+def _frame_size(n_units, n_proj):
+    return FRAME.size + 7*n_units + 6*n_proj
+
+
+class ReplayRecorder:
+    def __init__(self, player_spec, enemy_spec, dt, stride=REPLAY_STRIDE):
+        self.specs = [(0, s) for s in player_spec] + [(1, s) for s in enemy_spec]
+        self.dt = dt
+        self.stride = stride
+        self.blocks = []    # (first tick, compressed bytes, frame count)
+        self.pending = []   # raw frames of the block being filled
+        self.first_tick = 0
+        self.last_tick = -1
+
+    def header(self):
+        parts = [HEADER.pack(MAGIC, VERSION, 0, self.stride, self.dt, len(self.specs))]
+        for team, (kind, x, y, hp, power, rate, extra, speed, acceleration) in self.specs:
+            parts.append(UNIT.pack(team, KIND_INDEX[kind], x, y, hp, power, rate, extra, speed, acceleration))
+        return b''.join(parts)
+
+    def capture(self, battle, force=False):
+        # Called after every Battle.step; only every stride-th tick is kept,
+        # plus the final one so the replay ends on the result.
+        if not force and battle.ticks % self.stride: return
+        if battle.ticks == self.last_tick: return
+        units = battle.player_units + battle.enemy_units
+        uxyh = []
+        for u in units:
+            hp = u.hp if u.alive else 0
+            uxyh += (_coord(u.pos.x), _coord(u.pos.y), min(65535, max(0, math.ceil(hp))))
+        xs, ys, angles, teams, kinds = battle.world.projectile_states()
+        pxy = []
+        for x, y in zip(xs, ys):
+            pxy += (_coord(x), _coord(y))
+        if not self.pending: self.first_tick = battle.ticks
+        self.last_tick = battle.ticks
+        self.pending.append(b''.join((
+            FRAME.pack(battle.ticks, len(xs)),
+            _pack('H', uxyh),
+            _pack('B', [_angle(u.rotation) for u in units]),
+            _pack('H', pxy),
+            _pack('B', [_angle(a) for a in angles]),
+            _pack('B', [t | k << 1 for t, k in zip(teams, kinds)]),
+        )))
+        if len(self.pending) >= KEYFRAME_INTERVAL: self.flush()
+
+    def flush(self):
+        # Compress the block being filled; recordings stay compressed in memory
+        if not self.pending: return
+        self.blocks.append((self.first_tick, zlib.compress(b''.join(self.pending)), len(self.pending)))
+        self.pending = []
+
+    def to_bytes(self):
+        self.flush()
+        parts = [self.header()]
+        offset = len(parts[0])
+        index = []
+        for first_tick, block, count in self.blocks:
+            index.append(INDEX.pack(first_tick, offset, len(block), count))
+            parts.append(block)
+            offset += len(block)
+        parts += index
+        parts.append(TRAILER.pack(offset, len(self.blocks), self.last_tick, INDEX_MAGIC))
+        return b''.join(parts)
+
+    def save(self, path):
+        data = self.to_bytes()
+        with open(path, "wb") as f:
+            f.write(data)
+        return len(data)
+
+
+class ReplayFrame:
+    __slots__ = ('tick', 'units', 'projectiles')
+
+    def __init__(self, tick, units, projectiles):
+        self.tick = tick
+        self.units = units              # (x, y, hp, rotation) per unit, in header order
+        self.projectiles = projectiles  # (x, y, angle, team, kind) per projectile
+
+
+class ReplayReader:
+    # Works on bytes or a read-only mmap. Only the header and the block index
+    # are parsed up front; frames are decoded one at a time from whichever
+    # block holds them, with the last few inflated blocks kept around so
+    # scrubbing back and forth does not decompress the same block repeatedly.
+    CACHED_BLOCKS = 2
+
+    def __init__(self, data):
+        self.data = data
+        self._file = None
+        magic, version, _, self.stride, self.dt, n = HEADER.unpack_from(data, 0)
+        if magic != MAGIC: raise ValueError("Not a replay file")
+        if version != VERSION: raise ValueError(f"Unsupported replay version {version}")
+        offset = HEADER.size
+        self.specs = []
+        for _ in range(n):
+            team, kind, *rest = UNIT.unpack_from(data, offset)
+            self.specs.append((team, (KINDS[kind], *rest)))
+            offset += UNIT.size
+        self.size = len(data)
+        index_offset, nblocks, self.end_tick, magic = TRAILER.unpack_from(data, len(data)-TRAILER.size)
+        if magic != INDEX_MAGIC: raise ValueError("Replay file has no index (truncated?)")
+        self.index = [INDEX.unpack_from(data, index_offset + i*INDEX.size) for i in range(nblocks)]
+        self.block_ticks = [e[0] for e in self.index]
+        self.block_starts = []   # global number of each block's first frame
+        total = 0
+        for e in self.index:
+            self.block_starts.append(total)
+            total += e[3]
+        self.frame_count = total
+        self._blocks = {}        # block number -> (inflated bytes, frame offsets, frame ticks)
+
+    @classmethod
+    def open(cls, path):
+        # Memory-maps the file; call close() when done
+        f = open(path, "rb")
+        try:
+            reader = cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except Exception:
+            f.close()
+            raise
+        reader._file = f
+        return reader
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def close(self):
+        self._blocks.clear()
+        if self._file:
+            self.data.close()
+            self._file.close()
+            self._file = None
+
+    def player_spec(self):
+        return tuple(s for team, s in self.specs if team == 0)
+
+    def enemy_spec(self):
+        return tuple(s for team, s in self.specs if team == 1)
+
+    def _block(self, b):
+        cached = self._blocks.get(b)
+        if cached: return cached
+        first_tick, offset, size, count = self.index[b]
+        body = zlib.decompress(self.data[offset:offset+size])
+        n = len(self.specs)
+        offsets, ticks = [], []
+        pos = 0
+        for _ in range(count):
+            tick, nproj = FRAME.unpack_from(body, pos)
+            offsets.append(pos)
+            ticks.append(tick)
+            pos += _frame_size(n, nproj)
+        if len(self._blocks) >= self.CACHED_BLOCKS:
+            self._blocks.pop(next(iter(self._blocks)))
+        cached = self._blocks[b] = (body, offsets, ticks)
+        return cached
+
+    def frame_index(self, tick):
+        # Number of the last frame recorded at or before tick
+        b = max(0, bisect.bisect_right(self.block_ticks, tick)-1)
+        _, _, ticks = self._block(b)
+        return self.block_starts[b] + max(0, bisect.bisect_right(ticks, tick)-1)
+
+    def frame(self, i):
+        b = bisect.bisect_right(self.block_starts, i)-1
+        body, offsets, _ = self._block(b)
+        return self.read_frame(body, offsets[i-self.block_starts[b]])
+
+    def read_frame(self, body, offset):
+        n = len(self.specs)
+        tick, nproj = FRAME.unpack_from(body, offset)
+        uxyh, offset = _unpack('H', body, offset+FRAME.size, 3*n)
+        rot, offset = _unpack('B', body, offset, n)
+        pxy, offset = _unpack('H', body, offset, 2*nproj)
+        angle, offset = _unpack('B', body, offset, nproj)
+        flags, offset = _unpack('B', body, offset, nproj)
+        units = [(uxyh[3*i]/POS_SCALE, uxyh[3*i+1]/POS_SCALE, uxyh[3*i+2], rot[i]/ANGLE_SCALE)
+                 for i in range(n)]
+        projectiles = [(pxy[2*i]/POS_SCALE, pxy[2*i+1]/POS_SCALE, angle[i]/ANGLE_SCALE, flags[i] & 1, flags[i] >> 1)
+                       for i in range(nproj)]
+        return ReplayFrame(tick, units, projectiles)
+
+    def frames(self):
+        for i in range(self.frame_count):
+            yield self.frame(i)
+
+
+if __name__ == "__main__":
+    # python replay.py replays/battle.gwr
+    r = ReplayReader.open(sys.argv[1])
+    print(f"{len(r.specs)} units, {r.frame_count} frames in {len(r.index)} blocks, "
+          f"{r.end_tick*r.dt:.1f}s simulated, {r.size/1024:.1f} KB")
+    r.close()
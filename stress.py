@@ -0,0 +1,100 @@
+import argparse, math, time
+from game3 import (WIDTH, HEIGHT, MIN_UNIT_DIST, UNIT_CELL, SIM_HZ, WORLD_BACKENDS,
+                   SpatialHash, WorldProfiler, make_world, random_position, unit_spec, instantiate_spec)
+from GameExTwoClass import Triangle, Square, Pentagon
+
+# Scaling benchmark: fills an arena of any size with hundreds or thousands of
+# default-stat units per team and times World.update tick by tick. Nothing is
+# drawn, so the numbers are pure simulation cost.
+#
+#   python stress.py --units 500 --ticks 600 --backend numpy
+
+MIX = {'t': Triangle, 's': Square, 'p': Pentagon}
+
+
+def arena_for(units_per_team):
+    # Default arena: the normal 800x600 scaled up so each team's half has room
+    # for roughly four times the area its units need at MIN_UNIT_DIST spacing
+    need = units_per_team * 4 * MIN_UNIT_DIST**2
+    scale = max(1.0, math.sqrt(need / (WIDTH/2 * HEIGHT)))
+    return int(WIDTH*scale), int(HEIGHT*scale)
+
+
+def army_spec(team, n, mix, width, height, grid, rng):
+    spec = []
+    for i in range(n):
+        data = MIX[mix[i % len(mix)]]()
+        pos = random_position(team, (), width, height, grid, rng)
+        spec.append(unit_spec(data, pos))
+        grid.insert((pos.x, pos.y), pos)
+    return tuple(spec)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values: return 0.0
+    k = min(len(sorted_values)-1, max(0, int(round(q/100 * (len(sorted_values)-1)))))
+    return sorted_values[k]
+
+
+def run(units, ticks, backend='classic', width=None, height=None, mix='tsp', seed=0, warmup=30, profile=None):
+    if width is None or height is None:
+        width, height = arena_for(units)
+    world = make_world(backend, width, height, seed)
+    grid = SpatialHash(UNIT_CELL)
+    t0 = time.perf_counter()
+    instantiate_spec(army_spec(0, units, mix, width, height, grid, world.rng), 0, world)
+    instantiate_spec(army_spec(1, units, mix, width, height, grid, world.rng), 1, world)
+    setup = time.perf_counter() - t0
+
+    dt = 1/SIM_HZ
+    for _ in range(warmup):
+        world.update(dt)
+    if profile: world.prof = WorldProfiler()
+    times = []
+    clock = time.perf_counter
+    for _ in range(ticks):
+        t = clock()
+        world.update(dt)
+        times.append(clock() - t)
+    if profile: world.prof.dump(profile)
+
+    total = sum(times)
+    ms = sorted(t*1000 for t in times)
+    return {
+        "backend": backend, "arena": (width, height), "units_per_team": units,
+        "setup_s": setup, "ticks": ticks,
+        "ticks_per_s": ticks/total if total else float('inf'),
+        "mean_ms": total*1000/ticks if ticks else 0.0,
+        "p50_ms": percentile(ms, 50), "p90_ms": percentile(ms, 90),
+        "p99_ms": percentile(ms, 99), "max_ms": ms[-1] if ms else 0.0,
+        "alive": sum(1 for u in world.units if u.alive),
+        "projectiles": len(world.projectiles),
+    }
+
+
+def report(r):
+    w, h = r["arena"]
+    print(f"{r['backend']:>8}  {r['units_per_team']:>5}/team  {w}x{h}  "
+          f"{r['ticks_per_s']:8.1f} ticks/s  mean {r['mean_ms']:7.2f} ms  "
+          f"p50 {r['p50_ms']:7.2f}  p90 {r['p90_ms']:7.2f}  p99 {r['p99_ms']:7.2f}  max {r['max_ms']:7.2f}  "
+          f"({r['alive']} alive, {r['projectiles']} projectiles, setup {r['setup_s']:.2f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="World.update scaling benchmark")
+    parser.add_argument("--units", type=int, nargs="+", default=[100, 250, 500],
+                        help="units per team; several values run one after another")
+    parser.add_argument("--ticks", type=int, default=300, help="timed ticks per run")
+    parser.add_argument("--warmup", type=int, default=30, help="untimed ticks before measuring")
+    parser.add_argument("--backend", choices=WORLD_BACKENDS, nargs="+", default=['classic'])
+    parser.add_argument("--width", type=int, help="arena width (default scales with --units)")
+    parser.add_argument("--height", type=int, help="arena height (default scales with --units)")
+    parser.add_argument("--mix", default="tsp",
+                        help="unit kinds cycled per team: t=triangle, s=square, p=pentagon")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", metavar="JSON",
+                        help="also dump WorldProfiler phase timings of the last run here")
+    args = parser.parse_args()
+    for n in args.units:
+        for backend in args.backend:
+            report(run(n, args.ticks, backend, args.width, args.height, args.mix, args.seed, args.warmup, args.profile))
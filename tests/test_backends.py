@@ -0,0 +1,93 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from game3 import make_world, instantiate_spec, Battle
+from headless import run_spec_battle, HEADLESS_DT
+from arenas import run_arenas
+
+# The numpy backends have to play out exactly the battle game3.World does.
+# (kind, x, y, hp, power, rate, extra, speed, acceleration) per unit, as
+# game3.formation_spec() builds them: triangles that end it, squares that
+# intercept, pentagons that heal and units stacked close enough to touch.
+MATCHUPS = [
+    ((('triangle', 120, 300, 120, 9, 1.5, 0.0, 130, 150),
+      ('square', 160, 260, 100, 0, 2.0, 4.0, 170, 250),
+      ('pentagon', 100, 220, 100, 15, 4.0, 0.0, 110, 300)),
+     (('triangle', 680, 300, 100, 6, 1.2, 0.0, 140, 120),
+      ('triangle', 700, 340, 90, 5, 2.0, 0.0, 100, 100),
+      ('square', 640, 260, 110, 0, 3.0, 6.0, 160, 200))),
+    ((('triangle', 400, 320, 100, 7, 1.0, 0.0, 120, 180),
+      ('triangle', 430, 330, 100, 7, 1.0, 0.0, 120, 180),
+      ('pentagon', 415, 360, 100, 25, 3.0, 0.0, 120, 300)),
+     (('triangle', 400, 280, 100, 8, 1.3, 0.0, 110, 100),
+      ('square', 370, 260, 100, 0, 1.5, 3.0, 160, 250),
+      ('pentagon', 440, 250, 100, 20, 5.0, 0.0, 100, 300))),
+    ((('square', 60, 60, 100, 0, 1.0, 5.0, 200, 300),
+      ('square', 90, 60, 100, 0, 1.0, 5.0, 200, 300),
+      ('triangle', 60, 100, 150, 12, 2.0, 0.0, 150, 200)),
+     (('triangle', 740, 540, 150, 12, 2.0, 0.0, 150, 200),
+      ('square', 710, 540, 100, 0, 1.0, 5.0, 200, 300),
+      ('square', 740, 510, 100, 0, 1.0, 5.0, 200, 300))),
+]
+# Battles one side wins well inside MAX_TIME, so the end itself is compared too
+DECISIVE = [
+    ((('triangle', 200, 300, 120, 30, 0.5, 0.0, 200, 300),
+      ('triangle', 200, 340, 120, 30, 0.5, 0.0, 200, 300),
+      ('pentagon', 160, 320, 100, 15, 1.0, 0.0, 150, 300)),
+     (('triangle', 600, 300, 80, 5, 1.0, 0.0, 150, 200),
+      ('square', 600, 340, 80, 0, 1.0, 3.0, 200, 300))),
+    ((('triangle', 380, 300, 60, 4, 1.0, 0.0, 150, 200),
+      ('square', 350, 330, 60, 0, 2.0, 3.0, 180, 250)),
+     (('triangle', 420, 300, 150, 20, 0.6, 0.0, 200, 300),
+      ('triangle', 450, 320, 150, 20, 0.6, 0.0, 200, 300),
+      ('square', 450, 280, 100, 0, 1.5, 4.0, 200, 300))),
+    ((('triangle', 300, 300, 100, 12, 0.8, 0.0, 160, 200),
+      ('triangle', 300, 360, 100, 12, 0.8, 0.0, 160, 200),
+      ('square', 340, 330, 100, 0, 1.0, 4.0, 200, 300),
+      ('pentagon', 260, 330, 100, 20, 2.0, 0.0, 150, 300)),
+     (('triangle', 500, 300, 90, 8, 1.0, 0.0, 150, 200),
+      ('square', 470, 330, 90, 0, 1.2, 4.0, 200, 300),
+      ('pentagon', 540, 330, 90, 15, 2.5, 0.0, 150, 300))),
+]
+MAX_TIME = 30
+
+
+def play(player, enemy, backend):
+    # run_spec_battle, keeping hold of the units
+    world = make_world(backend, seed=0)
+    player_units = instantiate_spec(player, 0, world)
+    enemy_units = instantiate_spec(enemy, 1, world)
+    battle = Battle(world, player_units, enemy_units, max_time=MAX_TIME)
+    while battle.result is None:
+        battle.step(HEADLESS_DT)
+    return battle, [u.hp for u in player_units], [u.hp for u in enemy_units]
+
+
+@pytest.mark.parametrize("player, enemy", MATCHUPS)
+def test_numpy_backend_plays_the_classic_battle(player, enemy):
+    classic = run_spec_battle(player, enemy, max_time=MAX_TIME, backend='classic')
+    fast = run_spec_battle(player, enemy, max_time=MAX_TIME, backend='numpy')
+    assert fast.to_dict() == classic.to_dict()
+
+
+@pytest.mark.parametrize("player, enemy", DECISIVE)
+def test_numpy_backend_ends_the_battle_the_same_way(player, enemy):
+    classic, classic_player, classic_enemy = play(player, enemy, 'classic')
+    fast, fast_player, fast_enemy = play(player, enemy, 'numpy')
+    assert classic.result != "tie" and classic.time < MAX_TIME
+    assert (fast.result, fast.end_reason, fast.time, fast.ticks) == \
+        (classic.result, classic.end_reason, classic.time, classic.ticks)
+    assert fast_player == classic_player
+    assert fast_enemy == classic_enemy
+
+
+def test_arena_batch_plays_the_classic_battles():
+    matchups = MATCHUPS + DECISIVE
+    classic = [run_spec_battle(p, e, max_time=MAX_TIME, backend='classic').to_dict() for p, e in matchups]
+    assert [r.to_dict() for r in run_arenas(matchups, max_time=MAX_TIME)] == classic
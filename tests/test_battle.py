@@ -0,0 +1,92 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game3 import make_world, instantiate_spec, Battle, STALL_WINDOW
+
+# Battle.check_result: who won, or why it is a tie. Specs are
+# (kind, x, y, hp, power, rate, extra, speed, acceleration) as built by
+# game3.formation_spec().
+TRIANGLE = ('triangle', 100, 300, 100, 10, 1.0, 0.0, 150, 150)
+SQUARE = ('square', 100, 300, 100, 0, 1.0, 4.0, 170, 250)
+PENTAGON = ('pentagon', 100, 300, 100, 15, 2.0, 0.0, 110, 300)
+
+
+def at(spec, x, y):
+    return (spec[0], x, y) + spec[3:]
+
+
+def battle(player, enemy, **kwargs):
+    world = make_world('classic', seed=0)
+    return Battle(world, instantiate_spec(player, 0, world), instantiate_spec(enemy, 1, world), **kwargs)
+
+
+def play(b, dt=1/60):
+    while b.result is None:
+        b.step(dt)
+    return b.result, b.end_reason
+
+
+def test_wipeouts():
+    b = battle((at(TRIANGLE, 100, 300),), (at(TRIANGLE, 700, 300),))
+    b.world.damage_unit(b.enemy_units[0], 1000)
+    assert b.check_result() == "win" and b.end_reason == "enemy wiped out"
+    b.world.damage_unit(b.player_units[0], 1000)
+    assert b.check_result() == "tie" and b.end_reason == "both teams wiped out"
+    b = battle((at(TRIANGLE, 100, 300),), (at(TRIANGLE, 700, 300),))
+    b.world.damage_unit(b.player_units[0], 1000)
+    assert b.check_result() == "lose" and b.end_reason == "player wiped out"
+
+
+def test_healers_only_is_a_tie():
+    b = battle((at(PENTAGON, 100, 300), at(PENTAGON, 100, 400)), (at(PENTAGON, 700, 300),))
+    assert play(b) == ("tie", "no damage on either side")
+    assert b.ticks == 60   # the damage-source check runs once per sim second
+
+
+def test_shooters_without_damage_are_a_tie():
+    # squares only intercept, so neither side can ever hurt the other
+    b = battle((at(SQUARE, 100, 300),), (at(SQUARE, 700, 300), at(PENTAGON, 700, 400)))
+    assert play(b) == ("tie", "no damage on either side")
+
+
+def test_shot_in_flight_still_counts_as_damage():
+    b = battle((at(TRIANGLE, 100, 300), at(PENTAGON, 100, 400)), (at(SQUARE, 700, 300),))
+    b.step(1/60)   # cooldowns start at zero, so the triangle has fired
+    b.world.damage_unit(b.player_units[0], 1000)
+    assert b.world.has_projectiles('triangle')
+    assert b.has_damage_source()
+    b.time = b.next_check
+    assert b.check_result() is None
+
+
+def test_stalemate_when_hp_does_not_move():
+    b = battle((at(TRIANGLE, 100, 300),), (at(TRIANGLE, 700, 300),))
+    b.time = STALL_WINDOW/2
+    assert b.check_result() is None
+    b.time = STALL_WINDOW
+    assert b.check_result() == "tie" and b.end_reason == "stalemate"
+
+
+def test_hp_change_restarts_the_stall_window():
+    b = battle((at(TRIANGLE, 100, 300),), (at(TRIANGLE, 700, 300),))
+    b.world.damage_unit(b.enemy_units[0], 5)
+    b.time = STALL_WINDOW
+    assert b.check_result() is None
+    assert b.window_end == 2*STALL_WINDOW
+    b.time = 2*STALL_WINDOW
+    assert b.check_result() == "tie" and b.end_reason == "stalemate"
+
+
+def test_max_time_is_enforced():
+    b = battle((at(TRIANGLE, 100, 300),), (at(TRIANGLE, 700, 300),), max_time=0.5, stall_window=None)
+    assert play(b) == ("tie", "time limit")
+    assert b.time >= 0.5 > b.time - 1/60   # the first tick at or past the limit
+    assert b.player_units[0].alive and b.enemy_units[0].alive
+
+
+def test_limits_can_be_switched_off():
+    b = battle((at(TRIANGLE, 100, 300),), (at(TRIANGLE, 700, 300),), max_time=None, stall_window=None)
+    b.time = 1e6
+    assert b.check_result() is None
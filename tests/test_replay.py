@@ -0,0 +1,104 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import math
+import pytest
+
+from game3 import make_world, instantiate_spec, Battle
+from headless import HEADLESS_DT
+from replay import ReplayRecorder, ReplayReader, KEYFRAME_INTERVAL, REPLAY_STRIDE, POS_SCALE
+
+# A recorded battle has to read back as what was simulated, to 1/8 px
+PLAYER = (('triangle', 120, 300, 120, 9, 1.5, 0.0, 130, 150),
+          ('square', 160, 260, 100, 0, 2.0, 4.0, 170, 250),
+          ('pentagon', 100, 220, 100, 15, 4.0, 0.0, 110, 300))
+ENEMY = (('triangle', 680, 300, 100, 6, 1.2, 0.0, 140, 120),
+         ('triangle', 700, 340, 90, 5, 2.0, 0.0, 100, 100),
+         ('square', 640, 260, 110, 0, 3.0, 6.0, 160, 200))
+MAX_TIME = 8.0   # 160 frames, three blocks
+
+
+def snapshot(battle):
+    units = [(u.pos.x, u.pos.y, math.ceil(u.hp) if u.alive else 0) for u in battle.player_units + battle.enemy_units]
+    xs, ys, _, teams, kinds = battle.world.projectile_states()
+    return battle.ticks, units, list(zip(xs, ys, teams, kinds))
+
+
+@pytest.fixture(scope="module")
+def recorded(tmp_path_factory):
+    # (path, snapshots of every recorded tick, battle)
+    world = make_world('classic', seed=0)
+    recorder = ReplayRecorder(PLAYER, ENEMY, HEADLESS_DT)
+    battle = Battle(world, instantiate_spec(PLAYER, 0, world), instantiate_spec(ENEMY, 1, world),
+                    max_time=MAX_TIME, recorder=recorder)
+    truth = [snapshot(battle)]
+    while battle.result is None:
+        battle.step(HEADLESS_DT)
+        if recorder.last_tick == battle.ticks: truth.append(snapshot(battle))
+    path = tmp_path_factory.mktemp("replays") / "battle.gwr"
+    recorder.save(path)
+    return path, truth, battle
+
+
+def test_header_round_trip(recorded):
+    path, truth, battle = recorded
+    reader = ReplayReader.open(path)
+    try:
+        # spec numbers are stored as float32
+        for read, spec in zip(reader.player_spec() + reader.enemy_spec(), PLAYER + ENEMY):
+            assert read[0] == spec[0] and read[1:] == pytest.approx(spec[1:], rel=1e-6)
+        assert len(reader.specs) == len(PLAYER + ENEMY)
+        assert reader.stride == REPLAY_STRIDE and reader.dt == pytest.approx(HEADLESS_DT)
+        assert reader.end_tick == battle.ticks
+        assert reader.frame_count == len(truth)
+        assert len(reader.index) == 3
+    finally:
+        reader.close()
+
+
+def test_frames_round_trip(recorded):
+    path, truth, _ = recorded
+    reader = ReplayReader.open(path)
+    try:
+        assert any(projectiles for _, _, projectiles in truth)
+        for frame, (tick, units, projectiles) in zip(reader.frames(), truth):
+            assert frame.tick == tick
+            assert len(frame.units) == len(units)
+            for (x, y, hp, _), (tx, ty, thp) in zip(frame.units, units):
+                assert abs(x-tx) <= 1/POS_SCALE and abs(y-ty) <= 1/POS_SCALE
+                assert hp == thp
+            assert len(frame.projectiles) == len(projectiles)
+            for (x, y, _, team, kind), (tx, ty, tteam, tkind) in zip(frame.projectiles, projectiles):
+                assert abs(x-tx) <= 1/POS_SCALE and abs(y-ty) <= 1/POS_SCALE
+                assert (team, kind) == (tteam, tkind)
+    finally:
+        reader.close()
+
+
+def test_seek_across_blocks(recorded):
+    path, truth, _ = recorded
+    reader = ReplayReader.open(path)
+    try:
+        ticks = [t for t, _, _ in truth]
+        assert reader.block_starts == [0, KEYFRAME_INTERVAL, 2*KEYFRAME_INTERVAL]
+        for tick in range(ticks[-1]+1):
+            i = reader.frame_index(tick)
+            assert ticks[i] <= tick and (i+1 == len(ticks) or ticks[i+1] > tick)
+        # last frame of a block, first of the next, and back again
+        for i in (KEYFRAME_INTERVAL-1, KEYFRAME_INTERVAL, 2*KEYFRAME_INTERVAL, 0, len(ticks)-1, KEYFRAME_INTERVAL):
+            assert reader.frame(i).tick == ticks[i]
+        assert reader.frame_index(ticks[-1] + 1000) == len(ticks)-1
+    finally:
+        reader.close()
+
+
+def test_truncated_file_raises(recorded, tmp_path):
+    path, _, _ = recorded
+    data = path.read_bytes()
+    for cut in (len(data)-1, len(data)//2):
+        short = tmp_path / f"cut{cut}.gwr"
+        short.write_bytes(data[:cut])
+        with pytest.raises(ValueError):
+            ReplayReader.open(short)
@@ -0,0 +1,141 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import pygame
+import pytest
+
+import game3
+from game3 import SpatialHash, UNIT_CELL, make_world, instantiate_spec
+from stress import army_spec
+
+# SpatialHash only narrows down what World looks at; results have to match
+# the all-pairs scans it replaced, including which of two equally close
+# objects wins.
+
+
+class AllPairs(SpatialHash):
+    # Brute-force stand-in: every query sees every object in insertion order
+    def query(self, pos, reach):
+        return sorted((e for bucket in self.cells.values() for e in bucket), key=lambda e: e[0])
+
+    def nearest(self, pos, accept, max_rings):
+        best, best_d = None, 0.0
+        for seq, obj in self.query(pos, 0):
+            if not accept(obj): continue
+            d = pos.distance_to(obj.pos)
+            if best is None or d < best_d: best, best_d = obj, d
+        return best, True
+
+
+class Dot:
+    def __init__(self, x, y):
+        self.pos = pygame.Vector2(x, y)
+
+
+def snapshot(world):
+    return ([(u.pos.x, u.pos.y, u.vel.x, u.vel.y, u.hp, u.alive) for u in world.units],
+            [(p.pos.x, p.pos.y, p.vel.x, p.vel.y, p.alive) for p in world.projectiles])
+
+
+def random_world(seed, size=8):
+    world = make_world('classic', seed=seed)
+    grid = SpatialHash(UNIT_CELL)
+    for team in (0, 1):
+        instantiate_spec(army_spec(team, size, 'tsp', world.width, world.height, grid, world.rng), team, world)
+    return world
+
+
+@pytest.mark.parametrize("seed", range(1, 7))
+def test_world_matches_all_pairs_scan(seed, monkeypatch):
+    world = random_world(seed)
+    with monkeypatch.context() as m:
+        m.setattr(game3, "SpatialHash", AllPairs)
+        brute = random_world(seed)
+    assert isinstance(brute.unit_grid, AllPairs)
+    for tick in range(1500):
+        world.update(1/60)
+        with monkeypatch.context() as m:
+            m.setattr(game3, "SpatialHash", AllPairs)   # bucket grids are made per tick
+            brute.update(1/60)
+        assert snapshot(world) == snapshot(brute), f"diverged at tick {tick}"
+    assert world.projectiles
+
+
+def test_nearest_tie_goes_to_first_inserted():
+    # both 11 from pos, one in ring 1 and one in ring 2
+    pos = pygame.Vector2(9.5, 9.5)
+    inner, outer = Dot(-1.5, 9.5), Dot(9.5, 20.5)
+    grid = SpatialHash(10)
+    grid.insert(outer, outer.pos)
+    grid.insert(inner, inner.pos)
+    assert grid.nearest(pos, lambda o: True, 4) == (outer, True)
+    grid = SpatialHash(10)
+    grid.insert(inner, inner.pos)
+    grid.insert(outer, outer.pos)
+    assert grid.nearest(pos, lambda o: True, 4) == (inner, True)
+
+
+def test_nearest_tie_follows_insertion_after_moves():
+    # move() keeps the original seq, so order is by insertion, not by cell
+    grid = SpatialHash(10)
+    a, b = Dot(50, 50), Dot(-15, 5)
+    grid.insert(a, a.pos)
+    grid.insert(b, b.pos)
+    a.pos.update(25, 5)
+    grid.move(a, a.pos)
+    assert grid.nearest(pygame.Vector2(5, 5), lambda o: True, 4) == (a, True)
+
+
+def test_nearest_looks_one_ring_past_the_first_hit():
+    # The corner of ring 1 is further than the side of ring 2
+    grid = SpatialHash(10)
+    corner, side = Dot(-9, -9), Dot(21, 5)
+    grid.insert(corner, corner.pos)
+    grid.insert(side, side.pos)
+    assert grid.nearest(pygame.Vector2(9, 5), lambda o: True, 4) == (side, True)
+
+
+def test_nearest_skips_rejected():
+    grid = SpatialHash(10)
+    near, far = Dot(6, 5), Dot(35, 5)
+    grid.insert(near, near.pos)
+    grid.insert(far, far.pos)
+    assert grid.nearest(pygame.Vector2(5, 5), lambda o: o is not near, 4) == (far, True)
+
+
+def test_nearest_gives_up_past_max_rings():
+    grid = SpatialHash(10)
+    assert grid.nearest(pygame.Vector2(5, 5), lambda o: True, 3) == (None, False)
+    far = Dot(95, 5)   # 90 away in ring 9: further than 3 (or 9) rings are known to cover
+    grid.insert(far, far.pos)
+    assert grid.nearest(pygame.Vector2(5, 5), lambda o: True, 3) == (None, False)
+    assert grid.nearest(pygame.Vector2(5, 5), lambda o: True, 9) == (None, False)
+    assert grid.nearest(pygame.Vector2(5, 5), lambda o: True, 10) == (far, True)
+    edge = Dot(33, 5)   # in ring 3 but 28 away, closer than anything outside 3 rings
+    grid.insert(edge, edge.pos)
+    assert grid.nearest(pygame.Vector2(5, 5), lambda o: True, 3) == (edge, True)
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(7)
+    for trial in range(200):
+        grid = SpatialHash(rng.choice((8, 25, 60)))
+        brute = AllPairs(1)
+        # integer positions on a coarse lattice make exact ties common
+        dots = [Dot(rng.randrange(-10, 30)*5, rng.randrange(-10, 30)*5) for _ in range(rng.randrange(1, 40))]
+        for d in dots:
+            grid.insert(d, d.pos)
+            brute.insert(d, d.pos)
+        pos = pygame.Vector2(rng.randrange(-10, 30)*5, rng.randrange(-10, 30)*5)
+        accept = (lambda o: True) if trial % 2 else (lambda o: dots.index(o) % 3 != 0)
+        rings = rng.randrange(1, 8)
+        best, found = grid.nearest(pos, accept, rings)
+        expected, _ = brute.nearest(pos, accept, rings)
+        if found:
+            assert best is expected
+        else:
+            # only allowed to give up when nothing accepted is within max_rings cells
+            assert expected is None or pos.distance_to(expected.pos) >= rings*grid.cell_size
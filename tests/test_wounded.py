@@ -0,0 +1,47 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import pytest
+
+from game3 import World, Unit
+
+# World.most_wounded answers from WoundedIndex's lazy heaps; it has to pick
+# what a scan of world.units would: the live, hurt unit with the lowest
+# hp fraction, earliest added on ties.
+
+
+def scan(world, order, team):
+    hurt = [u for u in world.units if u.team == team and u.alive and u.hp < u.max_hp]
+    return min(hurt, key=lambda u: (u.hp/u.max_hp, order[u]), default=None)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_most_wounded_matches_scan(seed):
+    rng = random.Random(seed)
+    world = World(rng=rng)
+    order = {}   # unit -> add order, the tie-break
+
+    def add():
+        u = Unit(rng.randrange(2), (rng.uniform(0, 800), rng.uniform(0, 600)), 3, None,
+                 hp=rng.choice((100, 100, 120, 150, 200)))
+        order[u] = len(order)
+        world.add_unit(u)
+
+    for _ in range(12): add()
+    for step in range(3000):
+        op = rng.random()
+        live = world.units
+        if op < 0.45 and live:
+            # whole amounts make equal hp fractions, and so ties, common
+            world.damage_unit(rng.choice(live), rng.choice((5, 10, 10, 20, 50)))
+        elif op < 0.8 and live:
+            world.heal_unit(rng.choice(live), rng.choice((5, 10, 25, 1000)))
+        elif op < 0.9 and live:
+            world.remove_unit(rng.choice(live))
+        else:
+            add()
+        for team in (0, 1):
+            assert world.most_wounded(team) is scan(world, order, team), f"step {step}, team {team}"